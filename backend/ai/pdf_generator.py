@@ -1,106 +1,168 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-import os
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Paragraph, Spacer, Table, TableStyle
+from typing import BinaryIO
+import io
 
-def generate_meal_plan_pdf(meal_plan_data: dict, file_path: str) -> str:
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FONT_REGULAR = 'Helvetica'
+FONT_BOLD = 'Helvetica-Bold'
+
+
+class MealPlanDocTemplate(BaseDocTemplate):
+    """Letter-sized document that reuses a page template built once by the renderer"""
+
+    def __init__(self, output, page_template: PageTemplate):
+        super().__init__(output, pagesize=letter, leftMargin=inch, rightMargin=inch,
+                         topMargin=inch, bottomMargin=inch)
+        self.addPageTemplates([page_template])
+
+
+class MealPlanPdfRenderer:
     """
-    Generate a real PDF version of the meal plan using reportlab.
+    Meal plan PDF renderer. Paragraph styles, table styles, fonts and the page
+    layout are built once when the renderer is created, so each render only
+    lays out the plan itself.
     """
-    doc = SimpleDocTemplate(file_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Title
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.hexColor('#10b981'),  # Emerald-500
-        spaceAfter=12
-    )
-    story.append(Paragraph(f"AI Nutritionist - 7-Day Meal Plan", title_style))
-    story.append(Spacer(1, 12))
-
-    # User Info
-    story.append(Paragraph(f"<b>Client:</b> {meal_plan_data.get('user_name', 'User')}", styles['Normal']))
-    story.append(Paragraph(f"<b>Goal:</b> {meal_plan_data.get('goal', 'Not set')}", styles['Normal']))
-    story.append(Paragraph(f"<b>Diet Type:</b> {meal_plan_data.get('diet_type', 'Balanced')}", styles['Normal']))
-    story.append(Paragraph(f"<b>Daily Calorie Target:</b> {meal_plan_data.get('daily_calories', 0)} cal/day", styles['Normal']))
-    story.append(Spacer(1, 12))
-
-    # Macros Table
-    macros = meal_plan_data.get('macros', {})
-    macro_data = [
-        ['Nutrient', 'Amount (g)', '% of Calories'],
-        ['Protein', f"{macros.get('protein', 0)}g", f"{Math_round(macros.get('protein', 0) * 400 / meal_plan_data.get('daily_calories', 1))}%"],
-        ['Carbohydrates', f"{macros.get('carbs', 0)}g", f"{Math_round(macros.get('carbs', 0) * 400 / meal_plan_data.get('daily_calories', 1))}%"],
-        ['Fats', f"{macros.get('fats', 0)}g", f"{Math_round(macros.get('fats', 0) * 900 / meal_plan_data.get('daily_calories', 1))}%"]
-    ]
-    
-    # Helper for rounding in python
-    def Math_round(val):
-        return round(val)
-
-    # Re-calculate with local helper
-    macro_data = [
-        ['Nutrient', 'Amount (g)', '% of Calories'],
-        ['Protein', f"{macros.get('protein', 0)}g", f"{Math_round(macros.get('protein', 0) * 400 / meal_plan_data.get('daily_calories', 1))}%"],
-        ['Carbohydrates', f"{macros.get('carbs', 0)}g", f"{Math_round(macros.get('carbs', 0) * 400 / meal_plan_data.get('daily_calories', 1))}%"],
-        ['Fats', f"{macros.get('fats', 0)}g", f"{Math_round(macros.get('fats', 0) * 900 / meal_plan_data.get('daily_calories', 1))}%"]
-    ]
-
-    t = Table(macro_data, colWidths=[150, 100, 100])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.hexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey)
-    ]))
-    story.append(t)
-    story.append(Spacer(1, 24))
-
-    # Daily Meals
-    history = meal_plan_data.get('history', [])
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    
-    for hist in history:
-        day_idx = hist.get('day_number', 0) - 1
-        if day_idx < 0: continue # Skip day 0 (full plan summary)
-        
-        day_name = days[day_idx]
-        story.append(Paragraph(f"{day_name}", styles['Heading2']))
-        
-        meals = hist.get('meals', {}).get('meals', [])
-        if not meals:
-            story.append(Paragraph("No meals recorded for this day.", styles['Italic']))
-            continue
-            
-        meal_table_data = [['Meal', 'Name', 'Calories', 'P/C/F']]
-        for m in meals:
-            pcf = f"{m.get('protein', 0)}/{m.get('carbs', 0)}/{m.get('fats', 0)}"
-            meal_table_data.append([
-                m.get('meal', 'Meal'),
-                m.get('name', 'N/A'),
-                f"{m.get('calories', 0)}",
-                pcf
-            ])
-            
-        mt = Table(meal_table_data, colWidths=[80, 220, 60, 80])
-        mt.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.hexColor('#f1f5f9')),
+
+    def __init__(self):
+        # Loading the fonts up front keeps their metrics cached for the process
+        pdfmetrics.getFont(FONT_REGULAR)
+        pdfmetrics.getFont(FONT_BOLD)
+
+        styles = getSampleStyleSheet()
+        self.normal_style = styles['Normal']
+        self.day_style = styles['Heading2']
+        self.empty_day_style = styles['Italic']
+        self.title_style = ParagraphStyle(
+            'TitleStyle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#10b981'),  # Emerald-500
+            spaceAfter=12
+        )
+
+        self.macro_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#10b981')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey)
+        ])
+        self.meal_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f1f5f9')),
             ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
             ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
             ('FONTSIZE', (0, 0), (-1, -1), 10),
             ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        story.append(mt)
+        ])
+
+        page_width, page_height = letter
+        frame = Frame(inch, inch, page_width - 2 * inch, page_height - 2 * inch, id='body')
+        self.page_template = PageTemplate(id='MealPlan', frames=[frame])
+
+    @staticmethod
+    def macro_rows(macros: dict, daily_calories) -> list:
+        """Macro table rows with each nutrient's share of the daily calories"""
+        calories = daily_calories or 1
+        protein = macros.get('protein', 0)
+        carbs = macros.get('carbs', 0)
+        fats = macros.get('fats', 0)
+        return [
+            ['Nutrient', 'Amount (g)', '% of Calories'],
+            ['Protein', f"{protein}g", f"{round(protein * 400 / calories)}%"],
+            ['Carbohydrates', f"{carbs}g", f"{round(carbs * 400 / calories)}%"],
+            ['Fats', f"{fats}g", f"{round(fats * 900 / calories)}%"]
+        ]
+
+    def build_story(self, meal_plan_data: dict) -> list:
+        history = [hist for hist in meal_plan_data.get('history', []) if hist.get('day_number', 0) > 0]
+        day_count = max(7, max((hist['day_number'] for hist in history), default=0))
+        story = []
+
+        # Title
+        story.append(Paragraph(f"AI Nutritionist - {day_count}-Day Meal Plan", self.title_style))
         story.append(Spacer(1, 12))
 
-    # Build PDF
-    doc.build(story)
-    return file_path
+        # User Info
+        story.append(Paragraph(f"<b>Client:</b> {meal_plan_data.get('user_name', 'User')}", self.normal_style))
+        story.append(Paragraph(f"<b>Goal:</b> {meal_plan_data.get('goal', 'Not set')}", self.normal_style))
+        story.append(Paragraph(f"<b>Diet Type:</b> {meal_plan_data.get('diet_type', 'Balanced')}", self.normal_style))
+        story.append(Paragraph(f"<b>Daily Calorie Target:</b> {meal_plan_data.get('daily_calories', 0)} cal/day", self.normal_style))
+        story.append(Spacer(1, 12))
+
+        # Macros Table
+        macro_data = self.macro_rows(meal_plan_data.get('macros', {}), meal_plan_data.get('daily_calories', 1))
+        t = Table(macro_data, colWidths=[150, 100, 100])
+        t.setStyle(self.macro_table_style)
+        story.append(t)
+        story.append(Spacer(1, 24))
+
+        # Daily Meals (day 0 is the full plan summary and is skipped above)
+        for hist in history:
+            day_idx = hist['day_number'] - 1
+            day_name = DAYS[day_idx % 7]
+            if day_count > 7:
+                day_name = f"Week {day_idx // 7 + 1} - {day_name}"
+            story.append(Paragraph(day_name, self.day_style))
+
+            meals = hist.get('meals', {}).get('meals', [])
+            if not meals:
+                story.append(Paragraph("No meals recorded for this day.", self.empty_day_style))
+                continue
+
+            meal_table_data = [['Meal', 'Name', 'Calories', 'P/C/F']]
+            for m in meals:
+                pcf = f"{m.get('protein', 0)}/{m.get('carbs', 0)}/{m.get('fats', 0)}"
+                meal_table_data.append([
+                    m.get('meal', 'Meal'),
+                    m.get('name', 'N/A'),
+                    f"{m.get('calories', 0)}",
+                    pcf
+                ])
+
+            mt = Table(meal_table_data, colWidths=[80, 220, 60, 80])
+            mt.setStyle(self.meal_table_style)
+            story.append(mt)
+            story.append(Spacer(1, 12))
+
+        return story
+
+    def render(self, meal_plan_data: dict, output: str | BinaryIO) -> str | BinaryIO:
+        doc = MealPlanDocTemplate(output, self.page_template)
+        doc.build(self.build_story(meal_plan_data))
+        return output
+
+
+# One renderer per process, created on first use (each PDF pool worker builds its own)
+_renderer = None
+
+
+def get_renderer() -> MealPlanPdfRenderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = MealPlanPdfRenderer()
+    return _renderer
+
+
+def render_meal_plan_pdf(meal_plan_data: dict) -> bytes:
+    """
+    Render the meal plan PDF into an in-memory buffer and return its bytes.
+    Nothing touches the disk, so concurrent exports never share a file.
+    """
+    buffer = io.BytesIO()
+    generate_meal_plan_pdf(meal_plan_data, buffer)
+    return buffer.getvalue()
+
+
+def generate_meal_plan_pdf(meal_plan_data: dict, output: str | BinaryIO) -> str | BinaryIO:
+    """
+    Generate a real PDF version of the meal plan using reportlab.
+    `output` may be a file path or a writable binary file object.
+    """
+    return get_renderer().render(meal_plan_data, output)
@@ -1,12 +1,7 @@
 import logging
-from datetime import datetime
 from enum import Enum
 from typing import Optional
-from sqlalchemy import Column, Integer, String, DateTime, Text
-from sqlalchemy.orm import declarative_base
-from database.database import engine
-
-Base = declarative_base()
+from database.models import AuditLog
 
 class AuditEventType(Enum):
     USER_LOGIN = "user_login"
@@ -20,20 +15,6 @@ class AuditEventType(Enum):
     API_ACCESS_DENIED = "api_access_denied"
     SECURITY_EVENT = "security_event"
 
-class AuditLog(Base):
-    __tablename__ = "audit_logs"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    event_type = Column(String, nullable=False)
-    user_id = Column(Integer, nullable=True)  # Nullable for events before user authentication
-    ip_address = Column(String, nullable=True)
-    user_agent = Column(Text, nullable=True)
-    details = Column(Text, nullable=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-
-# Create the audit log table
-Base.metadata.create_all(bind=engine)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
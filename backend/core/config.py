@@ -1,13 +1,65 @@
 from pydantic_settings import BaseSettings
-from pydantic import Config Dict
+from pydantic import ConfigDict
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./nutritionist.db"
+    # Connection pool for server databases (Postgres)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    # SQLite tuning, applied to every new connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE: int = -64000  # negative = KiB, so 64 MB
+    SQLITE_MMAP_SIZE: int = 268435456
     OPENAI_API_KEY: str | None = None
     JWT_SECRET: str = "your_secret_here"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # Refresh tokens (services/refresh_tokens.py); revoked ids are kept in a Bloom filter
+    REFRESH_TOKEN_DAYS: int = 7
+    REFRESH_TOKEN_FILTER_CAPACITY: int = 100000
+    REFRESH_TOKEN_FILTER_ERROR_RATE: float = 0.001
+    REFRESH_TOKEN_SWEEP_SECONDS: float = 3600.0
+    # Verified tokens remembered until they expire, so repeat requests skip the signature check.
+    # No revocation check is registered with token_service (set_revocation_check), so an
+    # access token stays valid until its exp even after logout; keep ACCESS_TOKEN_EXPIRE_MINUTES
+    # short. Deactivated users are still refused, as get_current_user checks is_active.
+    JWT_CACHE_SIZE: int = 10000
+    # Authenticated users are cached per worker; role/status/password changes invalidate them
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    # Set to share invalidations between workers (needs the redis package)
+    PRINCIPAL_INVALIDATION_REDIS_URL: str | None = None
+    # Rate limits as "<count>/<second|minute|hour|day>"; see core/rate_limit.py
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DEFAULT: str = "120/minute"
+    RATE_LIMIT_MEALPLAN_GENERATE: str = "5/minute"
+    RATE_LIMIT_MEALPLAN_PDF: str = "20/minute"
+    RATE_LIMIT_AUTH: str = "10/minute"
+    RATE_LIMIT_CLIENT_IMPORT: str = "5/hour"
+    # Keys kept per worker; idle ones are evicted first
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    # Set to share limits between workers (needs the redis package)
+    RATE_LIMIT_REDIS_URL: str | None = None
+    # bcrypt cost; stored hashes with another cost are rehashed on the next successful login
+    BCRYPT_ROUNDS: int = 12
+    # Hashing runs on its own thread pool; logins beyond workers + queue get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    # Lock an account after this many failed logins; counters are written behind in batches
+    LOGIN_MAX_FAILED_ATTEMPTS: int = 5
+    LOGIN_LOCKOUT_MINUTES: int = 30
+    LOGIN_LOCKOUT_FLUSH_SECONDS: float = 5.0
+    LOGIN_LOCKOUT_FLUSH_THRESHOLD: int = 200
+    LOGIN_LOCKOUT_MAX_ENTRIES: int = 100000
+    # TFA setup QR codes: "png" (1-bit, TFA_QR_BOX_SIZE px per module) or "svg"
+    TFA_QR_FORMAT: str = "png"
+    TFA_QR_BOX_SIZE: int = 4
+    # Rendered codes are kept until setup completes, at most this long
+    TFA_QR_CACHE_SECONDS: float = 900.0
+    TFA_QR_CACHE_SIZE: int = 1000
     ENVIRONMENT: str = "development"
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
@@ -21,6 +73,43 @@ class Settings(BaseSettings):
     EMAIL_USE_TLS: bool = True
     GOOGLE_CLIENT_ID: str | None = None
 
+    # PDF rendering runs in a dedicated process pool so it never blocks the event loop
+    PDF_RENDER_WORKERS: int = 2
+    PDF_RENDER_MAX_QUEUE: int = 8
+    PDF_RENDER_TIMEOUT_SECONDS: float = 30.0
+    PDF_BULK_MAX_PLANS: int = 100
+    # A bulk export entry waiting this long for room in the render pool is skipped (listed in errors.txt)
+    PDF_BULK_QUEUE_WAIT_SECONDS: float = 60.0
+    PDF_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # Render the PDF in the background right after a plan is generated
+    PDF_PRERENDER_ENABLED: bool = False
+    PDF_PRERENDER_QUEUE_SIZE: int = 16
+
+    # SQL statements are counted per request; the counts go to the logs and,
+    # when enabled, to X-DB-Query-Count / X-DB-Query-Time-Ms response headers
+    QUERY_STATS_HEADER: bool = False
+    QUERY_COUNT_WARN_THRESHOLD: int = 25
+
+    # Meal plan list endpoints are paginated with a keyset cursor
+    MEALPLAN_PAGE_SIZE: int = 50
+    MEALPLAN_MAX_PAGE_SIZE: int = 200
+    # Stored meal plan documents are zstd frames, compressed with a dictionary trained on our own plans
+    MEALPLAN_COMPRESSION_LEVEL: int = 3
+    MEALPLAN_DICT_SIZE: int = 16 * 1024
+    MEALPLAN_DICT_SAMPLES: int = 2000
+    # Workers look for dictionaries trained by other processes this often
+    MEALPLAN_DICT_REFRESH_SECONDS: float = 60.0
+    # Plans older than this are moved to meal_plan_archive (python -m services.archival)
+    MEALPLAN_ARCHIVE_AFTER_DAYS: int = 365
+    MEALPLAN_ARCHIVE_BATCH_SIZE: int = 200
+    MEALPLAN_ARCHIVE_PAUSE_SECONDS: float = 0.1
+    # Plans still "pending" this long after creation were left by a worker that died mid-generation
+    MEALPLAN_PENDING_TIMEOUT_MINUTES: int = 30
+
+    # POST /clients/import validates and inserts uploads in batches of this many rows
+    CLIENT_IMPORT_BATCH_SIZE: int = 500
+    CLIENT_IMPORT_MAX_ROWS: int = 10000
+
     model_config = ConfigDict(env_file=".env")
 
 
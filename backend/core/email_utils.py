@@ -1,8 +1,8 @@
 import secrets
 import string
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database.models import User
+from sqlalchemy.orm import Session, lazyload, load_only
+from database.models import ClientProfile
 from core.token_manager import TokenManager
 from typing import Optional
 from core.email_service import email_service
@@ -29,11 +29,18 @@ class EmailVerification:
         return email_service.send_password_reset_email(user_email, reset_token)
     
     @staticmethod
-    def verify_email_token(db: Session, token: str) -> Optional[User]:
+    def verify_email_token(db: Session, token: str) -> Optional[ClientProfile]:
         """Verify an email verification token and activate the user's email"""
-        user = db.query(User).filter(
-            User.email_verification_token == token,
-            User.email_verification_expires > datetime.utcnow()
+        # Only the columns this check reads and updates
+        user = db.query(ClientProfile).options(load_only(
+            ClientProfile.id,
+            ClientProfile.email,
+            ClientProfile.is_verified,
+            ClientProfile.email_verification_token,
+            ClientProfile.email_verification_expires
+        ), lazyload(ClientProfile.details)).filter(
+            ClientProfile.email_verification_token == token,
+            ClientProfile.email_verification_expires > datetime.utcnow()
         ).first()
         
         if not user:
@@ -48,11 +55,18 @@ class EmailVerification:
         return user
     
     @staticmethod
-    def validate_password_reset_token(db: Session, token: str) -> Optional[User]:
+    def validate_password_reset_token(db: Session, token: str) -> Optional[ClientProfile]:
         """Validate a password reset token"""
-        user = db.query(User).filter(
-            User.password_reset_token == token,
-            User.password_reset_expires > datetime.utcnow()
+        # Callers go on to set a new password and clear the token
+        user = db.query(ClientProfile).options(load_only(
+            ClientProfile.id,
+            ClientProfile.email,
+            ClientProfile.password_hash,
+            ClientProfile.password_reset_token,
+            ClientProfile.password_reset_expires
+        ), lazyload(ClientProfile.details)).filter(
+            ClientProfile.password_reset_token == token,
+            ClientProfile.password_reset_expires > datetime.utcnow()
         ).first()
         
         if not user:
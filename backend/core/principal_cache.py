@@ -0,0 +1,178 @@
+# Authenticated-principal cache
+#
+# get_current_user used to load the User row on every authenticated request
+# just to read its id, name and role. Each worker now keeps a small frozen
+# Principal per user id for PRINCIPAL_CACHE_TTL_SECONDS. Changing a user's
+# role, status or password must call principal_cache.invalidate(user_id):
+# the local entry is dropped at once and the id is published on the
+# invalidation channel so other workers drop theirs too. Without
+# PRINCIPAL_INVALIDATION_REDIS_URL the channel only reaches this process and
+# other workers catch up when their entry expires.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """What routes need to know about the signed-in user; not bound to a session"""
+    id: int
+    email: str
+    name: str | None
+    role: str
+    status: str
+    is_active: bool
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+class LocalInvalidationChannel:
+    """Delivers invalidations within this process only (single worker, tests)"""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback: Callable[[int], None]):
+        self._subscribers.append(callback)
+
+    def publish(self, user_id: int):
+        for callback in self._subscribers:
+            callback(user_id)
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class RedisInvalidationChannel:
+    """Delivers invalidations to every worker subscribed to the same Redis channel"""
+
+    def __init__(self, url: str, channel_name: str = "principal-invalidation"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("PRINCIPAL_INVALIDATION_REDIS_URL is set but the redis package is not installed") from e
+        self.channel_name = channel_name
+        self._redis_error = redis.RedisError
+        self._client = redis.Redis.from_url(url)
+        self._subscribers = []
+        self._pubsub = None
+        self._thread = None
+
+    def subscribe(self, callback: Callable[[int], None]):
+        self._subscribers.append(callback)
+
+    def _on_message(self, message):
+        try:
+            user_id = int(message["data"])
+        except (TypeError, ValueError):
+            return
+        for callback in self._subscribers:
+            callback(user_id)
+
+    def publish(self, user_id: int):
+        try:
+            self._client.publish(self.channel_name, str(user_id))
+        except self._redis_error as e:
+            # Other workers still drop the entry when its TTL runs out
+            logger.warning(f"Could not publish principal invalidation for user {user_id}: {e}")
+
+    def start(self):
+        """Listen for invalidations on a background thread (connects to Redis)"""
+        if self._thread is None:
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.channel_name: self._on_message})
+            self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def close(self):
+        if self._thread is not None:
+            self._thread.stop()
+            self._pubsub.close()
+            self._thread = None
+        self._client.close()
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, max_size: int, channel=None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()  # user id -> (Principal, expires at)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one isn't cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.channel = channel or LocalInvalidationChannel()
+        self.channel.subscribe(self._drop)
+
+    @property
+    def generation(self) -> int:
+        """Read before loading a principal and pass it to put()"""
+        return self._generation
+
+    def get(self, user_id: int) -> Principal | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] <= self._clock():
+                del self._entries[user_id]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, principal: Principal, generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[principal.id] = (principal, self._clock() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _drop(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate(self, user_id: int):
+        """Forget a user here and on the other workers (role, status or password changed)"""
+        self._drop(user_id)
+        self.channel.publish(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def make_invalidation_channel(redis_url: str | None):
+    if redis_url:
+        return RedisInvalidationChannel(redis_url)
+    return LocalInvalidationChannel()
+
+
+principal_cache = PrincipalCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    channel=make_invalidation_channel(settings.PRINCIPAL_INVALIDATION_REDIS_URL),
+)
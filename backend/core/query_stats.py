@@ -0,0 +1,128 @@
+# Per-request SQL statement counting
+#
+# Every instrumented engine reports each statement it runs to the QueryStats
+# of the current request (a context variable set by QueryStatsMiddleware), so
+# an N+1 pattern shows up as a query count instead of a vague slowdown. The
+# counts are logged per request and, when QUERY_STATS_HEADER is on, returned
+# in the X-DB-Query-Count and X-DB-Query-Time-Ms response headers.
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_ms: float = 0.0
+    # Only filled in when asked for (tests), to keep request tracking cheap
+    statements: list | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, statement: str, elapsed_ms: float):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if self.statements is not None:
+                self.statements.append(statement)
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_times"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, (time.perf_counter() - started) * 1000)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't run for a failed statement
+    start_times = exception_context.connection.info.get("query_start_times") if exception_context.connection else None
+    if start_times:
+        start_times.pop()
+
+
+def instrument_engine(engine):
+    """Report the statements of a sync engine (or an async engine's sync_engine)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_queries(keep_statements: bool = False):
+    """Collect the statements run in this context (and threads started from it)"""
+    stats = QueryStats(statements=[] if keep_statements else None)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count every statement ``engine`` runs while the block is open, whichever
+    thread runs it. Meant for tests, where requests run on TestClient's thread.
+    """
+    stats = QueryStats(statements=[])
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, 0.0)
+
+    event.listen(engine, "after_cursor_execute", record)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "after_cursor_execute", record)
+
+
+class QueryStatsMiddleware:
+    """Count the SQL statements of each request; log them and optionally add debug headers"""
+
+    def __init__(self, app, add_headers: bool = settings.QUERY_STATS_HEADER,
+                 warn_threshold: int = settings.QUERY_COUNT_WARN_THRESHOLD):
+        self.app = app
+        self.add_headers = add_headers
+        self.warn_threshold = warn_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            async def send_with_stats(message):
+                # Statements run while a streaming body is sent come after the
+                # headers; they still count towards the logged total
+                if message["type"] == "http.response.start" and self.add_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-DB-Query-Count", str(stats.count))
+                    headers.append("X-DB-Query-Time-Ms", f"{stats.total_ms:.1f}")
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
+
+        summary = f"{scope['method']} {scope['path']}: {stats.count} queries in {stats.total_ms:.1f} ms"
+        if stats.count > self.warn_threshold:
+            logger.warning(f"{summary} (more than {self.warn_threshold}, possible N+1)")
+        else:
+            logger.debug(summary)
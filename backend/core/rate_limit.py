@@ -0,0 +1,269 @@
+# In-process rate limiting
+#
+# Limits are enforced with GCRA (the generic cell rate algorithm): for each
+# (policy, client) key the store keeps a single number, the "theoretical
+# arrival time" of the next request, so memory per key is O(1) no matter how
+# large the window or burst. A request is allowed while that time is no
+# further ahead of now than the policy's burst allows; otherwise the client
+# gets a 429 with Retry-After set to when the next request would pass.
+#
+# Keys live in a sharded in-memory store (one lock and LRU per shard), so
+# checking a limit costs a few microseconds. Workers that must share their
+# counters can set RATE_LIMIT_REDIS_URL to keep the same state in Redis.
+#
+# Policies are matched per route: the LLM meal plan generation and the PDF
+# endpoints get tight limits per user, login/registration (bcrypt) per IP,
+# and everything else a generous default per user or IP.
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable
+
+import jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from core.config import settings
+from core.token_service import is_access_token, token_service
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitPolicy:
+    name: str
+    limit: int  # requests ...
+    period: float  # ... per this many seconds
+    burst: int | None = None  # requests allowed back to back, defaults to limit
+
+    @property
+    def emission_interval(self) -> float:
+        return self.period / self.limit
+
+    @property
+    def tolerance(self) -> float:
+        return self.emission_interval * (self.burst or self.limit)
+
+
+def parse_rate(name: str, rate: str) -> RateLimitPolicy:
+    """Build a policy from a "5/minute" style string"""
+    try:
+        count, period = rate.split("/")
+        return RateLimitPolicy(name, int(count), PERIODS[period.strip().rstrip("s")])
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid rate {rate!r} for {name}, expected e.g. '5/minute'") from None
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitResult:
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 when allowed)
+
+
+def gcra(tat: float | None, now: float, policy: RateLimitPolicy) -> tuple[float | None, RateLimitResult]:
+    """
+    One GCRA step. Returns the new theoretical arrival time to store (None
+    when the request is refused and nothing changes) and the result.
+    """
+    emission = policy.emission_interval
+    new_tat = (now if tat is None else max(tat, now)) + emission
+    allow_at = new_tat - policy.tolerance
+    if now < allow_at:
+        return None, RateLimitResult(False, 0, allow_at - now)
+    remaining = int((policy.tolerance - (new_tat - now)) / emission + 1e-9)
+    return new_tat, RateLimitResult(True, remaining, 0.0)
+
+
+class LocalRateLimitStore:
+    """
+    Per-process GCRA state. Keys are spread over shards with a lock each, and
+    every shard evicts its least recently used keys beyond its share of
+    ``max_keys``. Evicting an idle key loses nothing: a key whose arrival
+    time has passed behaves exactly like a new one.
+    """
+
+    def __init__(self, max_keys: int, shards: int = 16, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_per_shard = max(1, max_keys // shards)
+
+    async def hit(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        return self.hit_sync(key, policy)
+
+    def hit_sync(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        lock, entries = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            now = self._clock()
+            new_tat, result = gcra(entries.get(key), now, policy)
+            if new_tat is not None:
+                entries[key] = new_tat
+                entries.move_to_end(key)
+                if len(entries) > self._max_per_shard:
+                    entries.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return sum(len(entries) for _, entries in self._shards)
+
+    async def close(self):
+        pass
+
+
+# The same GCRA step as gcra(), run atomically inside Redis
+_REDIS_GCRA = """
+local now = tonumber(ARGV[1])
+local emission = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, tostring(tolerance - (new_tat - now))}
+"""
+
+
+class RedisRateLimitStore:
+    """
+    GCRA state shared by all workers through Redis. Uses the wall clock of
+    the worker, so the workers' clocks should be kept in sync (NTP). When
+    Redis is unreachable requests are let through rather than failed.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis_asyncio
+            from redis import RedisError
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the redis package is not installed") from e
+        self.prefix = prefix
+        self._redis_error = RedisError
+        self._client = redis_asyncio.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_GCRA)
+
+    async def hit(self, key: str, policy: RateLimitPolicy) -> RateLimitResult:
+        try:
+            allowed, value = await self._script(
+                keys=[self.prefix + key],
+                args=[time.time(), policy.emission_interval, policy.tolerance],
+            )
+        except self._redis_error as e:
+            logger.warning(f"Rate limit store unavailable, letting the request through: {e}")
+            return RateLimitResult(True, 0, 0.0)
+        if allowed:
+            return RateLimitResult(True, int(float(value) / policy.emission_interval + 1e-9), 0.0)
+        return RateLimitResult(False, 0, float(value))
+
+    async def close(self):
+        await self._client.aclose()
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitRule:
+    """Apply ``policy`` to requests whose method and path match, keyed by user or by IP"""
+    policy: RateLimitPolicy
+    methods: frozenset
+    path: re.Pattern
+    key_by: str = "user"  # "user" falls back to the IP for anonymous requests
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.path.match(path) is not None
+
+
+def default_rules() -> list:
+    """Per-route limits from settings; the first matching rule wins"""
+    return [
+        RateLimitRule(parse_rate("mealplan-generate", settings.RATE_LIMIT_MEALPLAN_GENERATE),
+                      frozenset({"POST"}), re.compile(r"^/api/mealplan/?$")),
+        RateLimitRule(parse_rate("mealplan-pdf", settings.RATE_LIMIT_MEALPLAN_PDF),
+                      frozenset({"GET"}), re.compile(r"^/api/mealplan/pdf/")),
+        RateLimitRule(parse_rate("auth", settings.RATE_LIMIT_AUTH),
+                      frozenset({"POST"}), re.compile(r"^(/auth)?/(login|register)$"), key_by="ip"),
+        RateLimitRule(parse_rate("client-import", settings.RATE_LIMIT_CLIENT_IMPORT),
+                      frozenset({"POST"}), re.compile(r"^/clients/import$")),
+    ]
+
+
+class RateLimiter:
+    def __init__(self, store, rules: list, default_policy: RateLimitPolicy | None):
+        self.store = store
+        self.rules = rules
+        self.default_policy = default_policy
+
+    def policy_for(self, method: str, path: str) -> tuple[RateLimitPolicy | None, str]:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule.policy, rule.key_by
+        return self.default_policy, "user"
+
+    async def check(self, scope) -> tuple[RateLimitPolicy | None, RateLimitResult | None]:
+        policy, key_by = self.policy_for(scope["method"], scope["path"])
+        if policy is None:
+            return None, None
+        return policy, await self.store.hit(f"{policy.name}:{client_key(scope, key_by)}", policy)
+
+
+def client_key(scope, key_by: str) -> str:
+    """``user:<id>`` for a request with a valid bearer access token, ``ip:<address>`` otherwise"""
+    if key_by == "user":
+        authorization = Headers(scope=scope).get("authorization", "")
+        if authorization[:7].lower() == "bearer ":
+            try:
+                # Cached verification, so repeat tokens cost a hash lookup
+                claims = token_service.decode(authorization[7:])
+                if is_access_token(claims):
+                    return f"user:{claims['sub']}"
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """Refuse requests over their route's limit with 429 and Retry-After"""
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        policy, result = await self.limiter.check(scope)
+        if result is not None and not result.allowed:
+            response = JSONResponse(
+                {"detail": "Too many requests, please retry later"},
+                status_code=429,
+                headers={
+                    "Retry-After": str(max(1, math.ceil(result.retry_after))),
+                    "X-RateLimit-Limit": str(policy.burst or policy.limit),
+                    "X-RateLimit-Remaining": "0",
+                },
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def make_store():
+    if settings.RATE_LIMIT_REDIS_URL:
+        return RedisRateLimitStore(settings.RATE_LIMIT_REDIS_URL)
+    return LocalRateLimitStore(max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+def build_rate_limiter() -> RateLimiter:
+    default_policy = parse_rate("default", settings.RATE_LIMIT_DEFAULT) if settings.RATE_LIMIT_DEFAULT else None
+    return RateLimiter(make_store(), default_rules(), default_policy)
@@ -0,0 +1,19 @@
+# Fast-path JSON responses
+#
+# A route that returns a model or dict has it validated against its
+# response_model and then JSON-encoded by FastAPI, so every row is processed twice.
+# Routes that already select exactly the columns of their response_model can
+# return RowsJSONResponse instead: the rows go straight to orjson, and the
+# declared response_model still documents the route in OpenAPI.
+
+import orjson
+from fastapi.responses import Response
+
+
+class RowsJSONResponse(Response):
+    """JSON response encoded with orjson (datetimes become ISO 8601 strings)"""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
@@ -1,44 +1,44 @@
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from datetime import timedelta
 import jwt
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security import HTTPBearer
 from core.config import settings
+from core.token_service import is_access_token, token_service
+from core.rate_limit import RateLimitMiddleware, build_rate_limiter
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max pinned to the configured cost so hashes made with any other cost
+# report needs_update and get rehashed on login (see services/password_hasher.py)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+# Bearer scheme of routers.auth.get_current_user, the one authentication dependency
 security_scheme = HTTPBearer()
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Passwords are hashed and checked only through services/password_hasher.py,
+# which runs bcrypt off the event loop
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    if not expires_delta:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return token_service.encode({**data, "type": "access"}, expires_delta)
 
 def decode_access_token(token: str) -> dict:
+    """Claims of a valid access token; {} for anything else, refresh tokens included"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        claims = token_service.decode(token)
     except jwt.PyJWTError:
         return {}
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security_scheme)) -> dict:
-    """
-    FastAPI dependency to get the current authenticated user from JWT token.
-    """
-    token = credentials.credentials
-    payload = decode_access_token(token)
-    if not payload or "sub" not in payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    return payload
+    return claims if is_access_token(claims) else {}
+
+def get_rate_limit_middleware(app):
+    """Add per-route rate limiting (core/rate_limit.py) to ``app`` unless RATE_LIMIT_ENABLED is off"""
+    if settings.RATE_LIMIT_ENABLED:
+        limiter = build_rate_limiter()
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+        # Closes the Redis connection pool when RATE_LIMIT_REDIS_URL is set
+        app.on_event("shutdown")(limiter.store.close)
+    return app
@@ -2,11 +2,113 @@ import pyotp
 import qrcode
 import io
 import base64
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from core.config import settings
 from database.models import User
 from typing import Optional
 
+# Any mask decodes the same; fixing one skips scoring all eight, most of the render time
+QR_MASK_PATTERN = 0
+QR_BORDER = 4  # quiet zone required by the QR spec
+QR_MIME_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+class QrCodeCache:
+    """
+    Rendered provisioning QR codes, keyed by a hash of the TFA secret, so
+    reloading the setup screen doesn't render again. Entries are dropped
+    when setup completes or is cancelled, and after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (secret hash, format) -> (uri, image, expires at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _secret_hash(secret: str) -> bytes:
+        return hashlib.sha256(secret.encode()).digest()
+
+    def get(self, secret: str, fmt: str, uri: str) -> str | None:
+        key = (self._secret_hash(secret), fmt)
+        with self._lock:
+            entry = self._entries.get(key)
+            # Same secret for another email or issuer is a different image
+            if entry is None or entry[0] != uri or entry[2] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, secret: str, fmt: str, uri: str, image: str):
+        key = (self._secret_hash(secret), fmt)
+        with self._lock:
+            self._entries[key] = (uri, image, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, secret: str):
+        secret_hash = self._secret_hash(secret)
+        with self._lock:
+            for fmt in QR_MIME_TYPES:
+                self._entries.pop((secret_hash, fmt), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+qr_code_cache = QrCodeCache(max_entries=settings.TFA_QR_CACHE_SIZE, ttl=settings.TFA_QR_CACHE_SECONDS)
+
+
+def _qr_matrix(data: str) -> list:
+    qr = qrcode.QRCode(border=QR_BORDER, mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_qr_png(data: str, box_size: int = settings.TFA_QR_BOX_SIZE) -> bytes:
+    """1-bit PNG, ``box_size`` pixels per module"""
+    matrix = _qr_matrix(data)
+    size = len(matrix)
+    img = Image.new("1", (size, size), 1)
+    img.putdata([0 if dark else 1 for row in matrix for dark in row])
+    if box_size > 1:
+        img = img.resize((size * box_size, size * box_size), Image.NEAREST)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def render_qr_svg(data: str) -> bytes:
+    """SVG with one path, a rectangle per horizontal run of dark modules; scales to any size"""
+    matrix = _qr_matrix(data)
+    size = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                runs.append(f"M{start} {y}h{x - start}v1H{start}z")
+            else:
+                x += 1
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{"".join(runs)}"/></svg>'
+    ).encode()
+
 class TwoFactorAuth:
     @staticmethod
     def generate_secret() -> str:
@@ -14,24 +116,43 @@ class TwoFactorAuth:
         return pyotp.random_base32()
     
     @staticmethod
-    def generate_qr_code(secret: str, email: str, issuer_name: str = "AI Nutritionist") -> str:
-        """Generate a QR code for TFA setup"""
-        totp_uri = pyotp.totp.TOTP(secret).provisioning_uri(
+    def generate_qr_code(secret: str, email: str, issuer_name: str = "AI Nutritionist",
+                         fmt: str = settings.TFA_QR_FORMAT) -> str:
+        """
+        Generate a QR code for TFA setup, base64 encoded ("png" or "svg", see
+        QR_MIME_TYPES). Cached per secret until setup completes.
+        """
+        totp_uri = TwoFactorAuth._provisioning_uri(secret, email, issuer_name, fmt)
+        cached = qr_code_cache.get(secret, fmt, totp_uri)
+        if cached is not None:
+            return cached
+        return TwoFactorAuth._render_qr_code(secret, fmt, totp_uri)
+
+    @staticmethod
+    async def generate_qr_code_async(secret: str, email: str, issuer_name: str = "AI Nutritionist",
+                                     fmt: str = settings.TFA_QR_FORMAT) -> str:
+        """generate_qr_code for async routes: cache hits return inline, misses render on a worker thread"""
+        totp_uri = TwoFactorAuth._provisioning_uri(secret, email, issuer_name, fmt)
+        cached = qr_code_cache.get(secret, fmt, totp_uri)
+        if cached is not None:
+            return cached
+        return await asyncio.to_thread(TwoFactorAuth._render_qr_code, secret, fmt, totp_uri)
+
+    @staticmethod
+    def _provisioning_uri(secret: str, email: str, issuer_name: str, fmt: str) -> str:
+        if fmt not in QR_MIME_TYPES:
+            raise ValueError(f"Unsupported QR code format {fmt!r}")
+        return pyotp.totp.TOTP(secret).provisioning_uri(
             name=email,
             issuer_name=issuer_name
         )
-        
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(totp_uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        
+
+    @staticmethod
+    def _render_qr_code(secret: str, fmt: str, totp_uri: str) -> str:
+        image = render_qr_svg(totp_uri) if fmt == "svg" else render_qr_png(totp_uri)
         # Convert to base64 for easy transmission
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
+        img_str = base64.b64encode(image).decode()
+        qr_code_cache.put(secret, fmt, totp_uri, img_str)
         return img_str
     
     @staticmethod
@@ -53,9 +174,21 @@ class TwoFactorAuth:
         qr_code = TwoFactorAuth.generate_qr_code(secret, user.email)
         return qr_code
     
+    @staticmethod
+    async def enable_tfa_for_user_async(user: User, db: AsyncSession) -> str:
+        """enable_tfa_for_user for async routes: the QR code is rendered off the event loop"""
+        secret = TwoFactorAuth.generate_secret()
+        user.tfa_secret = secret
+        user.tfa_enabled = True
+        await db.commit()
+        
+        return await TwoFactorAuth.generate_qr_code_async(secret, user.email)
+    
     @staticmethod
     def disable_tfa_for_user(user: User, db: Session):
         """Disable TFA for a user"""
+        if user.tfa_secret:
+            qr_code_cache.discard(user.tfa_secret)
         user.tfa_secret = None
         user.tfa_enabled = False
         user.tfa_verified = False
@@ -70,5 +203,7 @@ class TwoFactorAuth:
         is_valid = TwoFactorAuth.verify_token(user.tfa_secret, token)
         if is_valid:
             user.tfa_verified = True
+            # Setup is done; the QR code won't be shown again
+            qr_code_cache.discard(user.tfa_secret)
         
         return is_valid
\ No newline at end of file
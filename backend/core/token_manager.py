@@ -1,45 +1,32 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
+import jwt
 from fastapi import HTTPException, status, Depends
 from sqlalchemy.orm import Session
 from core.config import settings
+from core.token_service import token_service
 from database.database import get_db
 from database.models import User
-from passlib.context import CryptContext
 import secrets
 import hashlib
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 class TokenManager:
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-        to_encode = data.copy()
-        if expires_delta:
-            expire = datetime.utcnow() + expires_delta
-        else:
-            expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        to_encode.update({"exp": expire, "type": "access"})
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-        return encoded_jwt
+        if not expires_delta:
+            expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        return token_service.encode({**data, "type": "access"}, expires_delta)
 
     @staticmethod
     def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
-        to_encode = data.copy()
-        if expires_delta:
-            expire = datetime.utcnow() + expires_delta
-        else:
-            expire = datetime.utcnow() + timedelta(days=7)  # Refresh token lasts 7 days
-        to_encode.update({"exp": expire, "type": "refresh"})
-        encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-        return encoded_jwt
+        if not expires_delta:
+            expires_delta = timedelta(days=7)  # Refresh token lasts 7 days
+        return token_service.encode({**data, "type": "refresh"}, expires_delta)
 
     @staticmethod
     def verify_token(token: str, token_type: str = None):
         try:
-            payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+            payload = token_service.decode(token)
             token_type_claim = payload.get("type")
             
             if token_type and token_type_claim != token_type:
@@ -55,7 +42,7 @@ class TokenManager:
                     detail="Could not validate credentials"
                 )
             return email, payload
-        except JWTError:
+        except jwt.InvalidTokenError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials"
@@ -0,0 +1,112 @@
+# JWT encoding and verification
+#
+# The one place tokens are signed and checked (PyJWT). The signing and
+# verification keys are prepared once at startup, and tokens that already
+# passed verification are kept in a bounded LRU keyed by their SHA-256, each
+# entry living until the token's own "exp". An authenticated request with a
+# token seen before therefore costs a hash and a dictionary lookup instead of
+# a signature check. A revocation check, if one is registered, still runs on
+# every decode, cached or not.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable
+
+import jwt
+
+from core.config import settings
+
+
+class TokenService:
+    def __init__(self, secret: str, algorithm: str, cache_size: int, clock: Callable[[], float] = time.time):
+        self.algorithm = algorithm
+        algorithm_impl = jwt.get_algorithm_by_name(algorithm)
+        self._signing_key = algorithm_impl.prepare_key(secret)
+        # Asymmetric keys verify with the public half of the configured private key
+        public_key = getattr(self._signing_key, "public_key", None)
+        self._verification_key = public_key() if callable(public_key) else self._signing_key
+        self._jwk_algorithms = [algorithm]
+
+        self.cache_size = cache_size
+        self._clock = clock
+        self._cache = OrderedDict()  # sha256(token) -> (claims, exp)
+        self._lock = threading.Lock()
+        self._is_revoked = None
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, claims: dict, expires_delta: timedelta) -> str:
+        to_encode = claims.copy()
+        to_encode["exp"] = datetime.utcnow() + expires_delta
+        return jwt.encode(to_encode, self._signing_key, algorithm=self.algorithm)
+
+    def set_revocation_check(self, is_revoked: Callable[[dict], bool] | None):
+        """Register ``is_revoked(claims)``; it runs on every decode, so it must be cheap"""
+        self._is_revoked = is_revoked
+
+    def forget(self, token: str):
+        """Drop a token from the verified cache (e.g. right after revoking it)"""
+        with self._lock:
+            self._cache.pop(self._cache_key(token), None)
+
+    @staticmethod
+    def _cache_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode(self, token: str) -> dict:
+        """
+        Return the token's claims, or raise jwt.InvalidTokenError when its
+        signature, expiry or revocation check fails.
+        """
+        key = self._cache_key(token)
+        now = self._clock()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._cache[key]
+                entry = None
+            if entry is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if entry is not None:
+            claims = entry[0]
+        else:
+            claims = jwt.decode(token, self._verification_key, algorithms=self._jwk_algorithms)
+            exp = claims.get("exp")
+            # Tokens without an expiry are verified every time
+            if exp is not None:
+                with self._lock:
+                    self._cache[key] = (claims, exp)
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+        if self._is_revoked is not None and self._is_revoked(claims):
+            raise jwt.InvalidTokenError("Token has been revoked")
+        # Callers get their own copy; the cached claims stay untouched
+        return dict(claims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+def is_access_token(claims: dict) -> bool:
+    """
+    Whether verified claims may authenticate a request. Refresh tokens are
+    signed with the same key and must only ever reach /refresh; tokens issued
+    before access tokens were stamped carry no "type" and are still accepted.
+    """
+    return claims.get("type", "access") == "access"
+
+
+token_service = TokenService(
+    settings.JWT_SECRET,
+    settings.JWT_ALGORITHM,
+    cache_size=settings.JWT_CACHE_SIZE,
+)
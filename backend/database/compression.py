@@ -0,0 +1,354 @@
+"""
+zstd compression for stored meal plan documents.
+
+``MealHistory.meals_json`` is a ``CompressedText`` column: the JSON is
+compressed into a zstd frame on write and decompressed only when the column
+is actually read. Meal plan days repeat the same keys and ingredient names,
+so frames are compressed with a dictionary trained on our own plans. The
+trained dictionaries live in the ``compression_dictionaries`` table. Each
+frame records the id of the dictionary it was written with, so older frames
+stay readable after retraining.
+
+Rows written before compression are plain text and are returned unchanged
+until ``recompress_meal_history`` rewrites them.
+
+Every dictionary is loaded when the codec is bound at startup, so reading a
+row never touches the database (the column is decoded in the middle of
+result processing, possibly on the event loop). A dictionary trained later
+by another process is picked up by a background refresh every
+MEALPLAN_DICT_REFRESH_SECONDS, so workers learn about it at different
+times. A worker therefore only writes with a dictionary once it is older
+than the refresh interval plus DICT_ACTIVATION_MARGIN_SECONDS: by then every
+running worker has loaded it and can read those frames. Until then the
+previous dictionary stays active. The process that trains a dictionary uses
+it right away (the 0007 migration runs before any worker starts).
+
+Command line (run from backend/):
+    python -m database.compression train      # train a new dictionary from stored plans
+    python -m database.compression recompress # rewrite rows with the newest dictionary
+    python -m database.compression report     # stored size vs. raw size
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
+
+import zstandard
+from sqlalchemy import LargeBinary, bindparam, select, type_coerce, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.types import TypeDecorator
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# zstd training needs a decent number of samples to find repeated content
+MIN_TRAINING_SAMPLES = 100
+RECOMPRESS_BATCH_SIZE = 500
+# Slack on top of the refresh interval for a slow refresh or clock skew between hosts
+DICT_ACTIVATION_MARGIN_SECONDS = 30.0
+
+
+class MealPlanCodec:
+    """
+    Compresses and decompresses meal plan documents with the known dictionaries.
+    Writes use the active one: the newest dictionary that has been stored for
+    at least ``activate_after`` seconds.
+    zstd (de)compressor objects are not thread safe, so each thread keeps its own.
+    """
+
+    def __init__(self, level: int = settings.MEALPLAN_COMPRESSION_LEVEL,
+                 activate_after: float = settings.MEALPLAN_DICT_REFRESH_SECONDS + DICT_ACTIVATION_MARGIN_SECONDS):
+        self.level = level
+        self.activate_after = activate_after
+        self._lock = threading.Lock()
+        self._dictionaries = {}  # zstd dict id -> ZstdCompressionDict, oldest first
+        self._created_at = {}  # zstd dict id -> when it was stored
+        self._active_id = 0  # 0 = no dictionary
+        self._local = threading.local()
+        self._engine = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def active_dictionary_id(self) -> int:
+        return self._active_id
+
+    @property
+    def dictionary_ids(self) -> list[int]:
+        """Every dictionary this codec can read, active or not"""
+        return list(self._dictionaries)
+
+    def bind(self, engine):
+        """Load every stored dictionary up front; refresh() reads new ones from this database"""
+        self._engine = engine
+        with engine.connect() as conn:
+            self.load_dictionaries(conn)
+
+    def load_dictionaries(self, conn) -> int:
+        """
+        Load the dictionaries not known yet, then activate the newest one old
+        enough for every worker to have loaded it. Returns how many were loaded.
+        """
+        from database.models import CompressionDictionary
+
+        query = (
+            select(CompressionDictionary.dict_id, CompressionDictionary.dict_data, CompressionDictionary.created_at)
+            .order_by(CompressionDictionary.id)
+        )
+        with self._lock:
+            known = list(self._dictionaries)
+        if known:
+            query = query.where(CompressionDictionary.dict_id.not_in(known))
+        rows = conn.execute(query).all()
+        with self._lock:
+            for row in rows:
+                self._dictionaries[row.dict_id] = zstandard.ZstdCompressionDict(row.dict_data)
+                self._created_at[row.dict_id] = row.created_at
+            self._activate_settled()
+        return len(rows)
+
+    def _activate_settled(self):
+        # Called with the lock held. Only ever moves forward to a newer dictionary;
+        # one still too young is checked again on the next refresh
+        cutoff = datetime.utcnow() - timedelta(seconds=self.activate_after)
+        for dict_id in reversed(self._dictionaries):
+            if dict_id == self._active_id:
+                return
+            created_at = self._created_at.get(dict_id)
+            if created_at is None or created_at <= cutoff:
+                self._active_id = dict_id
+                return
+
+    def refresh(self) -> int:
+        with self._engine.connect() as conn:
+            return self.load_dictionaries(conn)
+
+    def start_refresh(self, interval: float = settings.MEALPLAN_DICT_REFRESH_SECONDS):
+        """Pick up dictionaries trained by other processes every ``interval`` seconds"""
+        if self._thread is not None or self._engine is None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="compression-dict-refresh",
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, interval: float):
+        while not self._stopping.wait(interval):
+            try:
+                loaded = self.refresh()
+                if loaded:
+                    logger.info(f"Loaded {loaded} new compression dictionaries, active is {self._active_id}")
+            except SQLAlchemyError as e:
+                logger.warning(f"Compression dictionary refresh failed, retrying later: {e}")
+
+    def stop_refresh(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def add_dictionary(self, dict_data: bytes) -> int:
+        """Register a dictionary just trained by this process and use it for every following write"""
+        dictionary = zstandard.ZstdCompressionDict(dict_data)
+        with self._lock:
+            self._dictionaries[dictionary.dict_id()] = dictionary
+            self._created_at[dictionary.dict_id()] = None
+            self._active_id = dictionary.dict_id()
+        return dictionary.dict_id()
+
+    def _dictionary(self, dict_id: int):
+        # No database lookup here: this runs while a result is being decoded
+        try:
+            return self._dictionaries[dict_id]
+        except KeyError:
+            raise LookupError(f"Unknown compression dictionary {dict_id}; it was not stored when this "
+                              f"worker last refreshed its dictionaries") from None
+
+    def _compressor(self):
+        dict_id = self._active_id
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        if dict_id not in compressors:
+            if dict_id:
+                compressors[dict_id] = zstandard.ZstdCompressor(level=self.level, dict_data=self._dictionary(dict_id))
+            else:
+                compressors[dict_id] = zstandard.ZstdCompressor(level=self.level)
+        return compressors[dict_id]
+
+    def _decompressor(self, dict_id: int):
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        if dict_id not in decompressors:
+            if dict_id:
+                decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self._dictionary(dict_id))
+            else:
+                decompressors[dict_id] = zstandard.ZstdDecompressor()
+        return decompressors[dict_id]
+
+    def compress(self, text: str) -> bytes:
+        return self._compressor().compress(text.encode("utf-8"))
+
+    def decompress(self, value) -> str:
+        if isinstance(value, str):
+            # Row written before compression (SQLite keeps it as TEXT)
+            return value
+        data = bytes(value)
+        if not data.startswith(ZSTD_MAGIC):
+            return data.decode("utf-8")
+        dict_id = frame_dictionary_id(data)
+        return self._decompressor(dict_id).decompress(data).decode("utf-8")
+
+
+def frame_dictionary_id(data: bytes) -> int:
+    return zstandard.get_frame_parameters(data).dict_id
+
+
+meal_plan_codec = MealPlanCodec()
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a zstd frame: compressed on write, decompressed when the column is read"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return meal_plan_codec.compress(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return meal_plan_codec.decompress(value)
+
+
+def _stored_meals_json():
+    """meals_json as stored, bypassing decompression"""
+    from database.models import MealHistory
+
+    return type_coerce(MealHistory.meals_json, LargeBinary).label("stored")
+
+
+def train_dictionary(conn, sample_limit: int = settings.MEALPLAN_DICT_SAMPLES,
+                     dict_size: int = settings.MEALPLAN_DICT_SIZE) -> int:
+    """Train a dictionary on the newest stored days, save it and make it active in this process"""
+    from database.models import CompressionDictionary, MealHistory
+
+    samples = conn.execute(
+        select(MealHistory.meals_json).order_by(MealHistory.id.desc()).limit(sample_limit)
+    ).scalars().all()
+    if len(samples) < MIN_TRAINING_SAMPLES:
+        raise ValueError(f"Need at least {MIN_TRAINING_SAMPLES} stored days to train, found {len(samples)}")
+
+    try:
+        trained = zstandard.train_dictionary(dict_size, [sample.encode("utf-8") for sample in samples])
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Dictionary training failed: {e}") from e
+
+    conn.execute(CompressionDictionary.__table__.insert().values(
+        dict_id=trained.dict_id(),
+        dict_data=trained.as_bytes(),
+        sample_count=len(samples),
+        created_at=datetime.utcnow()
+    ))
+    dict_id = meal_plan_codec.add_dictionary(trained.as_bytes())
+    logger.info(f"Trained compression dictionary {dict_id} on {len(samples)} days")
+    return dict_id
+
+
+def recompress_meal_history(engine, batch_size: int = RECOMPRESS_BATCH_SIZE,
+                            on_batch: Callable[[], None] | None = None) -> int:
+    """
+    Rewrite every row that is uncompressed or compressed with an older
+    dictionary using the active one. Each batch is committed in its own
+    transaction, so the write lock is never held for long and an interrupted
+    run resumes where it stopped (rows already on the active dictionary are
+    skipped). ``on_batch`` is called after each commit. Returns the number of
+    rows rewritten.
+    """
+    from database.models import MealHistory
+
+    active_id = meal_plan_codec.active_dictionary_id
+    statement = (
+        update(MealHistory).where(MealHistory.id == bindparam("b_id"))
+        .values(meals_json=bindparam("b_meals_json"))
+    )
+    rewritten = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(MealHistory.id, _stored_meals_json())
+                .where(MealHistory.id > last_id)
+                .order_by(MealHistory.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            changes = []
+            for row in rows:
+                last_id = row.id
+                stored = row.stored.encode("utf-8") if isinstance(row.stored, str) else bytes(row.stored)
+                if stored.startswith(ZSTD_MAGIC) and frame_dictionary_id(stored) == active_id:
+                    continue
+                changes.append({"b_id": row.id, "b_meals_json": meal_plan_codec.decompress(row.stored)})
+            if changes:
+                conn.execute(statement, changes)
+        rewritten += len(changes)
+        if on_batch is not None:
+            on_batch()
+    return rewritten
+
+
+def compression_report(conn) -> dict:
+    """Stored size against raw size of the meal history documents, overall and per dictionary"""
+    stored_bytes = raw_bytes = 0
+    by_dictionary = {}
+    for row in conn.execute(select(_stored_meals_json())).yield_per(RECOMPRESS_BATCH_SIZE):
+        stored = row.stored.encode("utf-8") if isinstance(row.stored, str) else bytes(row.stored)
+        raw = len(meal_plan_codec.decompress(row.stored).encode("utf-8"))
+        if stored.startswith(ZSTD_MAGIC):
+            key = frame_dictionary_id(stored)
+        else:
+            key = "uncompressed"
+
+        stats = by_dictionary.setdefault(key, {"rows": 0, "stored_bytes": 0, "raw_bytes": 0})
+        stats["rows"] += 1
+        stats["stored_bytes"] += len(stored)
+        stats["raw_bytes"] += raw
+        stored_bytes += len(stored)
+        raw_bytes += raw
+
+    return {
+        "rows": sum(stats["rows"] for stats in by_dictionary.values()),
+        "stored_bytes": stored_bytes,
+        "raw_bytes": raw_bytes,
+        "ratio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+        "active_dictionary": meal_plan_codec.active_dictionary_id,
+        "by_dictionary": by_dictionary,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    # Use the module the models were built with, not this __main__ copy of it
+    from database import compression
+    from database.database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    compression.meal_plan_codec.bind(engine)
+    if command == "train":
+        with engine.begin() as conn:
+            print(f"Active dictionary is now {compression.train_dictionary(conn)}")
+    elif command == "recompress":
+        print(f"Rewrote {compression.recompress_meal_history(engine)} rows")
+    elif command == "report":
+        with engine.connect() as conn:
+            print(json.dumps(compression.compression_report(conn), indent=2))
+    else:
+        sys.exit(f"Unknown command {command!r}, expected train, recompress or report")
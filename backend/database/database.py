@@ -1,19 +1,98 @@
 # Import function to create a database engine (connection to the DB)
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 # Import tools for creating database sessions and ORM base class
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from core.config import settings
+from core.query_stats import instrument_engine
+
 # Database connection URL
-# This uses SQLite and stores the database file as "nutritionist.db"
-DATABASE_URL = "sqlite:///./nutritionist.db"
+# Defaults to SQLite stored as "nutritionist.db"; set DATABASE_URL to use Postgres
+DATABASE_URL = settings.DATABASE_URL
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # Runs once for every new SQLite connection
+    # WAL lets readers keep reading while one writer commits, and
+    # synchronous=NORMAL is safe with WAL while avoiding an fsync per commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}")
+    # Wait for a competing writer instead of failing with "database is locked"
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def create_db_engine(database_url: str = DATABASE_URL):
+    """Create the engine for DATABASE_URL with settings tuned for its backend"""
+    if make_url(database_url).get_backend_name() == "sqlite":
+        # connect_args is required for SQLite when used with FastAPI
+        # check_same_thread=False allows the DB to be accessed from multiple threads
+        sqlite_engine = create_engine(
+            database_url, connect_args={"check_same_thread": False}
+        )
+        event.listen(sqlite_engine, "connect", _apply_sqlite_pragmas)
+        return sqlite_engine
+
+    # Server databases (Postgres) get a sized connection pool
+    # pool_pre_ping drops connections the server closed while they sat idle
+    # pool_recycle replaces connections before server/proxy idle timeouts hit
+    return create_engine(
+        database_url,
+        poolclass=QueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def create_async_db_engine(database_url: str = DATABASE_URL):
+    """Async engine for the same database, used by async route handlers"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend == "sqlite":
+        # aiosqlite runs each SQLite connection on its own thread
+        async_db_engine = create_async_engine(url.set(drivername="sqlite+aiosqlite"))
+        # Pragmas are applied on the underlying sync engine's connect event
+        event.listen(async_db_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return async_db_engine
+
+    if backend == "postgresql":
+        url = url.set(drivername="postgresql+asyncpg")
+    return create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+def get_pool_stats(db_engine=None) -> dict:
+    """Connection pool statistics for monitoring"""
+    pool = (db_engine or engine).pool
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    # Only queue-based pools track checked-in/out connections
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
 
 # Create the database engine
-# connect_args is required for SQLite when used with FastAPI
-# check_same_thread=False allows the DB to be accessed from multiple threads
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+engine = create_db_engine()
+# Count statements per request (see core/query_stats.py)
+instrument_engine(engine)
 
 # Create a session factory
 # autocommit=False → changes must be committed manually
@@ -29,6 +108,17 @@ SessionLocal = sessionmaker(
 # All database models will inherit from this Base
 Base = declarative_base()
 
+# Async engine and session factory for async def routes
+# expire_on_commit=False → objects stay readable after commit without another query
+async_engine = create_async_db_engine()
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # It provides a database session to routes
 def get_db():
     # Create a new database session
@@ -39,3 +129,9 @@ def get_db():
     finally:
         # Always close the session after the request is finished
         db.close()
+
+# It provides an async database session to async routes
+# DB calls are awaited, so a slow disk or lock no longer blocks the event loop
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
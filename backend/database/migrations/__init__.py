@@ -0,0 +1,177 @@
+"""
+Versioned schema migrations.
+
+Each module in ``database/migrations/versions`` is named ``NNNN_description.py``
+and defines ``upgrade(conn)``. Applied versions are recorded in the
+``schema_version`` table. On startup ``run_migrations`` compares the recorded
+version with the newest script in a single query and returns straight away
+when they match. Otherwise one worker takes the migration lock and applies the
+missing scripts in order, each in its own transaction. The other workers wait
+for it to finish.
+
+Migration 0001 creates every table from the current models, so later scripts
+only have to upgrade databases created before them and must check what
+already exists (see ``add_column_if_missing``).
+
+A script that rewrites a large table can also define
+``upgrade_batches(engine, keep_alive)``. It runs after ``upgrade`` has
+committed and commits batch by batch, calling ``keep_alive()`` between
+batches so the lock isn't taken for stale. The version is only recorded once
+it finishes, so an interrupted run picks up again on the next start; both
+steps must therefore be safe to repeat.
+"""
+import importlib
+import logging
+import os
+import pkgutil
+import socket
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, insert, delete, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+
+logger = logging.getLogger(__name__)
+
+# Kept apart from the models' metadata so create_all never touches these tables
+migration_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# A single row (id=1) exists while a worker is migrating
+migration_lock = Table(
+    "schema_migration_lock",
+    migration_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("owner", String, nullable=False),
+    Column("locked_at", DateTime, nullable=False),
+)
+
+LOCK_POLL_SECONDS = 0.5
+# A lock older than this was left behind by a worker that died mid-migration
+STALE_LOCK_AFTER = timedelta(minutes=10)
+
+
+class MigrationLockTimeout(RuntimeError):
+    """Raised when another worker holds the migration lock for too long"""
+
+
+def load_migrations() -> list:
+    """Return ``(version, description, module)`` for every script, oldest first"""
+    from database.migrations import versions
+
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        number, _, description = module_info.name.partition("_")
+        if not number.isdigit():
+            continue
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        migrations.append((int(number), description.replace("_", " "), module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def column_names(conn, table_name: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table_name)}
+
+
+def add_column_if_missing(conn, table_name: str, column_name: str, column_ddl: str):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if column_name not in column_names(conn, table_name):
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_ddl}"))
+
+
+def current_version(engine) -> int:
+    """Highest applied version, or 0 for a database that was never migrated"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # schema_version doesn't exist yet
+        return 0
+
+
+def _create_bookkeeping_tables(engine):
+    """
+    Create schema_version and the lock table. This happens before the lock
+    can exist, so workers booting together may both try; the one that loses
+    gets "already exists", which is fine once the tables are there.
+    """
+    try:
+        migration_metadata.create_all(bind=engine)
+    except (OperationalError, ProgrammingError, IntegrityError):
+        existing = set(inspect(engine).get_table_names())
+        if not {table.name for table in migration_metadata.sorted_tables} <= existing:
+            raise
+
+
+def _acquire_lock(engine, owner: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(migration_lock).values(id=1, owner=owner, locked_at=datetime.utcnow()))
+            return
+        except IntegrityError:
+            pass
+
+        with engine.begin() as conn:
+            conn.execute(delete(migration_lock).where(migration_lock.c.locked_at < datetime.utcnow() - STALE_LOCK_AFTER))
+
+        if time.monotonic() >= deadline:
+            raise MigrationLockTimeout("Timed out waiting for another worker to finish migrating")
+        time.sleep(LOCK_POLL_SECONDS)
+
+
+def _refresh_lock(engine, owner: str):
+    with engine.begin() as conn:
+        conn.execute(update(migration_lock).where(migration_lock.c.owner == owner).values(locked_at=datetime.utcnow()))
+
+
+def _record_version(conn, version: int, description: str):
+    conn.execute(insert(schema_version).values(
+        version=version, description=description, applied_at=datetime.utcnow()
+    ))
+
+
+def _release_lock(engine, owner: str):
+    with engine.begin() as conn:
+        conn.execute(delete(migration_lock).where(migration_lock.c.owner == owner))
+
+
+def run_migrations(engine, lock_timeout: float = 300) -> int:
+    """Bring the database up to the newest migration and return its version"""
+    migrations = load_migrations()
+    latest = migrations[-1][0] if migrations else 0
+
+    # Fast path for every boot after the first: one query, nothing to do
+    if current_version(engine) >= latest:
+        return latest
+
+    _create_bookkeeping_tables(engine)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    _acquire_lock(engine, owner, lock_timeout)
+    try:
+        # Another worker may have finished while this one waited for the lock
+        applied = current_version(engine)
+        for version, description, module in migrations:
+            if version <= applied:
+                continue
+            logger.info(f"Applying migration {version:04d}: {description}")
+            upgrade_batches = getattr(module, "upgrade_batches", None)
+            with engine.begin() as conn:
+                module.upgrade(conn)
+                if upgrade_batches is None:
+                    _record_version(conn, version, description)
+            if upgrade_batches is not None:
+                upgrade_batches(engine, lambda: _refresh_lock(engine, owner))
+                with engine.begin() as conn:
+                    _record_version(conn, version, description)
+        return latest
+    finally:
+        _release_lock(engine, owner)
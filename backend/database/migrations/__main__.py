@@ -0,0 +1,6 @@
+# Apply pending migrations from the command line: python -m database.migrations
+from database.database import engine
+from database.migrations import run_migrations
+
+if __name__ == "__main__":
+    print(f"Database is at schema version {run_migrations(engine)}")
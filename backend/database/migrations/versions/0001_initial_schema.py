@@ -0,0 +1,7 @@
+"""Create every table defined by the models (only missing tables are created)"""
+from database.database import Base
+import database.models  # noqa: F401 - registers the models on Base.metadata
+
+
+def upgrade(conn):
+    Base.metadata.create_all(bind=conn)
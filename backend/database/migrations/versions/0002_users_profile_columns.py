@@ -0,0 +1,24 @@
+"""Role, profile and status columns that used to be added to users on every boot in main.py"""
+from database.migrations import add_column_if_missing
+
+USER_COLUMNS = [
+    ("role", "TEXT DEFAULT 'user'"),
+    ("profile_picture", "TEXT DEFAULT NULL"),
+    ("height", "INTEGER DEFAULT NULL"),
+    ("weight", "INTEGER DEFAULT NULL"),
+    ("age", "INTEGER DEFAULT NULL"),
+    ("gender", "TEXT DEFAULT NULL"),
+    ("activity_level", "TEXT DEFAULT NULL"),
+    ("goal", "TEXT DEFAULT NULL"),
+    ("phone", "TEXT DEFAULT NULL"),
+    ("company", "TEXT DEFAULT NULL"),
+    ("title", "TEXT DEFAULT NULL"),
+    ("location", "TEXT DEFAULT NULL"),
+    ("bio", "TEXT DEFAULT NULL"),
+    ("status", "TEXT DEFAULT 'Active'"),
+]
+
+
+def upgrade(conn):
+    for column_name, column_ddl in USER_COLUMNS:
+        add_column_if_missing(conn, "users", column_name, column_ddl)
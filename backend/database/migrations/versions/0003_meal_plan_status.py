@@ -0,0 +1,6 @@
+"""Status column marking meal plans that are still being generated"""
+from database.migrations import add_column_if_missing
+
+
+def upgrade(conn):
+    add_column_if_missing(conn, "meal_plans", "status", "TEXT DEFAULT 'ready'")
@@ -0,0 +1,16 @@
+"""Composite indexes for the meal plan, meal history, token and nutrition input lookups"""
+from database.models import ClientProfile, MealHistory, MealPlan, NutritionInput
+
+HOT_QUERY_INDEXES = {
+    MealPlan: ["ix_meal_plans_user_id_created_at"],
+    MealHistory: ["ix_meal_history_mealplan_id_day_number"],
+    ClientProfile: ["ix_client_profiles_email_verification", "ix_client_profiles_password_reset"],
+    NutritionInput: ["ix_nutrition_inputs_client_id"],
+}
+
+
+def upgrade(conn):
+    for model, index_names in HOT_QUERY_INDEXES.items():
+        for index in model.__table__.indexes:
+            if index.name in index_names:
+                index.create(bind=conn, checkfirst=True)
@@ -0,0 +1,8 @@
+"""Index for paging through all meal plans newest first"""
+from database.models import MealPlan
+
+
+def upgrade(conn):
+    for index in MealPlan.__table__.indexes:
+        if index.name == "ix_meal_plans_created_at":
+            index.create(bind=conn, checkfirst=True)
@@ -0,0 +1,6 @@
+"""Per-meal rows for generated plans (existing day 0 plans are split by the backfill job)"""
+from database.models import MealEntry
+
+
+def upgrade(conn):
+    MealEntry.__table__.create(bind=conn, checkfirst=True)
@@ -0,0 +1,31 @@
+"""Store meal history as zstd frames and compress the existing rows"""
+from sqlalchemy import LargeBinary, inspect, text
+
+from database.compression import meal_plan_codec, recompress_meal_history, train_dictionary
+from database.models import CompressionDictionary
+
+
+def upgrade(conn):
+    CompressionDictionary.__table__.create(bind=conn, checkfirst=True)
+
+    if conn.dialect.name == "postgresql":
+        meals_json = next(column for column in inspect(conn).get_columns("meal_history")
+                          if column["name"] == "meals_json")
+        if not isinstance(meals_json["type"], LargeBinary):
+            conn.execute(text(
+                "ALTER TABLE meal_history ALTER COLUMN meals_json TYPE BYTEA USING convert_to(meals_json, 'UTF8')"
+            ))
+    # SQLite columns take blobs whatever their declared type, so nothing to alter there
+
+    meal_plan_codec.load_dictionaries(conn)
+    if not meal_plan_codec.dictionary_ids:
+        try:
+            train_dictionary(conn)
+        except ValueError:
+            # Too few plans to train on yet: compress without a dictionary for now
+            pass
+
+
+def upgrade_batches(engine, keep_alive):
+    # Every row is rewritten, so commit batch by batch instead of in one long transaction
+    recompress_meal_history(engine, on_batch=keep_alive)
@@ -0,0 +1,13 @@
+"""Archive table for old meal plans, and removal of days orphaned by plan deletes"""
+from sqlalchemy import delete, select
+
+from database.models import MealEntry, MealHistory, MealPlan, MealPlanArchive
+
+
+def upgrade(conn):
+    MealPlanArchive.__table__.create(bind=conn, checkfirst=True)
+
+    # delete_meal_plan used to remove only the plan row
+    live_plans = select(MealPlan.id)
+    conn.execute(delete(MealEntry).where(MealEntry.mealplan_id.not_in(live_plans)))
+    conn.execute(delete(MealHistory).where(MealHistory.mealplan_id.not_in(live_plans)))
@@ -0,0 +1,26 @@
+"""Move the cold profile columns of client_profiles into client_profile_details"""
+from sqlalchemy import text
+
+from database.migrations import column_names
+from database.models import ClientProfileDetails
+
+COLD_COLUMNS = ("profile_picture", "phone", "company", "title", "location", "bio")
+
+
+def upgrade(conn):
+    ClientProfileDetails.__table__.create(bind=conn, checkfirst=True)
+
+    # Databases created after the split never had these columns
+    moving = [column for column in COLD_COLUMNS if column in column_names(conn, "client_profiles")]
+    if not moving:
+        return
+
+    columns = ", ".join(moving)
+    any_set = " OR ".join(f"{column} IS NOT NULL" for column in moving)
+    conn.execute(text(
+        f"INSERT INTO client_profile_details (client_id, {columns}) "
+        f"SELECT id, {columns} FROM client_profiles WHERE {any_set}"
+    ))
+    # SQLite supports DROP COLUMN from 3.35
+    for column in moving:
+        conn.execute(text(f"ALTER TABLE client_profiles DROP COLUMN {column}"))
@@ -0,0 +1,22 @@
+"""Refresh tokens get their own table, one row per token, instead of one hash per client profile"""
+from sqlalchemy import text
+
+from database.migrations import column_names
+from database.models import RefreshToken
+
+LEGACY_COLUMNS = ("refresh_token_hash", "refresh_token_expires")
+
+
+def upgrade(conn):
+    RefreshToken.__table__.create(bind=conn, checkfirst=True)
+
+    # Databases created after this change never had the columns
+    if not set(LEGACY_COLUMNS) <= column_names(conn, "client_profiles"):
+        return
+
+    # The stored hashes are not carried over: those tokens have no "jti" or
+    # "sid" claim, so the new store could never accept them. Sessions open
+    # before this change have to sign in again.
+    # SQLite supports DROP COLUMN from 3.35
+    for column in LEGACY_COLUMNS:
+        conn.execute(text(f"ALTER TABLE client_profiles DROP COLUMN {column}"))
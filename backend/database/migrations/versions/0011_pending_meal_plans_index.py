@@ -0,0 +1,8 @@
+"""Partial index on the meal plans still being generated, for the stale pending sweep"""
+from database.models import MealPlan
+
+
+def upgrade(conn):
+    for index in MealPlan.__table__.indexes:
+        if index.name == "ix_meal_plans_pending_created_at":
+            index.create(bind=conn, checkfirst=True)
@@ -0,0 +1,52 @@
+"""Never reuse meal plan ids on SQLite, so a new plan can't take an archived plan's id"""
+from sqlalchemy import MetaData, func, select, text
+from sqlalchemy.schema import CreateTable
+
+from database.migrations import column_names
+from database.models import MealPlan, MealPlanArchive, User
+
+
+def _rebuild_with_autoincrement(conn):
+    # SQLite can't alter a primary key: create the new table, copy, swap.
+    # The foreign keys of meal_history and meal_entries name meal_plans and
+    # point at the new table once it is renamed.
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    new_table = MealPlan.__table__.to_metadata(metadata, name="meal_plans_new")
+    conn.execute(CreateTable(new_table))
+
+    columns = [
+        column.name for column in MealPlan.__table__.columns
+        if column.name in column_names(conn, "meal_plans")
+    ]
+    # The new table has created_at NOT NULL; rows without one get the time of the copy, as in 0015
+    values = ["COALESCE(created_at, CURRENT_TIMESTAMP)" if name == "created_at" else name for name in columns]
+    conn.execute(text(
+        f"INSERT INTO meal_plans_new ({', '.join(columns)}) SELECT {', '.join(values)} FROM meal_plans"
+    ))
+    conn.execute(text("DROP TABLE meal_plans"))
+    conn.execute(text("ALTER TABLE meal_plans_new RENAME TO meal_plans"))
+    for index in MealPlan.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+def upgrade(conn):
+    # PostgreSQL sequences never hand out an id twice
+    if conn.dialect.name != "sqlite":
+        return
+
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'meal_plans'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        _rebuild_with_autoincrement(conn)
+
+    # Plans archived (or deleted) before this change may have ids above the
+    # live ones; start the sequence past all of them
+    highest = max(
+        conn.execute(select(func.max(MealPlan.id))).scalar() or 0,
+        conn.execute(select(func.max(MealPlanArchive.id))).scalar() or 0,
+    )
+    seq = conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'meal_plans'")).scalar()
+    if seq is None:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('meal_plans', :seq)"), {"seq": highest})
+    elif seq < highest:
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'meal_plans'"), {"seq": highest})
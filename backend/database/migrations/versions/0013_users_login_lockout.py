@@ -0,0 +1,13 @@
+"""Login lockout columns on users, the accounts /login authenticates"""
+from database.migrations import add_column_if_missing
+
+USER_COLUMNS = [
+    ("failed_login_attempts", "INTEGER DEFAULT 0"),
+    ("locked_until", "TIMESTAMP DEFAULT NULL"),
+    ("last_login", "TIMESTAMP DEFAULT NULL"),
+]
+
+
+def upgrade(conn):
+    for column_name, column_ddl in USER_COLUMNS:
+        add_column_if_missing(conn, "users", column_name, column_ddl)
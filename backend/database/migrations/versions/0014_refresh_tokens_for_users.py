@@ -0,0 +1,15 @@
+"""Refresh tokens belong to users, the accounts /login authenticates, not to client profiles"""
+from sqlalchemy import text
+
+from database.migrations import column_names
+from database.models import RefreshToken
+
+
+def upgrade(conn):
+    if "client_id" not in column_names(conn, "refresh_tokens"):
+        return
+
+    # Nothing issued tokens for client profiles; the only rows are the ones
+    # an earlier 0010 copied over, which the store always refused
+    conn.execute(text("DROP TABLE refresh_tokens"))
+    RefreshToken.__table__.create(bind=conn)
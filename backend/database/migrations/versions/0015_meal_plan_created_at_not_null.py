@@ -0,0 +1,14 @@
+"""Meal plans always have a created_at, which the list cursor (created_at, id) needs"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    # Plans saved without one (raw inserts, old data) are dated now: a keyset
+    # cursor can't point at or past a NULL, so these rows were unreachable
+    conn.execute(text("UPDATE meal_plans SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL"))
+
+    # SQLite can't add NOT NULL to a column in place; 0012 rebuilt meal_plans
+    # from the model, which declares it, and every write goes through the
+    # model's default
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE meal_plans ALTER COLUMN created_at SET NOT NULL"))
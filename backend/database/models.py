@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, LargeBinary, Float, Index, BigInteger, text
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.ext.associationproxy import association_proxy
 from .database import Base
+from .compression import CompressedText
 from datetime import datetime
 
 
@@ -11,6 +13,13 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     full_name = Column(String(255), nullable=True)
+    # Added to existing databases by migration 0002
+    role = Column(String, default="user")
+    status = Column(String, default="Active")
+    # Login lockout state, written behind by services/login_lockout.py (migration 0013)
+    failed_login_attempts = Column(Integer, default=0)
+    locked_until = Column(DateTime, nullable=True)
+    last_login = Column(DateTime, nullable=True)
 
     # relationship to clients (one coach -> many clients) if needed
     clients = relationship("Client", back_populates="coach")
@@ -24,6 +33,10 @@ class Client(Base):
 
     coach = relationship("User", back_populates="clients")
 
+def _details_proxy(name: str):
+    """client.<name> reads client.details.<name>; the first write creates the details row"""
+    return association_proxy("details", name, creator=lambda value: ClientProfileDetails(**{name: value}))
+
 class ClientProfile(Base):
     __tablename__ = "client_profiles"
 
@@ -39,8 +52,6 @@ class ClientProfile(Base):
     failed_login_attempts = Column(Integer, default=0)
     locked_until = Column(DateTime, nullable=True)
     last_login = Column(DateTime, nullable=True)
-    refresh_token_hash = Column(String, nullable=True)
-    refresh_token_expires = Column(DateTime, nullable=True)
     email_verified = Column(Boolean, default=False)
     email_verification_token = Column(String, nullable=True)
     email_verification_expires = Column(DateTime, nullable=True)
@@ -49,24 +60,69 @@ class ClientProfile(Base):
     tfa_enabled = Column(Boolean, default=False)
     tfa_verified = Column(Boolean, default=False)
     tfa_secret = Column(String, nullable=True)
-    profile_picture = Column(String, nullable=True)  # Path to user's profile picture
     height = Column(Integer, nullable=True)  # User's height in cm
     weight = Column(Integer, nullable=True)  # User's weight in kg
     age = Column(Integer, nullable=True)  # User's age
     gender = Column(String, nullable=True)  # User's gender
     activity_level = Column(String, nullable=True)  # User's activity level
     goal = Column(String, nullable=True)  # User's fitness goal
+    status = Column(String, default="Active")  # User's status (Active, Inactive, Completed)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Never loaded implicitly: ask for it with joinedload/selectinload where it is needed
+    coach = relationship("User", lazy="raise_on_sql")
+    nutrition_inputs = relationship("NutritionInput", back_populates="client")
+
+    # Cold profile fields live in client_profile_details so the row every auth
+    # check reads stays narrow; client.bio etc. still read and write through.
+    # Loaded with one extra SELECT per query rather than one per client; auth
+    # lookups that never read the profile opt out with lazyload().
+    details = relationship("ClientProfileDetails", uselist=False, back_populates="client",
+                           cascade="all, delete-orphan", lazy="selectin")
+    profile_picture = _details_proxy("profile_picture")
+    phone = _details_proxy("phone")
+    company = _details_proxy("company")
+    title = _details_proxy("title")
+    location = _details_proxy("location")
+    bio = _details_proxy("bio")
+
+    __table_args__ = (
+        # Token lookups filter on the token and its expiry (EmailVerification)
+        Index("ix_client_profiles_email_verification", "email_verification_token", "email_verification_expires"),
+        Index("ix_client_profiles_password_reset", "password_reset_token", "password_reset_expires"),
+    )
+
+class ClientProfileDetails(Base):
+    """Rarely read profile fields of a ClientProfile (one-to-one)"""
+    __tablename__ = "client_profile_details"
+
+    client_id = Column(Integer, ForeignKey("client_profiles.id"), primary_key=True)
+    profile_picture = Column(String, nullable=True)  # Path to user's profile picture
     phone = Column(String, nullable=True)
     company = Column(String, nullable=True)
     title = Column(String, nullable=True)
     location = Column(String, nullable=True)
     bio = Column(Text, nullable=True)
-    status = Column(String, default="Active")  # User's status (Active, Inactive, Completed)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    coach = relationship("User")
-    nutrition_inputs = relationship("NutritionInput", back_populates="client")
+    client = relationship("ClientProfile", back_populates="details")
+
+class RefreshToken(Base):
+    """One issued refresh token; a user has one row per device session and rotation"""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), nullable=False, unique=True)  # TokenManager.hash_token
+    jti = Column(String(32), nullable=False, unique=True)  # the token's "jti" claim
+    session_id = Column(String(32), nullable=False, index=True)  # kept across rotations
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # migration 0014
+    device_name = Column(String(255), nullable=True)
+    user_agent = Column(String(512), nullable=True)
+    ip_address = Column(String(45), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
 
 class NutritionInput(Base):
     __tablename__ = "nutrition_inputs"
@@ -80,6 +136,10 @@ class NutritionInput(Base):
 
     client = relationship("ClientProfile", back_populates="nutrition_inputs")
     macro_result = relationship("MacroResult", back_populates="nutrition_input", uselist=False)
+
+    __table_args__ = (
+        Index("ix_nutrition_inputs_client_id", "client_id"),
+    )
 class MacroResult(Base):
     __tablename__ = "macro_results"
 
@@ -92,3 +152,102 @@ class MacroResult(Base):
     fats_g = Column(Float)
 
     nutrition_input = relationship("NutritionInput", back_populates="macro_result")
+
+class MealPlan(Base):
+    __tablename__ = "meal_plans"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    goal = Column(String, nullable=False)
+    diet_type = Column(String, nullable=False)
+    daily_calories = Column(Integer, nullable=False)
+    macro_protein = Column(Float, nullable=False)
+    macro_carbs = Column(Float, nullable=False)
+    macro_fats = Column(Float, nullable=False)
+    # "pending" while the plan is being generated, "ready" once its history is saved
+    status = Column(String, default="ready", nullable=False)
+    # Part of the list cursor (created_at, id), so never NULL (migration 0015)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # A user's plans, newest first (get_user_meal_plans)
+        Index("ix_meal_plans_user_id_created_at", "user_id", "created_at"),
+        # All plans, newest first, paged by (created_at, id) (get_all_meal_plans)
+        Index("ix_meal_plans_created_at", "created_at"),
+        # Only the few plans still being generated (delete_stale_pending_plans)
+        Index("ix_meal_plans_pending_created_at", "created_at",
+              sqlite_where=text("status = 'pending'"), postgresql_where=text("status = 'pending'")),
+        # Archived plans keep their id, so SQLite must never hand it out again
+        {"sqlite_autoincrement": True},
+    )
+
+class MealHistory(Base):
+    __tablename__ = "meal_history"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mealplan_id = Column(Integer, ForeignKey("meal_plans.id"), nullable=False)
+
+    # 1..n for a plan split into days; 0 holds a generated plan that could not be split
+    day_number = Column(Integer, nullable=False)
+    # zstd-compressed; deferred so loading a MealHistory doesn't decompress it until it is read
+    meals_json = deferred(Column(CompressedText, nullable=False))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # A plan's days in order (get_meal_plan, export_meal_plan_pdf)
+        Index("ix_meal_history_mealplan_id_day_number", "mealplan_id", "day_number"),
+    )
+
+class MealPlanArchive(Base):
+    """Plans moved out of meal_plans by the archival job, each with its days as one compressed document"""
+    __tablename__ = "meal_plan_archive"
+
+    id = Column(Integer, primary_key=True)  # the plan's id in meal_plans
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    document = deferred(Column(CompressedText, nullable=False))
+
+    __table_args__ = (
+        Index("ix_meal_plan_archive_user_id_created_at", "user_id", "created_at"),
+    )
+
+class CompressionDictionary(Base):
+    """zstd dictionaries trained on stored meal plans; new rows use the newest one every worker has loaded"""
+    __tablename__ = "compression_dictionaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dict_id = Column(BigInteger, unique=True, nullable=False)  # id zstd writes into each frame
+    dict_data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class MealEntry(Base):
+    """One meal or snack of a plan's day, for reads and aggregates that don't need the whole day"""
+    __tablename__ = "meal_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mealplan_id = Column(Integer, ForeignKey("meal_plans.id"), nullable=False)
+    day_number = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)  # order within the day, meals before snacks
+    kind = Column(String, nullable=False)  # "meal" or "snack"
+    name = Column(String, nullable=False)
+    calories = Column(Float, nullable=True)
+    ingredients_json = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # A day's meals in order, and per-plan aggregates (get_meal, get_meal_plan_summary)
+        Index("ix_meal_entries_mealplan_id_day_number_position", "mealplan_id", "day_number", "position"),
+    )
+
+class AuditLog(Base):
+    __tablename__ = "audit_logs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=True)  # Nullable for events before user authentication
+    ip_address = Column(String, nullable=True)
+    user_agent = Column(Text, nullable=True)
+    details = Column(Text, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
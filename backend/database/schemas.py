@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, EmailStr, Field
 
 # --- User schemas ---
@@ -18,6 +20,11 @@ class UserOut(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    # Exchanged at /refresh for a new pair, revoked by /logout
+    refresh_token: str | None = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class ClientCreate(BaseModel):
  name: str
@@ -27,6 +34,21 @@ class ClientCreate(BaseModel):
  weight_kg: float
 
 
+class ClientImportRow(ClientCreate):
+ email: EmailStr
+
+
+class ClientImportError(BaseModel):
+ row: int
+ errors: list[str]
+
+
+class ClientImportResult(BaseModel):
+ imported: int
+ failed: int
+ errors: list[ClientImportError]
+
+
 class ClientResponse(ClientCreate):
  id: int
  model_config = {"from_attributes": True}
@@ -38,6 +60,52 @@ class NutritionInputSchema(BaseModel):
  diet_type: str
 
 
+# --- Meal plan schemas ---
+class MacroSplit(BaseModel):
+    protein: float
+    carbs: float
+    fats: float
+
+
+class MealPlanCreate(BaseModel):
+    goal: str
+    diet_type: str
+    daily_calories: int
+    macros: MacroSplit
+
+
+class MealPlanResponse(BaseModel):
+    id: int
+    goal: str
+    diet_type: str
+    daily_calories: int
+    macro_protein: float
+    macro_carbs: float
+    macro_fats: float
+    created_at: datetime | None = None
+
+
+class MealHistoryResponse(BaseModel):
+    id: int
+    day_number: int
+    meals_json: str
+    created_at: datetime | None = None
+
+
+class MealPlanFullResponse(BaseModel):
+    mealplan: MealPlanResponse
+    history: list[MealHistoryResponse]
+
+
+class MealEntryResponse(BaseModel):
+    day_number: int
+    position: int
+    kind: str
+    name: str
+    calories: float | None = None
+    ingredients: list[str] = []
+
+
 class MacroResponse(BaseModel):
  calories: float
  protein_g: float
@@ -1,9 +1,17 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from database.database import engine
-from database.models import Base
+from database.database import engine, SessionLocal
+from database.migrations import run_migrations
+from database.compression import meal_plan_codec
+from core.query_stats import QueryStatsMiddleware
 from core.security import get_rate_limit_middleware
+from services.pdf_service import pdf_render_pool, pdf_prerenderer
+from services.password_hasher import password_hasher
+from core.principal_cache import principal_cache
+from services.login_lockout import login_lockout
+from services.refresh_tokens import refresh_token_store
+from services.archival import delete_stale_pending_plans
 
 app = FastAPI(title="AI-Nutritionist Backend - Week1")
 
@@ -15,72 +23,19 @@ app = FastAPI(
     description="LLM-powered nutritional recommendation service",
     version="1.0.0"
 )
-Base.metadata.create_all(bind=engine)
 
 # Add rate limiting middleware
 app = get_rate_limit_middleware(app)
 
 # Handle schema updates
-from sqlalchemy import text
-
-# Add role column if it doesn't exist
-with engine.connect() as conn:
-    # Check if role column exists
-    result = conn.execute(text("PRAGMA table_info(users)"))
-    columns = [row[1] for row in result.fetchall()]
-    
-    if 'role' not in columns:
-        # Add role column to users table
-        conn.execute(text("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'user'"))
-        conn.commit()
-    
-    # Check if profile_picture column exists
-    if 'profile_picture' not in columns:
-        # Add profile_picture column to users table
-        conn.execute(text("ALTER TABLE users ADD COLUMN profile_picture TEXT DEFAULT NULL"))
-        conn.commit()
-    
-    # Check if profile-related columns exist
-    # Add columns with appropriate data types
-    if 'height' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN height INTEGER DEFAULT NULL"))
-        conn.commit()
-    if 'weight' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN weight INTEGER DEFAULT NULL"))
-        conn.commit()
-    if 'age' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN age INTEGER DEFAULT NULL"))
-        conn.commit()
-    if 'gender' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN gender TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'activity_level' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN activity_level TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'goal' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN goal TEXT DEFAULT NULL"))
-        conn.commit()
-    
-    if 'phone' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN phone TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'company' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN company TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'title' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN title TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'location' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN location TEXT DEFAULT NULL"))
-        conn.commit()
-    if 'bio' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN bio TEXT DEFAULT NULL"))
-        conn.commit()
-    
-    # Check if status column exists
-    if 'status' not in columns:
-        conn.execute(text("ALTER TABLE users ADD COLUMN status TEXT DEFAULT 'Active'"))
-        conn.commit()
+# Versioned migrations replace the old PRAGMA/ALTER checks; on an up-to-date
+# database this is a single version lookup
+run_migrations(engine)
+# Load the trained zstd dictionaries used to read and write meal history
+meal_plan_codec.bind(engine)
+
+# Per-request SQL statement counts (logs, and debug headers if QUERY_STATS_HEADER)
+app.add_middleware(QueryStatsMiddleware)
 
 # CORS
 app.add_middleware(
@@ -89,6 +44,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers the frontend reads: the meal plan list's next page
+    # cursor, and when a 429 from the rate limiter may be retried
+    expose_headers=["X-Next-Cursor", "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],
 )
 
 # Create uploads directory if it doesn't exist
@@ -102,6 +60,57 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 app.include_router(mealplan.router, prefix="/api")
 app.include_router(auth.router)
 
+@app.on_event("shutdown")
+def shutdown_pdf_render_pool():
+    pdf_prerenderer.stop()
+    pdf_render_pool.shutdown()
+
+@app.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("startup")
+def start_principal_invalidation():
+    # Only connects when PRINCIPAL_INVALIDATION_REDIS_URL is set
+    principal_cache.channel.start()
+
+@app.on_event("shutdown")
+def stop_principal_invalidation():
+    principal_cache.channel.close()
+
+@app.on_event("startup")
+def start_login_lockout():
+    # Reload saved lockouts, then write counters behind in batches
+    login_lockout.start(engine)
+
+@app.on_event("shutdown")
+def stop_login_lockout():
+    login_lockout.stop()
+
+@app.on_event("startup")
+def start_compression_dictionary_refresh():
+    # Picks up dictionaries trained after startup (python -m database.compression train)
+    meal_plan_codec.start_refresh()
+
+@app.on_event("shutdown")
+def stop_compression_dictionary_refresh():
+    meal_plan_codec.stop_refresh()
+
+@app.on_event("startup")
+def sweep_stale_meal_plans():
+    # Plans a worker left "pending" when it died mid-generation
+    with SessionLocal() as db:
+        delete_stale_pending_plans(db)
+
+@app.on_event("startup")
+def start_refresh_token_sweep():
+    # Rebuilds the revoked-token filter, then deletes expired tokens periodically
+    refresh_token_store.start(engine)
+
+@app.on_event("shutdown")
+def stop_refresh_token_sweep():
+    refresh_token_store.stop()
+
 @app.get("/")
 def root():
     return {"message": "AI-Nutritionist backend (Week 1) is running"}
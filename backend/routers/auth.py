@@ -1,37 +1,163 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import database as db_module
 from database import models, schemas
 from core import security
+from core.principal_cache import Principal, principal_cache
+from services.password_hasher import password_hasher, PasswordHashQueueFullError
+from services.login_lockout import login_lockout
+from services.refresh_tokens import RefreshTokenError, refresh_token_store
 from datetime import timedelta
 
 router = APIRouter()
 
 # dependency to get DB session
-def get_db():
-    yield from db_module.get_db()
+async def get_db():
+    async for session in db_module.get_async_db():
+        yield session
+
+def _too_busy():
+    # bcrypt is CPU bound; shed the request rather than queue it behind a login storm
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, please retry shortly",
+        headers={"Retry-After": "2"},
+    )
+
+def _unauthorized():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _device(request: Request) -> dict:
+    """Device metadata stored with a refresh token"""
+    return {
+        "user_agent": (request.headers.get("user-agent") or "")[:512] or None,
+        "ip_address": request.client.host if request.client else None,
+    }
+
+async def load_principal(user_id: int) -> Principal | None:
+    """Load a user's principal from the database and cache it"""
+    generation = principal_cache.generation
+    # A session of its own, so cache hits never open one
+    async with db_module.AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(models.User.id, models.User.email, models.User.full_name,
+                   models.User.role, models.User.status, models.User.is_active)
+            .where(models.User.id == user_id)
+        )).first()
+    if row is None:
+        return None
+    principal = Principal(
+        id=row.id,
+        email=row.email,
+        name=row.full_name,
+        role=row.role or "user",
+        status=row.status or "Active",
+        is_active=bool(row.is_active),
+    )
+    principal_cache.put(principal, generation)
+    return principal
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security.security_scheme)) -> Principal:
+    """
+    FastAPI dependency returning the signed-in user as a Principal. Served
+    from the principal cache, so most requests don't touch the users table.
+    """
+    payload = security.decode_access_token(credentials.credentials)
+    try:
+        user_id = int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise _unauthorized()
+
+    principal = principal_cache.get(user_id) or await load_principal(user_id)
+    if principal is None or not principal.is_active:
+        raise _unauthorized()
+    return principal
+
+def is_user_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    """FastAPI dependency that only lets admins through"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
 
 @router.post("/register", response_model=schemas.UserOut, status_code=status.HTTP_201_CREATED)
-def register(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     # check if user exists
-    existing = db.query(models.User).filter(models.User.email == user_in.email).first()
+    existing = (await db.execute(select(models.User.id).where(models.User.email == user_in.email))).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed = security.get_password_hash(user_in.password)
+    try:
+        hashed = await password_hasher.hash(user_in.password)
+    except PasswordHashQueueFullError:
+        raise _too_busy()
     user = models.User(email=user_in.email, hashed_password=hashed, full_name=user_in.full_name)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def login(form_data: schemas.UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
     # Using UserCreate schema for simplicity (email + password)
-    user = db.query(models.User).filter(models.User.email == form_data.email).first()
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    # Locked accounts are refused before any query or bcrypt work
+    if login_lockout.locked_until(form_data.email):
+        raise HTTPException(
+            status_code=status.HTTP_423_LOCKED,
+            detail="Account is locked due to too many failed login attempts. Please try again later."
+        )
+    user = (await db.execute(select(models.User).where(models.User.email == form_data.email))).scalar_one_or_none()
+    if not user:
+        # Unknown emails count too, so lockouts don't reveal which accounts exist
+        login_lockout.record_failure(form_data.email)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+
+    try:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    except PasswordHashQueueFullError:
+        raise _too_busy()
+    if not verified:
+        login_lockout.record_failure(form_data.email)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    login_lockout.record_success(form_data.email)
+    if new_hash:
+        # Stored with an older bcrypt cost; upgrade it while we have the password
+        user.hashed_password = new_hash
+        await db.commit()
+        principal_cache.invalidate(user.id)
 
     access_token_expires = timedelta(minutes=60)
     token = security.create_access_token({"sub": str(user.id)}, expires_delta=access_token_expires)
-    return {"access_token": token, "token_type": "bearer"}
+    # A new device session (services/refresh_tokens.py)
+    refresh_token = await db.run_sync(refresh_token_store.issue, user.id, **_device(request))
+    return {"access_token": token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh(body: schemas.RefreshRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Exchange a refresh token for a new access token and refresh token; the old one stops working"""
+    try:
+        user_id, refresh_token = await db.run_sync(refresh_token_store.rotate, body.refresh_token, **_device(request))
+    except RefreshTokenError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e),
+                            headers={"WWW-Authenticate": "Bearer"})
+
+    principal = principal_cache.get(user_id) or await load_principal(user_id)
+    if principal is None or not principal.is_active:
+        await db.run_sync(refresh_token_store.revoke, refresh_token)
+        raise _unauthorized()
+    token = security.create_access_token({"sub": str(user_id)})
+    return {"access_token": token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout")
+async def logout(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """
+    End the refresh token's session. The access token stays valid until it
+    expires, as nothing revokes access tokens (see JWT_CACHE_SIZE in core/config.py).
+    """
+    await db.run_sync(refresh_token_store.revoke, body.refresh_token)
+    return {"detail": "Signed out"}
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from sqlalchemy.orm import Session, joinedload, lazyload
 from database.database import get_db
 from database import models, schemas
-from core.security import get_current_user
+from routers.auth import get_current_user
+from services import client_import
 
 
 router = APIRouter()
@@ -14,15 +15,31 @@ def create_client(
  db: Session = Depends(get_db),
  user=Depends(get_current_user)
  ):
- client = models.ClientProfile(coach_id=user["sub"], **data.dict())
+ client = models.ClientProfile(coach_id=user.id, **data.dict())
  db.add(client)
  db.commit()
  db.refresh(client)
  return client
 
+@router.post("/clients/import", response_model=schemas.ClientImportResult)
+def import_clients(
+ file: UploadFile = File(...),
+ db: Session = Depends(get_db),
+ user=Depends(get_current_user)
+ ):
+ """Create many clients from a CSV or NDJSON upload; rows that fail are listed with their row number"""
+ try:
+  file_format = client_import.detect_format(file.filename, file.content_type)
+ except client_import.ClientImportFormatError as e:
+  raise HTTPException(400, str(e))
+ return client_import.import_clients(db, user.id, file.file, file_format)
+
 @router.get("/clients/{client_id}", response_model=schemas.ClientResponse)
 def get_client(client_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
- client = db.query(models.ClientProfile).filter_by(id=client_id, coach_id=user["sub"]).first()
+ # ClientResponse has no profile detail fields
+ client = db.query(models.ClientProfile).options(
+  lazyload(models.ClientProfile.details)
+ ).filter_by(id=client_id, coach_id=user.id).first()
  if not client:
   raise HTTPException(404)
  return client
@@ -30,7 +47,10 @@ def get_client(client_id: int, db: Session = Depends(get_db), user=Depends(get_c
 
 @router.delete("/clients/{client_id}")
 def delete_client(client_id: int, db: Session = Depends(get_db), user=Depends(get_current_user)):
- client = db.query(models.ClientProfile).filter_by(id=client_id, coach_id=user["sub"]).first()
+ # The delete cascades to the details row, so load it in the same query
+ client = db.query(models.ClientProfile).options(
+  joinedload(models.ClientProfile.details)
+ ).filter_by(id=client_id, coach_id=user.id).first()
  if not client:
   raise HTTPException(404)
  db.delete(client)
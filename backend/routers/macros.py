@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from database.database import get_db
 from database import models, schemas
 from services.macro_calculator import (
@@ -15,7 +15,13 @@ router = APIRouter()
 
 @router.post("/macros/{nutrition_id}", response_model=schemas.MacroResponse)
 def generate_macros(nutrition_id: int, db: Session = Depends(get_db)):
- nutrition = db.query(models.NutritionInput).filter_by(id=nutrition_id).first()
+ # The client is needed right away, so load it in the same query
+ nutrition = (
+  db.query(models.NutritionInput)
+  .options(joinedload(models.NutritionInput.client))
+  .filter_by(id=nutrition_id)
+  .first()
+ )
  client = nutrition.client
 
 
@@ -1,96 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from database.schemas import MealPlanCreate, MealPlanResponse, MealPlanFullResponse
-from database.database import get_db
-from database.models import MealPlan, MealHistory, User
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, or_, func
+from database.schemas import MealPlanCreate, MealPlanResponse, MealPlanFullResponse, MealHistoryResponse, MealEntryResponse
+from database.database import (
+    get_db, get_async_db, get_pool_stats, SessionLocal, AsyncSessionLocal, engine, async_engine
+)
+from database.models import MealPlan, MealHistory, MealEntry, MealPlanArchive
 from ai.generator import generate_meal_plan
-from ai.pdf_generator import generate_meal_plan_pdf
+from ai.pdf_generator import render_meal_plan_pdf
+from services.meal_plan_storage import build_plan_rows, FULL_PLAN_DAY
+from services.archival import (
+    archived_document_query, delete_meal_plan_rows, load_archived_meal_plan, parse_archived_document
+)
+from services.pdf_service import (
+    pdf_render_pool, pdf_cache, pdf_prerenderer, iter_pdf_chunks, stream_pdf_zip,
+    PdfQueueFullError, PdfRenderTimeoutError
+)
+from core.config import settings
 from routers.auth import get_current_user
 from routers.auth import is_user_admin
-from fastapi.responses import FileResponse
+from core.principal_cache import Principal
+from fastapi.responses import StreamingResponse
+from core.responses import RowsJSONResponse
+from datetime import datetime
+from itertools import groupby
+import base64
 import json
-import tempfile
-import os
 
 
 router = APIRouter(prefix="/mealplan", tags=["Meal Plan"])
 
+NDJSON_BATCH_SIZE = 500
+# Plans whose history is read per query while a bulk PDF export streams
+PDF_BULK_BATCH_SIZE = 10
+
+# Field names of MealPlanResponse, for rows returned through RowsJSONResponse
+MEAL_PLAN_FIELDS = ("id", "goal", "diet_type", "daily_calories",
+                    "macro_protein", "macro_carbs", "macro_fats", "created_at")
+
 
 @router.post("/", response_model=MealPlanResponse)
 async def create_meal_plan(
     request: MealPlanCreate, 
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user)
 ):
-    # Create meal plan record in database
-    db_meal_plan = MealPlan(
-        user_id=current_user.id,
-        goal=request.goal,
-        diet_type=request.diet_type,
-        daily_calories=request.daily_calories,
-        macro_protein=request.macros.protein,
-        macro_carbs=request.macros.carbs,
-        macro_fats=request.macros.fats
-    )
+    # The LLM call takes seconds, so no session (and no pooled connection) is
+    # held across it. The plan is written in short transactions instead:
+    # first as "pending", then with its history once generation succeeds.
     
-    db.add(db_meal_plan)
-    db.commit()
-    db.refresh(db_meal_plan)
+    # Phase 1: create the meal plan record as pending
+    async with AsyncSessionLocal() as db:
+        db_meal_plan = MealPlan(
+            user_id=current_user.id,
+            goal=request.goal,
+            diet_type=request.diet_type,
+            daily_calories=request.daily_calories,
+            macro_protein=request.macros.protein,
+            macro_carbs=request.macros.carbs,
+            macro_fats=request.macros.fats,
+            status="pending"
+        )
+        db.add(db_meal_plan)
+        await db.commit()
+        mealplan_id = db_meal_plan.id
     
     # Generate the meal plan using AI
     try:
         generated_plan = await generate_meal_plan(request)
         
-        # Save the generated plan to MealHistory
-        meal_history = MealHistory(
-            mealplan_id=db_meal_plan.id,
-            day_number=0,  # 0 indicates the full plan
-            meals_json=generated_plan
-        )
+        # Phase 2: save the plan as day and meal rows and mark the plan ready
+        history_rows, meal_entries = build_plan_rows(mealplan_id, generated_plan)
+        async with AsyncSessionLocal() as db:
+            db.add_all(history_rows)
+            db.add_all(meal_entries)
+            await db.execute(
+                update(MealPlan).where(MealPlan.id == mealplan_id).values(status="ready")
+            )
+            await db.commit()
+            
+            # Return as response model to ensure proper serialization
+            # Use a separate query to fetch only the needed fields without relationships
+            created_plan = (await db.execute(
+                select(
+                    MealPlan.id,
+                    MealPlan.goal,
+                    MealPlan.diet_type,
+                    MealPlan.daily_calories,
+                    MealPlan.macro_protein,
+                    MealPlan.macro_carbs,
+                    MealPlan.macro_fats,
+                    MealPlan.created_at
+                ).where(MealPlan.id == mealplan_id)
+            )).first()
         
-        db.add(meal_history)
-        db.commit()
+        if settings.PDF_PRERENDER_ENABLED:
+            _queue_pdf_prerender(created_plan, history_rows, current_user.name)
         
-        # Return as response model to ensure proper serialization
-        # Use a separate query to fetch only the needed fields without relationships
-        created_plan = db.execute(
-            select(
-                MealPlan.id,
-                MealPlan.goal,
-                MealPlan.diet_type,
-                MealPlan.daily_calories,
-                MealPlan.macro_protein,
-                MealPlan.macro_carbs,
-                MealPlan.macro_fats,
-                MealPlan.created_at
-            ).where(MealPlan.id == db_meal_plan.id)
-        ).first()
-        
-        return MealPlanResponse(
-            id=created_plan.id,
-            goal=created_plan.goal,
-            diet_type=created_plan.diet_type,
-            daily_calories=created_plan.daily_calories,
-            macro_protein=created_plan.macro_protein,
-            macro_carbs=created_plan.macro_carbs,
-            macro_fats=created_plan.macro_fats,
-            created_at=created_plan.created_at
-        )
+        return RowsJSONResponse(created_plan._asdict())
     except Exception as e:
-        # If generation fails, remove the meal plan record
-        db.delete(db_meal_plan)
-        db.commit()
+        # If generation fails, remove the pending meal plan record
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(MealPlan).where(MealPlan.id == mealplan_id))
+            await db.commit()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate meal plan: {str(e)}"
         )
 
 
-@router.get("/{mealplan_id}", response_model=MealPlanFullResponse)
+@router.get("/{mealplan_id:int}", response_model=MealPlanFullResponse)
 def get_meal_plan(
     mealplan_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     # Query only the specific columns needed to avoid relationship issues
@@ -106,142 +128,330 @@ def get_meal_plan(
             MealPlan.created_at
         ).where(
             MealPlan.id == mealplan_id,
-            MealPlan.user_id == current_user.id
+            MealPlan.user_id == current_user.id,
+            MealPlan.status == "ready"
         )
     )
     meal_plan_row = result.first()
     
-    if not meal_plan_row:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Meal plan not found"
+    if meal_plan_row:
+        # Query history separately
+        history_result = db.execute(
+            select(
+                MealHistory.id,
+                MealHistory.day_number,
+                MealHistory.meals_json,
+                MealHistory.created_at
+            ).where(MealHistory.mealplan_id == mealplan_id)
         )
+    else:
+        # Plans past the retention age are read back from the archive
+        archived = load_archived_meal_plan(db, mealplan_id, current_user.id)
+        if not archived:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Meal plan not found"
+            )
+        meal_plan_row, history_result, _ = archived
     
-    from database.schemas import MealPlanResponse, MealHistoryResponse
-    
-    # Query history separately
-    history_result = db.execute(
+    # Archived plans come back as namespaces, so pick the fields by name
+    return RowsJSONResponse({
+        "mealplan": {field: getattr(meal_plan_row, field) for field in MEAL_PLAN_FIELDS},
+        "history": [
+            {
+                "id": hist.id,
+                "day_number": hist.day_number,
+                "meals_json": hist.meals_json,
+                "created_at": hist.created_at
+            }
+            for hist in history_result
+        ]
+    })
+
+
+@router.get("/{mealplan_id:int}/day/{day_number:int}", response_model=MealHistoryResponse)
+def get_meal_plan_day(
+    mealplan_id: int,
+    day_number: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """A single day of a meal plan, read without loading the rest of the plan"""
+    hist = db.execute(
         select(
             MealHistory.id,
             MealHistory.day_number,
             MealHistory.meals_json,
             MealHistory.created_at
-        ).where(MealHistory.mealplan_id == mealplan_id)
-    )
+        ).join(
+            MealPlan, MealHistory.mealplan_id == MealPlan.id
+        ).where(
+            MealPlan.id == mealplan_id,
+            MealPlan.user_id == current_user.id,
+            MealPlan.status == "ready",
+            MealHistory.day_number == day_number
+        )
+    ).first()
     
-    # Convert to response models to ensure proper serialization
-    mealplan_response = MealPlanResponse(
-        id=meal_plan_row.id,
-        goal=meal_plan_row.goal,
-        diet_type=meal_plan_row.diet_type,
-        daily_calories=meal_plan_row.daily_calories,
-        macro_protein=meal_plan_row.macro_protein,
-        macro_carbs=meal_plan_row.macro_carbs,
-        macro_fats=meal_plan_row.macro_fats,
-        created_at=meal_plan_row.created_at
-    )
+    if hist:
+        return RowsJSONResponse(hist._asdict())
+    
+    # Plans past the retention age are read back from the archive
+    archived = load_archived_meal_plan(db, mealplan_id, current_user.id)
+    if archived:
+        hist = next((day for day in archived[1] if day.day_number == day_number), None)
+    if not hist:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal plan day not found"
+        )
     
-    history_responses = []
-    for hist in history_result:
-        history_response = MealHistoryResponse(
-            id=hist.id,
-            day_number=hist.day_number,
-            meals_json=hist.meals_json,
-            created_at=hist.created_at
+    return RowsJSONResponse(vars(hist))
+
+
+@router.get("/{mealplan_id:int}/day/{day_number:int}/meal/{position:int}", response_model=MealEntryResponse)
+def get_meal(
+    mealplan_id: int,
+    day_number: int,
+    position: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """A single meal or snack of a day; positions count meals first, then snacks, from 0"""
+    entry = db.execute(
+        select(
+            MealEntry.day_number,
+            MealEntry.position,
+            MealEntry.kind,
+            MealEntry.name,
+            MealEntry.calories,
+            MealEntry.ingredients_json
+        ).join(
+            MealPlan, MealEntry.mealplan_id == MealPlan.id
+        ).where(
+            MealPlan.id == mealplan_id,
+            MealPlan.user_id == current_user.id,
+            MealPlan.status == "ready",
+            MealEntry.day_number == day_number,
+            MealEntry.position == position
         )
-        history_responses.append(history_response)
+    ).first()
+    
+    if not entry:
+        # Plans past the retention age are read back from the archive
+        archived = load_archived_meal_plan(db, mealplan_id, current_user.id)
+        if archived:
+            entry = next(
+                (meal for meal in archived[2] if meal.day_number == day_number and meal.position == position),
+                None
+            )
+    if not entry:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Meal not found"
+        )
+    
+    return MealEntryResponse(
+        day_number=entry.day_number,
+        position=entry.position,
+        kind=entry.kind,
+        name=entry.name,
+        calories=entry.calories,
+        ingredients=json.loads(entry.ingredients_json) if entry.ingredients_json else []
+    )
+
+
+@router.get("/{mealplan_id:int}/summary")
+def get_meal_plan_summary(
+    mealplan_id: int,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Calories per day and average calories per meal and snack, aggregated in SQL"""
+    meal_plan = db.execute(
+        select(MealPlan.id).where(
+            MealPlan.id == mealplan_id,
+            MealPlan.user_id == current_user.id,
+            MealPlan.status == "ready"
+        )
+    ).first()
+    
+    if not meal_plan:
+        # Plans past the retention age are read back from the archive
+        archived = load_archived_meal_plan(db, mealplan_id, current_user.id)
+        if not archived:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Meal plan not found"
+            )
+        return _summarize_archived_entries(mealplan_id, archived[2])
+    
+    days = db.execute(
+        select(
+            MealEntry.day_number,
+            func.sum(MealEntry.calories).label("total_calories"),
+            func.count(MealEntry.id).label("meal_count")
+        ).where(
+            MealEntry.mealplan_id == mealplan_id
+        ).group_by(MealEntry.day_number).order_by(MealEntry.day_number)
+    ).all()
+    
+    averages = db.execute(
+        select(
+            MealEntry.kind,
+            func.avg(MealEntry.calories).label("average_calories")
+        ).where(
+            MealEntry.mealplan_id == mealplan_id
+        ).group_by(MealEntry.kind)
+    ).all()
     
     return {
-        "mealplan": mealplan_response,
-        "history": history_responses
+        "mealplan_id": mealplan_id,
+        "days": [
+            {"day_number": day.day_number, "total_calories": day.total_calories, "meal_count": day.meal_count}
+            for day in days
+        ],
+        "average_calories": {row.kind: row.average_calories for row in averages}
     }
 
 
+def _summarize_archived_entries(mealplan_id: int, entries: list) -> dict:
+    """The summary of an archived plan, with the same NULL handling as SUM/COUNT/AVG"""
+    days = {}
+    calories_by_kind = {}
+    for entry in sorted(entries, key=lambda entry: entry.day_number):
+        day = days.setdefault(entry.day_number, {"day_number": entry.day_number, "total_calories": None, "meal_count": 0})
+        day["meal_count"] += 1
+        kind_calories = calories_by_kind.setdefault(entry.kind, [])
+        if entry.calories is not None:
+            day["total_calories"] = (day["total_calories"] or 0) + entry.calories
+            kind_calories.append(entry.calories)
+    
+    return {
+        "mealplan_id": mealplan_id,
+        "days": list(days.values()),
+        "average_calories": {
+            kind: sum(calories) / len(calories) if calories else None
+            for kind, calories in calories_by_kind.items()
+        }
+    }
+
+
+def _encode_cursor(created_at: datetime, mealplan_id: int) -> str:
+    """Opaque keyset cursor pointing at the last row of a page"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{mealplan_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, mealplan_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(mealplan_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _paginate_newest_first(query, cursor: str | None, limit: int):
+    """Order by (created_at, id) descending and continue after the cursor row"""
+    if cursor:
+        created_at, mealplan_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            MealPlan.created_at < created_at,
+            and_(MealPlan.created_at == created_at, MealPlan.id < mealplan_id)
+        ))
+    # One extra row tells us whether there is a next page
+    return query.order_by(MealPlan.created_at.desc(), MealPlan.id.desc()).limit(limit + 1)
+
+
+def _meal_plan_page(result, limit: int) -> RowsJSONResponse:
+    rows = result.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    # The rows hold exactly the MealPlanResponse columns
+    return RowsJSONResponse([row._asdict() for row in rows], headers=headers)
+
+
+MEAL_PLAN_COLUMNS = (
+    MealPlan.id,
+    MealPlan.goal,
+    MealPlan.diet_type,
+    MealPlan.daily_calories,
+    MealPlan.macro_protein,
+    MealPlan.macro_carbs,
+    MealPlan.macro_fats,
+    MealPlan.created_at
+)
+
+
 @router.get("/user", response_model=list[MealPlanResponse])
 def get_user_meal_plans(
-    current_user: User = Depends(get_current_user),
+    cursor: str | None = None,
+    limit: int = Query(default=settings.MEALPLAN_PAGE_SIZE, ge=1, le=settings.MEALPLAN_MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    from database.schemas import MealPlanResponse
-    from sqlalchemy import select
-    
+    """Get the user's meal plans, newest first, one page at a time.
+    Pass the X-Next-Cursor response header back as `cursor` for the next page."""
     # Query only the specific columns needed to avoid relationship issues
-    result = db.execute(
-        select(
-            MealPlan.id,
-            MealPlan.goal,
-            MealPlan.diet_type,
-            MealPlan.daily_calories,
-            MealPlan.macro_protein,
-            MealPlan.macro_carbs,
-            MealPlan.macro_fats,
-            MealPlan.created_at
-        ).where(MealPlan.user_id == current_user.id)
-        .order_by(MealPlan.created_at.desc())
-    )
-    
-    # Convert rows to response models
-    response_models = []
-    for row in result:
-        response_model = MealPlanResponse(
-            id=row.id,
-            goal=row.goal,
-            diet_type=row.diet_type,
-            daily_calories=row.daily_calories,
-            macro_protein=row.macro_protein,
-            macro_carbs=row.macro_carbs,
-            macro_fats=row.macro_fats,
-            created_at=row.created_at
-        )
-        response_models.append(response_model)
+    query = select(*MEAL_PLAN_COLUMNS).where(MealPlan.user_id == current_user.id, MealPlan.status == "ready")
+    result = db.execute(_paginate_newest_first(query, cursor, limit))
     
-    return response_models
+    return _meal_plan_page(result, limit)
 
 
 @router.get("/all", response_model=list[MealPlanResponse])
 def get_all_meal_plans(
-    current_user: User = Depends(is_user_admin),
+    cursor: str | None = None,
+    limit: int = Query(default=settings.MEALPLAN_PAGE_SIZE, ge=1, le=settings.MEALPLAN_MAX_PAGE_SIZE),
+    current_user: Principal = Depends(is_user_admin),
     db: Session = Depends(get_db)
 ):
-    """Get all meal plans - admin only"""
-    from sqlalchemy import select
-    
+    """Get all meal plans, one page at a time - admin only"""
     # Query only the specific columns needed to avoid relationship issues
-    result = db.execute(
-        select(
-            MealPlan.id,
-            MealPlan.goal,
-            MealPlan.diet_type,
-            MealPlan.daily_calories,
-            MealPlan.macro_protein,
-            MealPlan.macro_carbs,
-            MealPlan.macro_fats,
-            MealPlan.created_at
-        ).order_by(MealPlan.created_at.desc())
-    )
+    query = select(*MEAL_PLAN_COLUMNS).where(MealPlan.status == "ready")
+    result = db.execute(_paginate_newest_first(query, cursor, limit))
     
-    # Convert rows to response models
-    response_models = []
-    for row in result:
-        response_model = MealPlanResponse(
-            id=row.id,
-            goal=row.goal,
-            diet_type=row.diet_type,
-            daily_calories=row.daily_calories,
-            macro_protein=row.macro_protein,
-            macro_carbs=row.macro_carbs,
-            macro_fats=row.macro_fats,
-            created_at=row.created_at
+    return _meal_plan_page(result, limit)
+
+
+def _iter_meal_plans_ndjson():
+    # The generator runs while the response is being sent, after the request's
+    # own session is gone, so it opens its own and reads in batches
+    with SessionLocal() as db:
+        result = db.execute(
+            select(*MEAL_PLAN_COLUMNS)
+            .where(MealPlan.status == "ready")
+            .order_by(MealPlan.created_at.desc(), MealPlan.id.desc())
+            .execution_options(yield_per=NDJSON_BATCH_SIZE)
         )
-        response_models.append(response_model)
-    
-    return response_models
+        for rows in result.partitions():
+            lines = []
+            for row in rows:
+                plan = row._asdict()
+                plan["created_at"] = row.created_at.isoformat() if row.created_at else None
+                lines.append(json.dumps(plan))
+            yield "\n".join(lines) + "\n"
+
+
+@router.get("/all/export")
+def export_all_meal_plans(current_user: Principal = Depends(is_user_admin)):
+    """Stream every meal plan as newline-delimited JSON - admin only"""
+    return StreamingResponse(
+        _iter_meal_plans_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="meal_plans.ndjson"'}
+    )
 
 
 @router.delete("/{mealplan_id}")
 def delete_meal_plan(
     mealplan_id: int,
-    current_user: User = Depends(is_user_admin),
+    current_user: Principal = Depends(is_user_admin),
     db: Session = Depends(get_db)
 ):
     """Delete a meal plan - admin only"""
@@ -251,28 +461,200 @@ def delete_meal_plan(
     )
     meal_plan = result.first()
     
-    if not meal_plan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Meal plan not found"
+    if meal_plan:
+        # Remove the plan with its days and meals
+        delete_meal_plan_rows(db, [mealplan_id])
+    else:
+        archived = db.execute(
+            delete(MealPlanArchive).where(MealPlanArchive.id == mealplan_id)
         )
-    
-    # Perform the deletion
-    db.query(MealPlan).filter(MealPlan.id == mealplan_id).delete()
+        if not archived.rowcount:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Meal plan not found"
+            )
     db.commit()
+    pdf_cache.invalidate(mealplan_id)
     
     return {"message": "Meal plan deleted successfully"}
 
 
+def _build_meal_plan_data(meal_plan, history_rows, user_name: str) -> dict:
+    """Shape a meal plan row and its history rows into the PDF generator input"""
+    history_data = []
+    for hist in history_rows:
+        history_data.append({
+            "day_number": hist.day_number,
+            "meals": json.loads(hist.meals_json)
+        })
+
+    return {
+        "id": meal_plan.id,
+        "goal": meal_plan.goal,
+        "diet_type": meal_plan.diet_type,
+        "daily_calories": meal_plan.daily_calories,
+        "macros": {
+            "protein": meal_plan.macro_protein,
+            "carbs": meal_plan.macro_carbs,
+            "fats": meal_plan.macro_fats
+        },
+        "history": history_data,
+        "user_name": user_name
+    }
+
+
+def _pdf_version(meal_plan, user_name: str) -> tuple:
+    """
+    What a cached PDF must match to be served: plans never change once
+    generated, but an id can come back after a delete and the PDF shows the
+    user's name.
+    """
+    return meal_plan.created_at, user_name
+
+
+def _queue_pdf_prerender(meal_plan, history_rows, user_name: str):
+    """Queue a background render of a freshly generated plan into the PDF cache"""
+    # The renderer only draws split days (1..n). A plan that couldn't be
+    # split has just its day 0 row and would cache a PDF with no meals.
+    if not any(hist.day_number > FULL_PLAN_DAY for hist in history_rows):
+        return
+    try:
+        meal_plan_data = _build_meal_plan_data(meal_plan, history_rows, user_name)
+    except ValueError:
+        # The plan is not valid JSON; an export would fail the same way
+        return
+    pdf_prerenderer.enqueue(meal_plan.id, _pdf_version(meal_plan, user_name), meal_plan_data,
+                            render_meal_plan_pdf)
+
+
+@router.get("/pdf/stats")
+def get_pdf_render_stats(current_user: Principal = Depends(is_user_admin)):
+    """PDF render pool queue depth and counters, and the database connection pools - admin only"""
+    return {
+        **pdf_render_pool.stats(),
+        "cache": pdf_cache.stats(),
+        "prerender": pdf_prerenderer.stats(),
+        # PDF exports hold a connection while they read plans, so pool pressure shows up here first
+        "database": {
+            "sync": get_pool_stats(engine),
+            "async": get_pool_stats(async_engine.sync_engine)
+        }
+    }
+
+
+async def _iter_bulk_pdf_entries(plan_ids: list[int], archived_ids: list[int], user_name: str):
+    """
+    Yield ``(filename, meal_plan_data)`` for the given live and archived
+    plans, reading them PDF_BULK_BATCH_SIZE plans at a time as the ZIP stream
+    asks for more. Each batch gets a short session of its own: the generator
+    runs while the response is being sent, and no connection is held while
+    PDFs render.
+    """
+    for start in range(0, len(plan_ids), PDF_BULK_BATCH_SIZE):
+        batch = plan_ids[start:start + PDF_BULK_BATCH_SIZE]
+        # One query for the batch's plans and their history; the outer join
+        # keeps plans that have no history rows yet.
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(
+                    MealPlan.id,
+                    MealPlan.goal,
+                    MealPlan.diet_type,
+                    MealPlan.daily_calories,
+                    MealPlan.macro_protein,
+                    MealPlan.macro_carbs,
+                    MealPlan.macro_fats,
+                    MealHistory.day_number,
+                    MealHistory.meals_json
+                )
+                .outerjoin(MealHistory, MealHistory.mealplan_id == MealPlan.id)
+                .where(MealPlan.id.in_(batch))
+                .order_by(MealPlan.id, MealHistory.day_number)
+            )).all()
+
+        for _, plan_rows in groupby(rows, key=lambda row: row.id):
+            plan_rows = list(plan_rows)
+            history_rows = [row for row in plan_rows if row.day_number is not None]
+            meal_plan_data = _build_meal_plan_data(plan_rows[0], history_rows, user_name)
+            yield f"meal_plan_{plan_rows[0].id}.pdf", meal_plan_data
+
+    for start in range(0, len(archived_ids), PDF_BULK_BATCH_SIZE):
+        async with AsyncSessionLocal() as db:
+            documents = (await db.execute(
+                archived_document_query(archived_ids[start:start + PDF_BULK_BATCH_SIZE])
+            )).scalars().all()
+
+        for document in documents:
+            meal_plan, history_rows, _ = parse_archived_document(document)
+            meal_plan_data = _build_meal_plan_data(meal_plan, history_rows, user_name)
+            yield f"meal_plan_{meal_plan.id}.pdf", meal_plan_data
+
+
+@router.get("/pdf/bulk")
+async def export_meal_plans_zip(
+    ids: list[int] | None = Query(default=None),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Export several of the signed-in user's meal plans as a streamed ZIP of
+    PDFs (all of them by default). Meal plans belong to users, not to client
+    profiles, so there is no export of a coach's client roster.
+    """
+    # Only the ids are read up front, and no more than one past the limit
+    query = (
+        select(MealPlan.id)
+        .where(MealPlan.user_id == current_user.id, MealPlan.status == "ready")
+        .order_by(MealPlan.id)
+        .limit(settings.PDF_BULK_MAX_PLANS + 1)
+    )
+    if ids:
+        query = query.where(MealPlan.id.in_(ids))
+
+    plan_ids = (await db.execute(query)).scalars().all()
+
+    # Plans past the retention age are exported from the archive
+    archived_ids = []
+    if len(plan_ids) <= settings.PDF_BULK_MAX_PLANS:
+        archived_query = (
+            select(MealPlanArchive.id)
+            .where(MealPlanArchive.user_id == current_user.id)
+            .order_by(MealPlanArchive.id)
+            .limit(settings.PDF_BULK_MAX_PLANS + 1 - len(plan_ids))
+        )
+        if ids:
+            archived_query = archived_query.where(MealPlanArchive.id.in_(ids))
+        archived_ids = (await db.execute(archived_query)).scalars().all()
+
+    if not plan_ids and not archived_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No meal plans found"
+        )
+    if len(plan_ids) + len(archived_ids) > settings.PDF_BULK_MAX_PLANS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.PDF_BULK_MAX_PLANS} meal plans can be exported at once"
+        )
+
+    # PDFs are rendered in parallel and written to the archive as each one
+    # finishes, so the first bytes go out before the whole set is done.
+    return StreamingResponse(
+        stream_pdf_zip(_iter_bulk_pdf_entries(plan_ids, archived_ids, current_user.name), render_meal_plan_pdf),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="meal_plans.zip"'}
+    )
+
+
 @router.get("/pdf/{mealplan_id}")
 async def export_meal_plan_pdf(
     mealplan_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Export a meal plan as a PDF file"""
     # Fetch meal plan data
-    result = db.execute(
+    result = await db.execute(
         select(
             MealPlan.id,
             MealPlan.goal,
@@ -280,59 +662,67 @@ async def export_meal_plan_pdf(
             MealPlan.daily_calories,
             MealPlan.macro_protein,
             MealPlan.macro_carbs,
-            MealPlan.macro_fats
+            MealPlan.macro_fats,
+            MealPlan.created_at
         ).where(
             MealPlan.id == mealplan_id,
-            MealPlan.user_id == current_user.id
+            MealPlan.user_id == current_user.id,
+            MealPlan.status == "ready"
         )
     )
     meal_plan = result.first()
     
+    archived_history = None
     if not meal_plan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Meal plan not found"
-        )
+        # Plans past the retention age are read back from the archive
+        document = (await db.execute(archived_document_query([mealplan_id], current_user.id))).scalar()
+        if document is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Meal plan not found"
+            )
+        meal_plan, archived_history, _ = parse_archived_document(document)
     
-    # Fetch history
-    history_result = db.execute(
-        select(MealHistory.day_number, MealHistory.meals_json)
-        .where(MealHistory.mealplan_id == mealplan_id)
-        .order_by(MealHistory.day_number)
-    )
+    filename = f"meal_plan_{mealplan_id}.pdf"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
     
-    history_data = []
-    for hist in history_result:
-        history_data.append({
-            "day_number": hist.day_number,
-            "meals": json.loads(hist.meals_json)
-        })
+    # Plans don't change after generation, so a pre-rendered copy can be sent as is
+    pdf_version = _pdf_version(meal_plan, current_user.name)
+    pdf_bytes = pdf_cache.get(mealplan_id, pdf_version)
+    if pdf_bytes is not None:
+        headers["Content-Length"] = str(len(pdf_bytes))
+        return StreamingResponse(iter_pdf_chunks(pdf_bytes), media_type="application/pdf", headers=headers)
     
-    # Prepare data for PDF generator
-    meal_plan_data = {
-        "id": meal_plan.id,
-        "goal": meal_plan.goal,
-        "diet_type": meal_plan.diet_type,
-        "daily_calories": meal_plan.daily_calories,
-        "macros": {
-            "protein": meal_plan.macro_protein,
-            "carbs": meal_plan.macro_carbs,
-            "fats": meal_plan.macro_fats
-        },
-        "history": history_data,
-        "user_name": current_user.name
-    }
+    # Fetch history
+    if archived_history is not None:
+        history_result = archived_history
+    else:
+        history_result = await db.execute(
+            select(MealHistory.day_number, MealHistory.meals_json)
+            .where(MealHistory.mealplan_id == mealplan_id)
+            .order_by(MealHistory.day_number)
+        )
     
-    # Generate PDF
-    temp_dir = tempfile.gettempdir()
-    filename = f"meal_plan_{mealplan_id}.pdf"
-    file_path = os.path.join(temp_dir, filename)
+    # Prepare data for PDF generator
+    meal_plan_data = _build_meal_plan_data(meal_plan, history_result, current_user.name)
     
-    pdf_path = generate_meal_plan_pdf(meal_plan_data, file_path)
+    # Render in the process pool so the event loop stays free for other requests.
+    # The PDF is built in memory, so concurrent exports never share a temp file.
+    try:
+        pdf_bytes = await pdf_render_pool.render(render_meal_plan_pdf, meal_plan_data)
+    except PdfQueueFullError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF export is busy, please try again shortly",
+            headers={"Retry-After": "5"}
+        )
+    except PdfRenderTimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="PDF generation timed out"
+        )
     
-    return FileResponse(
-        path=pdf_path,
-        filename=filename,
-        media_type="application/pdf"
-    )
+    pdf_cache.put(mealplan_id, pdf_version, pdf_bytes)
+    headers["Content-Length"] = str(len(pdf_bytes))
+    return StreamingResponse(iter_pdf_chunks(pdf_bytes), media_type="application/pdf", headers=headers)
 
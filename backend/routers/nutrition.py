@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from database.database import get_db
 from database import models, schemas
-from core.security import get_current_user
+from routers.auth import get_current_user
 
 
 router = APIRouter()
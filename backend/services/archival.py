@@ -0,0 +1,210 @@
+# Retention and archival for old meal plans
+#
+# Plans older than MEALPLAN_ARCHIVE_AFTER_DAYS are moved, with their days,
+# into meal_plan_archive: one compressed JSON document per plan holding its
+# days and meals. The job works in small batches, each in its own short
+# transaction, so it can run next to live traffic and be stopped and resumed
+# at any point. Archived plans are still readable by id through
+# load_archived_meal_plan (or archived_document_query and
+# parse_archived_document from async code); every meal plan read route falls
+# back to them. Plan ids are never handed out twice (see migration 0012), so
+# an archived id can't collide with a live plan's.
+#
+# Plans stay "pending" only while their worker waits for the generator. One
+# that is still pending after MEALPLAN_PENDING_TIMEOUT_MINUTES belongs to a
+# worker that died mid-generation; delete_stale_pending_plans removes those
+# at startup and before each archival run.
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import delete, insert, literal_column, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database.models import MealEntry, MealHistory, MealPlan, MealPlanArchive
+from services.meal_plan_storage import FULL_PLAN_DAY, build_meal_entries
+
+logger = logging.getLogger(__name__)
+
+MEAL_PLAN_FIELDS = ("id", "user_id", "goal", "diet_type", "daily_calories",
+                    "macro_protein", "macro_carbs", "macro_fats", "status", "created_at")
+MEAL_ENTRY_FIELDS = ("day_number", "position", "kind", "name", "calories", "ingredients_json")
+
+
+def delete_meal_plan_rows(db: Session, mealplan_ids: list):
+    """Delete plans together with their days and meals (no commit)"""
+    db.execute(delete(MealEntry).where(MealEntry.mealplan_id.in_(mealplan_ids)))
+    db.execute(delete(MealHistory).where(MealHistory.mealplan_id.in_(mealplan_ids)))
+    db.execute(delete(MealPlan).where(MealPlan.id.in_(mealplan_ids)))
+
+
+def _archive_document(plan, days: list, entries: list) -> str:
+    mealplan = {field: getattr(plan, field) for field in MEAL_PLAN_FIELDS}
+    mealplan["created_at"] = plan.created_at.isoformat() if plan.created_at else None
+    history = [
+        {
+            "id": day.id,
+            "day_number": day.day_number,
+            "meals_json": day.meals_json,
+            "created_at": day.created_at.isoformat() if day.created_at else None
+        }
+        for day in days
+    ]
+    meal_entries = [{field: getattr(entry, field) for field in MEAL_ENTRY_FIELDS} for entry in entries]
+    return json.dumps({"mealplan": mealplan, "history": history, "entries": meal_entries})
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """Archive up to ``batch_size`` of the oldest plans created before ``cutoff`` in one transaction"""
+    plans = db.execute(
+        select(*(getattr(MealPlan, field) for field in MEAL_PLAN_FIELDS))
+        .where(MealPlan.created_at < cutoff, MealPlan.status == "ready")
+        .order_by(MealPlan.created_at, MealPlan.id)
+        .limit(batch_size)
+    ).all()
+    if not plans:
+        return 0
+
+    mealplan_ids = [plan.id for plan in plans]
+    days_by_plan = {mealplan_id: [] for mealplan_id in mealplan_ids}
+    for day in db.execute(
+        select(MealHistory.id, MealHistory.mealplan_id, MealHistory.day_number,
+               MealHistory.meals_json, MealHistory.created_at)
+        .where(MealHistory.mealplan_id.in_(mealplan_ids))
+        .order_by(MealHistory.mealplan_id, MealHistory.day_number)
+    ):
+        days_by_plan[day.mealplan_id].append(day)
+    entries_by_plan = {mealplan_id: [] for mealplan_id in mealplan_ids}
+    for entry in db.execute(
+        select(MealEntry.mealplan_id, *(getattr(MealEntry, field) for field in MEAL_ENTRY_FIELDS))
+        .where(MealEntry.mealplan_id.in_(mealplan_ids))
+        .order_by(MealEntry.mealplan_id, MealEntry.day_number, MealEntry.position)
+    ):
+        entries_by_plan[entry.mealplan_id].append(entry)
+
+    db.execute(insert(MealPlanArchive), [
+        {
+            "id": plan.id,
+            "user_id": plan.user_id,
+            "created_at": plan.created_at,
+            "archived_at": datetime.utcnow(),
+            "document": _archive_document(plan, days_by_plan[plan.id], entries_by_plan[plan.id])
+        }
+        for plan in plans
+    ])
+    delete_meal_plan_rows(db, mealplan_ids)
+    db.commit()
+    return len(plans)
+
+
+def archive_meal_plans(db: Session,
+                       older_than_days: int = settings.MEALPLAN_ARCHIVE_AFTER_DAYS,
+                       batch_size: int = settings.MEALPLAN_ARCHIVE_BATCH_SIZE,
+                       pause: float = settings.MEALPLAN_ARCHIVE_PAUSE_SECONDS,
+                       max_batches: int | None = None) -> int:
+    """
+    Move plans older than ``older_than_days`` into the archive and return how
+    many were moved. Pausing between batches lets other writers take the
+    SQLite write lock in the meantime.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved = archive_batch(db, cutoff, batch_size)
+        if not moved:
+            break
+        archived += moved
+        batches += 1
+        logger.info(f"Archived {archived} meal plans so far")
+        if pause:
+            time.sleep(pause)
+    return archived
+
+
+def delete_stale_pending_plans(db: Session,
+                               older_than_minutes: int = settings.MEALPLAN_PENDING_TIMEOUT_MINUTES,
+                               batch_size: int = settings.MEALPLAN_ARCHIVE_BATCH_SIZE) -> int:
+    """Delete plans left "pending" for longer than generation can take, in batches; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(minutes=older_than_minutes)
+    deleted = 0
+    while True:
+        mealplan_ids = db.execute(
+            select(MealPlan.id)
+            # A literal, not a bound parameter, so SQLite can use the partial index
+            .where(MealPlan.status == literal_column("'pending'"), MealPlan.created_at < cutoff)
+            .limit(batch_size)
+        ).scalars().all()
+        if not mealplan_ids:
+            break
+        delete_meal_plan_rows(db, mealplan_ids)
+        db.commit()
+        deleted += len(mealplan_ids)
+    if deleted:
+        logger.info(f"Deleted {deleted} meal plans left pending by an interrupted generation")
+    return deleted
+
+
+def archived_document_query(mealplan_ids: list, user_id: int | None = None):
+    """Select the archive documents of these plans (only the ones ``user_id`` owns, if given)"""
+    query = select(MealPlanArchive.document).where(MealPlanArchive.id.in_(mealplan_ids))
+    if user_id is not None:
+        query = query.where(MealPlanArchive.user_id == user_id)
+    return query.order_by(MealPlanArchive.id)
+
+
+def parse_archived_document(document: str) -> tuple:
+    """
+    Return ``(plan, history, entries)`` for an archive document, shaped like
+    the rows of meal_plans, meal_history and meal_entries.
+    """
+    data = json.loads(document)
+    plan = SimpleNamespace(**data["mealplan"])
+    plan.created_at = datetime.fromisoformat(plan.created_at) if plan.created_at else None
+    history = []
+    for day in data["history"]:
+        day["created_at"] = datetime.fromisoformat(day["created_at"]) if day["created_at"] else None
+        history.append(SimpleNamespace(**day))
+
+    if "entries" in data:
+        entries = [SimpleNamespace(**entry) for entry in data["entries"]]
+    else:
+        # Archived before meals were kept in the document: rebuild them from the days
+        entries = []
+        for day in history:
+            if day.day_number == FULL_PLAN_DAY:
+                continue
+            try:
+                meals = json.loads(day.meals_json)
+            except ValueError:
+                continue
+            for entry in build_meal_entries(plan.id, day.day_number, meals):
+                entries.append(SimpleNamespace(**{field: getattr(entry, field) for field in MEAL_ENTRY_FIELDS}))
+    return plan, history, entries
+
+
+def load_archived_meal_plan(db: Session, mealplan_id: int, user_id: int | None = None):
+    """
+    Return ``(plan, history, entries)`` for an archived plan, or None when it
+    isn't archived (or belongs to someone else).
+    """
+    document = db.execute(archived_document_query([mealplan_id], user_id)).scalar()
+    if document is None:
+        return None
+    return parse_archived_document(document)
+
+
+if __name__ == "__main__":
+    # Run the archival job from the command line: python -m services.archival [days]
+    import sys
+
+    from database.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else settings.MEALPLAN_ARCHIVE_AFTER_DAYS
+    with SessionLocal() as session:
+        delete_stale_pending_plans(session)
+        print(f"Archived {archive_meal_plans(session, older_than_days=days)} meal plans older than {days} days")
@@ -0,0 +1,150 @@
+# Bulk client import
+#
+# Onboarding a gym used to mean one POST /clients per client, each with its
+# own commit and refresh. An import upload is instead read as a stream,
+# validated row by row against ClientImportRow, and written in batches: one
+# executemany INSERT and one commit per batch. Bad rows are reported back
+# with their row number instead of failing the whole upload.
+
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from database.models import ClientProfile
+from database.schemas import ClientImportRow
+
+# Imported clients have no password yet; they set one through the password reset flow
+UNUSABLE_PASSWORD_HASH = "!"
+
+
+class ClientImportFormatError(ValueError):
+    """Raised when an upload is neither CSV nor NDJSON"""
+
+
+def detect_format(filename: str | None, content_type: str | None) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    if name.endswith(".csv") or content_type in ("text/csv", "application/csv"):
+        return "csv"
+    raise ClientImportFormatError("Upload a .csv or .ndjson file")
+
+
+def iter_records(stream: BinaryIO, file_format: str) -> Iterator[tuple[int, dict | None]]:
+    """
+    Yield ``(row number, record)`` one row at a time, numbering data rows from 1.
+    The record is None for an NDJSON line that isn't a JSON object.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(text), start=1):
+                # Empty cells count as missing rather than as empty strings
+                yield row_number, {
+                    key.strip(): value.strip()
+                    for key, value in row.items()
+                    if key and isinstance(value, str) and value.strip()
+                }
+        else:
+            row_number = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield row_number, record if isinstance(record, dict) else None
+    finally:
+        # Leave the upload's file open for FastAPI to close
+        text.detach()
+
+
+def _validation_errors(e: ValidationError) -> list:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+
+
+def _insert_batch(db: Session, coach_id, batch: list, errors: list) -> int:
+    """Insert ``(row number, ClientImportRow)`` pairs in one transaction and return how many were saved"""
+    emails = [client.email for _, client in batch]
+    registered = set(db.execute(select(ClientProfile.email).where(ClientProfile.email.in_(emails))).scalars())
+
+    row_numbers, values = [], []
+    for row_number, client in batch:
+        if client.email in registered:
+            errors.append({"row": row_number, "errors": ["email: already registered"]})
+            continue
+        row_numbers.append(row_number)
+        values.append({
+            "coach_id": coach_id,
+            "name": client.name,
+            "email": client.email,
+            "password_hash": UNUSABLE_PASSWORD_HASH,
+            "age": client.age,
+            "gender": client.gender,
+            "height": round(client.height_cm),
+            "weight": round(client.weight_kg),
+        })
+    if not values:
+        return 0
+
+    try:
+        # A list of parameter sets runs as a single executemany
+        db.execute(insert(ClientProfile), values)
+        db.commit()
+    except IntegrityError:
+        # Lost a race with another import of the same emails
+        db.rollback()
+        for row_number in row_numbers:
+            errors.append({"row": row_number, "errors": ["not saved: its batch conflicted with existing clients"]})
+        return 0
+    return len(values)
+
+
+def import_clients(db: Session, coach_id, stream: BinaryIO, file_format: str,
+                   batch_size: int = settings.CLIENT_IMPORT_BATCH_SIZE,
+                   max_rows: int = settings.CLIENT_IMPORT_MAX_ROWS) -> dict:
+    imported = 0
+    errors = []
+    seen_emails = set()
+    batch = []
+    row_number = 0
+
+    try:
+        for row_number, record in iter_records(stream, file_format):
+            if row_number > max_rows:
+                errors.append({"row": row_number, "errors": [f"import is limited to {max_rows} rows, the rest was skipped"]})
+                break
+            if record is None:
+                errors.append({"row": row_number, "errors": ["not a JSON object"]})
+                continue
+            try:
+                client = ClientImportRow.model_validate(record)
+            except ValidationError as e:
+                errors.append({"row": row_number, "errors": _validation_errors(e)})
+                continue
+            if client.email in seen_emails:
+                errors.append({"row": row_number, "errors": ["email: duplicated in this file"]})
+                continue
+
+            seen_emails.add(client.email)
+            batch.append((row_number, client))
+            if len(batch) >= batch_size:
+                imported += _insert_batch(db, coach_id, batch, errors)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        errors.append({"row": row_number + 1, "errors": [f"could not read the file from here on: {e}"]})
+
+    if batch:
+        imported += _insert_batch(db, coach_id, batch, errors)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"imported": imported, "failed": len(errors), "errors": errors}
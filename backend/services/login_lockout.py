@@ -0,0 +1,253 @@
+# Write-behind failed-login and lockout counters
+#
+# Counting failed logins with an UPDATE per attempt turns a credential
+# stuffing burst into a write storm on the account table. The counters are
+# instead kept in memory, keyed by email and changed under a lock, so the
+# lockout decision is exact within a worker. Changed entries are written to
+# users (failed_login_attempts, locked_until, last_login), the accounts
+# /login authenticates, in one batch every LOGIN_LOCKOUT_FLUSH_SECONDS: a thousand failures against one
+# account cost one UPDATE instead of a thousand. A new lockout, or enough
+# pending changes, wakes the flusher right away so locks reach the database
+# quickly. On startup the locks and partial counts still in the database are
+# loaded back, so a restart doesn't unlock anyone.
+#
+# Workers don't share their counters between flushes: with N workers an
+# attacker spreading attempts over all of them gets up to N times
+# LOGIN_MAX_FAILED_ATTEMPTS tries before every worker has locked the account.
+#
+# Memory is bounded by LOGIN_LOCKOUT_MAX_ENTRIES. Only entries that are
+# already saved and not locked are evicted, so locks are never forgotten;
+# an evicted account's partial failure count starts over.
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from sqlalchemy import bindparam, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import settings
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+# Entries looked at per insert when the store is over its size
+EVICTION_SCAN = 8
+
+
+@dataclass
+class LockoutState:
+    failed_attempts: int = 0
+    locked_until: datetime | None = None
+    last_login: datetime | None = None
+    dirty: bool = False  # failed_attempts/locked_until not saved yet
+    login_dirty: bool = False  # last_login not saved yet
+
+
+class LoginLockoutStore:
+    def __init__(self, max_attempts: int, lockout_duration: timedelta, flush_interval: float,
+                 flush_threshold: int, max_entries: int, clock: Callable[[], datetime] = datetime.utcnow):
+        self.max_attempts = max_attempts
+        self.lockout_duration = lockout_duration
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()  # email -> LockoutState
+        self._lock = threading.Lock()
+        self._pending = 0  # dirty entries
+        self._flush_requested = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._engine = None
+        self.recorded = 0
+        self.rows_written = 0
+
+    def _is_locked(self, state: LockoutState, now: datetime) -> bool:
+        return state.locked_until is not None and state.locked_until > now
+
+    def _state(self, email: str) -> LockoutState:
+        state = self._entries.get(email)
+        if state is None:
+            state = self._entries[email] = LockoutState()
+            self._evict()
+        else:
+            self._entries.move_to_end(email)
+        return state
+
+    def _evict(self):
+        now = self._clock()
+        for _ in range(EVICTION_SCAN):
+            if len(self._entries) <= self.max_entries:
+                return
+            email, state = next(iter(self._entries.items()))
+            if state.dirty or state.login_dirty or self._is_locked(state, now):
+                # Keep it; saved entries become evictable after the next flush
+                self._entries.move_to_end(email)
+                self._flush_requested.set()
+            else:
+                del self._entries[email]
+
+    def _mark_dirty(self, state: LockoutState):
+        if not (state.dirty or state.login_dirty):
+            self._pending += 1
+            if self._pending >= self.flush_threshold:
+                self._flush_requested.set()
+
+    def locked_until(self, email: str) -> datetime | None:
+        """When the account is locked, the time it unlocks; None otherwise"""
+        with self._lock:
+            state = self._entries.get(email)
+            if state is not None and self._is_locked(state, self._clock()):
+                return state.locked_until
+        return None
+
+    def record_failure(self, email: str) -> datetime | None:
+        """Count a failed login; returns the lock's end when this failure locked the account"""
+        with self._lock:
+            self.recorded += 1
+            state = self._state(email)
+            self._mark_dirty(state)
+            state.dirty = True
+            state.failed_attempts += 1
+            now = self._clock()
+            if state.failed_attempts >= self.max_attempts and not self._is_locked(state, now):
+                state.locked_until = now + self.lockout_duration
+                # Save new locks promptly so they survive a restart
+                self._flush_requested.set()
+                return state.locked_until
+        return None
+
+    def record_success(self, email: str):
+        """Reset the failure count and remember the login time"""
+        with self._lock:
+            self.recorded += 1
+            state = self._state(email)
+            self._mark_dirty(state)
+            if state.failed_attempts or state.locked_until is not None:
+                state.failed_attempts = 0
+                state.locked_until = None
+                state.dirty = True
+            state.last_login = self._clock()
+            state.login_dirty = True
+
+    def load(self, conn) -> int:
+        """Read the locks and partial counts left in the database (at startup)"""
+        rows = conn.execute(
+            select(User.email, User.failed_login_attempts, User.locked_until)
+            .where(or_(User.failed_login_attempts > 0, User.locked_until > self._clock()))
+        ).all()
+        with self._lock:
+            for row in rows:
+                state = self._entries.get(row.email)
+                if state is None or not state.dirty:
+                    self._entries[row.email] = LockoutState(
+                        failed_attempts=row.failed_login_attempts or 0,
+                        locked_until=row.locked_until,
+                        last_login=state.last_login if state else None,
+                        login_dirty=state.login_dirty if state else False,
+                    )
+        return len(rows)
+
+    def flush(self, conn) -> int:
+        """Write every changed entry in one batch per column set; returns the number of entries written"""
+        with self._lock:
+            counters, logins = [], []
+            for email, state in self._entries.items():
+                if state.dirty:
+                    counters.append({"b_email": email, "b_failed": state.failed_attempts,
+                                     "b_locked_until": state.locked_until})
+                    state.dirty = False
+                if state.login_dirty:
+                    logins.append({"b_email": email, "b_last_login": state.last_login})
+                    state.login_dirty = False
+            self._pending = 0
+
+        table = User.__table__
+        try:
+            if counters:
+                conn.execute(
+                    update(table).where(table.c.email == bindparam("b_email"))
+                    .values(failed_login_attempts=bindparam("b_failed"), locked_until=bindparam("b_locked_until")),
+                    counters
+                )
+            if logins:
+                conn.execute(
+                    update(table).where(table.c.email == bindparam("b_email"))
+                    .values(last_login=bindparam("b_last_login")),
+                    logins
+                )
+        except SQLAlchemyError:
+            self._restore_dirty(counters, logins)
+            raise
+        self.rows_written += len(counters) + len(logins)
+        return len(counters) + len(logins)
+
+    def _restore_dirty(self, counters: list, logins: list):
+        with self._lock:
+            for params in counters:
+                state = self._entries.get(params["b_email"])
+                if state is not None:
+                    self._mark_dirty(state)
+                    state.dirty = True
+            for params in logins:
+                state = self._entries.get(params["b_email"])
+                if state is not None:
+                    self._mark_dirty(state)
+                    state.login_dirty = True
+
+    def flush_now(self) -> int:
+        with self._engine.begin() as conn:
+            return self.flush(conn)
+
+    def start(self, engine):
+        """Load the saved locks and start flushing in the background"""
+        if self._thread is not None:
+            return
+        self._engine = engine
+        with engine.connect() as conn:
+            loaded = self.load(conn)
+        logger.info(f"Loaded {loaded} saved login lockout entries")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="login-lockout-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush_now()
+            except SQLAlchemyError as e:
+                logger.warning(f"Login lockout flush failed, retrying later: {e}")
+
+    def stop(self):
+        """Stop the flusher and write what is still pending"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._flush_requested.set()
+        self._thread.join()
+        self._thread = None
+        self.flush_now()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pending": self._pending,
+                "recorded": self.recorded,
+                "rows_written": self.rows_written,
+            }
+
+
+login_lockout = LoginLockoutStore(
+    max_attempts=settings.LOGIN_MAX_FAILED_ATTEMPTS,
+    lockout_duration=timedelta(minutes=settings.LOGIN_LOCKOUT_MINUTES),
+    flush_interval=settings.LOGIN_LOCKOUT_FLUSH_SECONDS,
+    flush_threshold=settings.LOGIN_LOCKOUT_FLUSH_THRESHOLD,
+    max_entries=settings.LOGIN_LOCKOUT_MAX_ENTRIES,
+)
@@ -0,0 +1,130 @@
+# Per-day and per-meal storage for generated meal plans
+#
+# The generator returns the whole plan as one JSON document. It is split into
+# one MealHistory row per day (meals_json holds that day's object) and one
+# MealEntry row per meal or snack, so reading a single day or averaging
+# calories doesn't parse the full plan. A plan that can't be split is kept
+# as a single day 0 row, which is how every plan was stored before.
+
+import json
+import logging
+import re
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from database.models import MealEntry, MealHistory
+
+logger = logging.getLogger(__name__)
+
+FULL_PLAN_DAY = 0
+BACKFILL_BATCH_SIZE = 100
+
+_MARKDOWN_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def split_generated_plan(generated_plan: str) -> list | None:
+    """Return the plan's day objects in order, or None when it isn't a JSON list of days"""
+    # The prompt asks for bare JSON, but the model occasionally wraps it in a code fence
+    text = _MARKDOWN_FENCE.sub("", generated_plan.strip())
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return None
+
+    if isinstance(parsed, dict):
+        parsed = parsed.get("days")
+    if not isinstance(parsed, list) or not parsed or not all(isinstance(day, dict) for day in parsed):
+        return None
+    return parsed
+
+
+def _calories(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_meal_entries(mealplan_id: int, day_number: int, day: dict) -> list:
+    """MealEntry rows for one day object: its meals, then its snacks"""
+    items = [("meal", meal) for meal in day.get("meals") or []]
+    items += [("snack", snack) for snack in day.get("snacks") or []]
+
+    entries = []
+    for position, (kind, item) in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        ingredients = item.get("ingredients")
+        entries.append(MealEntry(
+            mealplan_id=mealplan_id,
+            day_number=day_number,
+            position=position,
+            kind=kind,
+            name=str(item.get("name") or ""),
+            calories=_calories(item.get("calories")),
+            ingredients_json=json.dumps(ingredients) if ingredients is not None else None
+        ))
+    return entries
+
+
+def build_plan_rows(mealplan_id: int, generated_plan: str) -> tuple[list, list]:
+    """
+    Build the MealHistory and MealEntry rows for a generated plan.
+    Days are numbered by their position in the plan, starting at 1.
+    """
+    days = split_generated_plan(generated_plan)
+    if days is None:
+        return [MealHistory(mealplan_id=mealplan_id, day_number=FULL_PLAN_DAY, meals_json=generated_plan)], []
+
+    history, entries = [], []
+    for day_number, day in enumerate(days, start=1):
+        history.append(MealHistory(mealplan_id=mealplan_id, day_number=day_number, meals_json=json.dumps(day)))
+        entries.extend(build_meal_entries(mealplan_id, day_number, day))
+    return history, entries
+
+
+def backfill_full_plan_rows(db: Session, batch_size: int = BACKFILL_BATCH_SIZE) -> dict:
+    """
+    Split the day 0 rows written before per-day storage into day and meal rows.
+    Each batch is committed on its own, so the job can be stopped and rerun.
+    Plans that aren't valid JSON keep their day 0 row.
+    """
+    split = skipped = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(MealHistory.id, MealHistory.mealplan_id, MealHistory.meals_json)
+            .where(MealHistory.day_number == FULL_PLAN_DAY, MealHistory.id > last_id)
+            .order_by(MealHistory.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        for row in rows:
+            last_id = row.id
+            history, entries = build_plan_rows(row.mealplan_id, row.meals_json)
+            if history[0].day_number == FULL_PLAN_DAY:
+                skipped += 1
+                continue
+
+            db.execute(delete(MealEntry).where(MealEntry.mealplan_id == row.mealplan_id))
+            db.execute(delete(MealHistory).where(MealHistory.mealplan_id == row.mealplan_id))
+            db.add_all(history)
+            db.add_all(entries)
+            split += 1
+        db.commit()
+        logger.info(f"Meal plan backfill: {split} split, {skipped} skipped so far")
+
+    return {"split": split, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    # Split existing plans from the command line: python -m services.meal_plan_storage
+    from database.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        result = backfill_full_plan_rows(session)
+    print(f"Split {result['split']} meal plans, left {result['skipped']} that could not be parsed")
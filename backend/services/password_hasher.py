@@ -0,0 +1,115 @@
+# Password hashing off the event loop
+#
+# A bcrypt hash or verify costs a few hundred milliseconds of CPU. Called
+# inline in a request handler it stalls everything else on the worker, so a
+# burst of logins takes the meal plan API down with it. Hashes run on a
+# small dedicated thread pool instead (bcrypt releases the GIL while it
+# works) and the number of accepted jobs is capped: past that, logins get a
+# fast 503 rather than queueing until every request times out.
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from core.config import settings
+from core.security import pwd_context
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashQueueFullError(RuntimeError):
+    """Raised when the password hash queue is full"""
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, max_workers: int, max_queue: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_ms_total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        """Jobs accepted at once: one per worker plus the waiting queue"""
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                logger.warning(f"Password hash queue full ({self._pending}/{self.capacity}), shedding request")
+                raise PasswordHashQueueFullError("Too many logins in progress")
+            self._pending += 1
+        queued_at = time.perf_counter()
+
+        def job():
+            waited_ms = (time.perf_counter() - queued_at) * 1000
+            try:
+                return func(*args)
+            finally:
+                # Runs even when the awaiting request was cancelled meanwhile
+                with self._lock:
+                    self._pending -= 1
+                    self._completed += 1
+                    self._wait_ms_total += waited_ms
+
+        try:
+            future = self._get_executor().submit(job)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verify a password; on success also return a new hash when the stored
+        one uses another cost (BCRYPT_ROUNDS changed) or scheme, else None.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        """Queue depth and counters for monitoring"""
+        with self._lock:
+            in_flight = min(self._pending, self.max_workers)
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "in_flight": in_flight,
+                "queued": self._pending - in_flight,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_ms_total / self._completed, 1) if self._completed else 0.0,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
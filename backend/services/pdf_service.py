@@ -0,0 +1,350 @@
+# PDF rendering off the event loop
+#
+# reportlab is pure Python and CPU bound, so rendering inside an async route
+# freezes every other request on the worker. Jobs are sent to a small,
+# dedicated process pool instead; the number of accepted jobs is capped so a
+# burst of exports gets a fast "busy" answer rather than an ever-growing queue.
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_pdf_chunks(data: bytes, chunk_size: int = PDF_STREAM_CHUNK_SIZE):
+    """Yield a rendered PDF in fixed-size slices for a StreamingResponse"""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+class _ZipChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink that hands back whatever zipfile wrote since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class PdfQueueFullError(RuntimeError):
+    """Raised when the render pool already holds as many jobs as it accepts"""
+
+
+class PdfRenderTimeoutError(TimeoutError):
+    """Raised when a render job does not finish within the configured timeout"""
+
+
+class PdfRenderPool:
+    def __init__(self, max_workers: int, max_queue: int, timeout: float):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    @property
+    def capacity(self) -> int:
+        """Jobs accepted at once: one per worker plus the waiting queue"""
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created lazily so importing the app never forks; "spawn" keeps the
+        # children free of inherited DB connections and event-loop state.
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _job_done(self, future):
+        # Runs on the executor's management thread once the job really ends,
+        # so a timed-out job keeps its slot until the worker is free again.
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    async def render(self, func, *args):
+        """Run ``func(*args)`` in the pool and await its result"""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                logger.warning(f"PDF render pool full ({self._pending}/{self.capacity}), rejecting job")
+                raise PdfQueueFullError("PDF render queue is full")
+            self._pending += 1
+            self._submitted += 1
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._job_done)
+
+        try:
+            # Cancelling the wrapper on timeout also cancels the job if a
+            # worker has not picked it up yet.
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise PdfRenderTimeoutError(f"PDF rendering exceeded {self.timeout}s")
+
+    def is_idle(self) -> bool:
+        """True when no job is queued or running"""
+        with self._lock:
+            return self._pending == 0
+
+    def stats(self) -> dict:
+        """Queue depth and counters for monitoring"""
+        with self._lock:
+            in_flight = min(self._pending, self.max_workers)
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "in_flight": in_flight,
+                "queued": self._pending - in_flight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+async def _render_with_retry(pool: PdfRenderPool, func, meal_plan_data: dict, max_wait: float) -> bytes:
+    # A bulk export should wait for room in the pool rather than fail
+    # because interactive exports happen to fill it, but not forever: after
+    # ``max_wait`` seconds the entry fails and is listed in errors.txt.
+    deadline = time.monotonic() + max_wait
+    while True:
+        try:
+            return await pool.render(func, meal_plan_data)
+        except PdfQueueFullError:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def _aiter_entries(entries):
+    if hasattr(entries, "__aiter__"):
+        async for entry in entries:
+            yield entry
+    else:
+        for entry in entries:
+            yield entry
+
+
+async def stream_pdf_zip(entries, func, pool: PdfRenderPool | None = None,
+                         max_wait: float = settings.PDF_BULK_QUEUE_WAIT_SECONDS):
+    """
+    Render ``(filename, meal_plan_data)`` entries in parallel and yield a ZIP
+    archive piece by piece as each PDF completes. ``entries`` may be a plain
+    or an async iterable and is only advanced when a render slot frees up; at
+    most one render per pool worker is in flight, so memory stays flat however
+    many entries there are.
+    """
+    pool = pool or pdf_render_pool
+    sink = _ZipChunkSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+    remaining = _aiter_entries(entries)
+    in_flight = {}
+    failed = []
+
+    async def start_next():
+        entry = await anext(remaining, None)
+        if entry is not None:
+            filename, meal_plan_data = entry
+            task = asyncio.ensure_future(_render_with_retry(pool, func, meal_plan_data, max_wait))
+            in_flight[task] = filename
+
+    try:
+        for _ in range(pool.max_workers):
+            await start_next()
+
+        while in_flight:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                filename = in_flight.pop(task)
+                await start_next()
+                try:
+                    pdf_bytes = task.result()
+                except Exception as e:
+                    logger.error(f"Bulk PDF export failed for {filename}: {e}")
+                    failed.append(filename)
+                    continue
+                info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, pdf_bytes)
+                yield sink.drain()
+
+        if failed:
+            archive.writestr("errors.txt", "Failed to render:\n" + "\n".join(failed) + "\n")
+        archive.close()
+        yield sink.drain()
+    finally:
+        # The client may disconnect mid-download; don't leave renders behind
+        for task in in_flight:
+            task.cancel()
+        await remaining.aclose()
+
+
+class PdfCache:
+    """
+    In-memory LRU of rendered PDFs keyed by meal plan id, bounded by total
+    size. Each PDF is stored with the version of the plan it was rendered
+    from (whatever the caller uses to tell renders apart, e.g. the plan's
+    creation time and the user's name), and only a lookup with the same
+    version is a hit, so a reused id or a renamed user never gets a stale
+    document.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mealplan_id: int, version) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(mealplan_id)
+            if entry is not None and entry[0] != version:
+                # Rendered from something else; it can never be served again
+                del self._entries[mealplan_id]
+                self._size -= len(entry[1])
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(mealplan_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, mealplan_id: int, version, pdf_bytes: bytes):
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(mealplan_id, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[mealplan_id] = (version, pdf_bytes)
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, mealplan_id: int):
+        with self._lock:
+            entry = self._entries.pop(mealplan_id, None)
+            if entry is not None:
+                self._size -= len(entry[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+class PdfPrerenderer:
+    """
+    Low-priority background renders into the PDF cache, queued right after a
+    plan is generated so the first download is a cache hit. Jobs are dropped
+    rather than queued when the bounded queue is full, and skipped when the
+    render pool is busy with interactive exports.
+    """
+
+    def __init__(self, pool: PdfRenderPool, cache: PdfCache, max_queue: int):
+        self.pool = pool
+        self.cache = cache
+        self.max_queue = max_queue
+        self._queue = None
+        self._worker = None
+        self.rendered = 0
+        self.dropped = 0
+
+    def enqueue(self, mealplan_id: int, version, meal_plan_data: dict, func) -> bool:
+        """Queue a pre-render from inside the event loop; returns False if it was dropped"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        try:
+            self._queue.put_nowait((mealplan_id, version, meal_plan_data, func))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _run(self):
+        while True:
+            mealplan_id, version, meal_plan_data, func = await self._queue.get()
+            if not self.pool.is_idle():
+                self.dropped += 1
+                continue
+            try:
+                self.cache.put(mealplan_id, version, await self.pool.render(func, meal_plan_data))
+                self.rendered += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.info(f"PDF pre-render skipped for meal plan {mealplan_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "rendered": self.rendered,
+            "dropped": self.dropped,
+        }
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+pdf_render_pool = PdfRenderPool(
+    max_workers=settings.PDF_RENDER_WORKERS,
+    max_queue=settings.PDF_RENDER_MAX_QUEUE,
+    timeout=settings.PDF_RENDER_TIMEOUT_SECONDS,
+)
+pdf_cache = PdfCache(max_bytes=settings.PDF_CACHE_MAX_BYTES)
+pdf_prerenderer = PdfPrerenderer(pdf_render_pool, pdf_cache, max_queue=settings.PDF_PRERENDER_QUEUE_SIZE)
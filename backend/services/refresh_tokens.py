@@ -0,0 +1,260 @@
+# Refresh-token store
+#
+# Every issued refresh token has a row in refresh_tokens, looked up by the
+# SHA-256 of the token (TokenManager.hash_token, unique index), so a user
+# can be signed in on several devices at once, each session with its own
+# device metadata. /login issues one, /refresh rotates it and /logout revokes
+# it (routers/auth.py). Rotating revokes the old row and issues a new token
+# for the same session. Presenting a token that was already rotated signs
+# the whole session out, since it means two parties hold it.
+#
+# A refresh is a single conditional UPDATE that only matches an unrevoked
+# row; that UPDATE is the revocation check, on every worker, and can't be
+# skipped. Revoked token ids (the "jti" claim) are also kept in an in-memory
+# Bloom filter, rebuilt from the table at startup, which saves no query on a
+# normal refresh. It only lets a worker recognise a token it already knows
+# to be revoked and answer with a read instead of that UPDATE; a hit is
+# confirmed in the table, as Bloom filters can report false positives. A
+# periodic sweep deletes expired rows.
+
+import hashlib
+import logging
+import math
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.token_manager import TokenManager
+from core.token_service import token_service
+from database.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 1000
+
+
+class RefreshTokenError(Exception):
+    """Raised for a refresh token that is invalid, expired, revoked or reused"""
+
+
+class BloomFilter:
+    """Fixed-size set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RefreshTokenStore:
+    def __init__(self, lifetime: timedelta, filter_capacity: int, filter_error_rate: float, sweep_interval: float):
+        self.lifetime = lifetime
+        self.filter_capacity = filter_capacity
+        self.filter_error_rate = filter_error_rate
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self.revoked = BloomFilter(filter_capacity, filter_error_rate)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._engine = None
+        self.filter_skips = 0
+        self.table_checks = 0
+
+    def _mark_revoked(self, jtis):
+        with self._lock:
+            for jti in jtis:
+                self.revoked.add(jti)
+
+    def issue(self, db: Session, user_id: int, device_name: str | None = None,
+              user_agent: str | None = None, ip_address: str | None = None, session_id: str | None = None) -> str:
+        """Create a refresh token for a new session (or the next one of ``session_id``) and commit it"""
+        token = self._insert(db, user_id, session_id or uuid.uuid4().hex, device_name, user_agent, ip_address)
+        db.commit()
+        return token
+
+    def _insert(self, db: Session, user_id: int, session_id: str,
+                device_name: str | None, user_agent: str | None, ip_address: str | None) -> str:
+        jti = uuid.uuid4().hex
+        # "sub" is the user id, as in access tokens
+        token = TokenManager.create_refresh_token({"sub": str(user_id), "jti": jti, "sid": session_id}, self.lifetime)
+        now = datetime.utcnow()
+        db.execute(insert(RefreshToken).values(
+            token_hash=TokenManager.hash_token(token),
+            jti=jti,
+            session_id=session_id,
+            user_id=user_id,
+            device_name=device_name,
+            user_agent=user_agent,
+            ip_address=ip_address,
+            created_at=now,
+            expires_at=now + self.lifetime,
+        ))
+        return token
+
+    def _claims(self, token: str) -> dict:
+        try:
+            claims = token_service.decode(token)
+        except jwt.InvalidTokenError as e:
+            raise RefreshTokenError("Invalid or expired refresh token") from e
+        if claims.get("type") != "refresh" or not claims.get("jti") or not claims.get("sid"):
+            raise RefreshTokenError("Not a refresh token")
+        return claims
+
+    def is_revoked(self, db: Session, token_hash: str, jti: str) -> bool:
+        if jti not in self.revoked:
+            self.filter_skips += 1
+            return False
+        # Possibly a false positive; the table has the answer
+        self.table_checks += 1
+        row = db.execute(select(RefreshToken.revoked_at).where(RefreshToken.token_hash == token_hash)).first()
+        return row is None or row.revoked_at is not None
+
+    def rotate(self, db: Session, token: str, user_agent: str | None = None,
+               ip_address: str | None = None) -> tuple[int, str]:
+        """Exchange a refresh token for a new one in the same session and commit; returns ``(user_id, token)``"""
+        claims = self._claims(token)
+        token_hash = TokenManager.hash_token(token)
+        if not self.is_revoked(db, token_hash, claims["jti"]):
+            now = datetime.utcnow()
+            # Only matches a token nobody has used or revoked yet, on any worker
+            rotated = db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=now, last_used_at=now)
+                .returning(RefreshToken.user_id, RefreshToken.device_name)
+            ).first()
+            if rotated is not None:
+                new_token = self._insert(db, rotated.user_id, claims["sid"], rotated.device_name,
+                                         user_agent, ip_address)
+                db.commit()
+                self._mark_revoked([claims["jti"]])
+                return rotated.user_id, new_token
+
+        # Already rotated or revoked: whoever presents it may have stolen it
+        self.revoke_session(db, claims["sid"])
+        raise RefreshTokenError("Refresh token was already used; the session has been signed out")
+
+    def _revoke_where(self, db: Session, *criteria) -> int:
+        jtis = db.execute(
+            update(RefreshToken)
+            .where(*criteria, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+            .returning(RefreshToken.jti)
+        ).scalars().all()
+        db.commit()
+        self._mark_revoked(jtis)
+        return len(jtis)
+
+    def revoke(self, db: Session, token: str) -> int:
+        """Sign out the session's current token (logout)"""
+        return self._revoke_where(db, RefreshToken.token_hash == TokenManager.hash_token(token))
+
+    def revoke_session(self, db: Session, session_id: str) -> int:
+        return self._revoke_where(db, RefreshToken.session_id == session_id)
+
+    def revoke_all(self, db: Session, user_id: int) -> int:
+        """Sign a user out on every device (e.g. after a password change)"""
+        return self._revoke_where(db, RefreshToken.user_id == user_id)
+
+    def active_sessions(self, db: Session, user_id: int) -> list:
+        return db.execute(
+            select(RefreshToken.session_id, RefreshToken.device_name, RefreshToken.user_agent,
+                   RefreshToken.ip_address, RefreshToken.created_at, RefreshToken.last_used_at,
+                   RefreshToken.expires_at)
+            .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None),
+                   RefreshToken.expires_at > datetime.utcnow())
+            .order_by(RefreshToken.created_at)
+        ).all()
+
+    def load(self, conn) -> int:
+        """Rebuild the revoked filter from the revoked tokens that haven't expired yet"""
+        revoked = BloomFilter(self.filter_capacity, self.filter_error_rate)
+        for jti in conn.execute(
+            select(RefreshToken.jti)
+            .where(RefreshToken.revoked_at.is_not(None), RefreshToken.expires_at > datetime.utcnow())
+        ).scalars():
+            revoked.add(jti)
+        if revoked.count > self.filter_capacity:
+            logger.warning(f"{revoked.count} revoked refresh tokens exceed REFRESH_TOKEN_FILTER_CAPACITY "
+                           f"({self.filter_capacity}); more refreshes will need a table lookup")
+        with self._lock:
+            self.revoked = revoked
+        return revoked.count
+
+    def sweep(self, conn, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+        """Delete expired tokens in batches, then rebuild the filter without them"""
+        deleted = 0
+        cutoff = datetime.utcnow()
+        while True:
+            ids = select(RefreshToken.id).where(RefreshToken.expires_at <= cutoff).limit(batch_size)
+            removed = conn.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids.scalar_subquery()))).rowcount
+            deleted += removed
+            if removed < batch_size:
+                break
+        self.load(conn)
+        return deleted
+
+    def start(self, engine):
+        """Rebuild the filter and sweep expired tokens every ``sweep_interval`` seconds"""
+        if self._thread is not None:
+            return
+        self._engine = engine
+        with engine.connect() as conn:
+            loaded = self.load(conn)
+        logger.info(f"Loaded {loaded} revoked refresh tokens into the filter")
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="refresh-token-sweep", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                with self._engine.begin() as conn:
+                    deleted = self.sweep(conn)
+                logger.info(f"Deleted {deleted} expired refresh tokens")
+            except SQLAlchemyError as e:
+                logger.warning(f"Refresh token sweep failed, retrying later: {e}")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "revoked_in_filter": self.revoked.count,
+            "filter_skips": self.filter_skips,
+            "table_checks": self.table_checks,
+        }
+
+
+refresh_token_store = RefreshTokenStore(
+    lifetime=timedelta(days=settings.REFRESH_TOKEN_DAYS),
+    filter_capacity=settings.REFRESH_TOKEN_FILTER_CAPACITY,
+    filter_error_rate=settings.REFRESH_TOKEN_FILTER_ERROR_RATE,
+    sweep_interval=settings.REFRESH_TOKEN_SWEEP_SECONDS,
+)
@@ -7,6 +7,18 @@ from database.database import Base, get_db
 from database.models import User
 from passlib.context import CryptContext
 from unittest.mock import patch
+from contextlib import contextmanager
+from core.query_stats import count_queries
+
+
+def pytest_collection_modifyitems(config, items):
+    """Benchmarks (tests/test_benchmarks.py) only run with --benchmark-only"""
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmark; run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
 
 
 # Create test database
@@ -38,6 +50,25 @@ def test_db():
     connection.close()
 
 
+@pytest.fixture
+def query_budget():
+    """
+    Fail the test when a block runs more SQL statements than its budget:
+
+        with query_budget(4):
+            client.get("/clients/1")
+    """
+    @contextmanager
+    def budget(max_queries: int, db_engine=engine):
+        with count_queries(db_engine) as stats:
+            yield stats
+        if stats.count > max_queries:
+            pytest.fail(
+                f"{stats.count} SQL statements, budget is {max_queries}:\n" + "\n".join(stats.statements)
+            )
+    return budget
+
+
 @pytest.fixture(scope="function")
 def client(test_db):
     """Create a test client with rate limiting disabled"""
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import json
+
+from sqlalchemy import func, select
+
+from database.models import MealEntry, MealHistory, MealPlan, MealPlanArchive, User
+from services.archival import (
+    archive_meal_plans, delete_meal_plan_rows, delete_stale_pending_plans, load_archived_meal_plan,
+    parse_archived_document
+)
+from services.meal_plan_storage import build_plan_rows
+from tests.test_meal_plan_storage import make_generated_plan
+
+
+def add_plan(db, user_id: int, age_days: int) -> int:
+    meal_plan = MealPlan(user_id=user_id, goal="maintain", diet_type="balanced", daily_calories=1800,
+                         macro_protein=30, macro_carbs=40, macro_fats=30,
+                         created_at=datetime.utcnow() - timedelta(days=age_days))
+    db.add(meal_plan)
+    db.flush()
+    history, entries = build_plan_rows(meal_plan.id, make_generated_plan())
+    db.add_all(history + entries)
+    db.flush()
+    return meal_plan.id
+
+
+def count(db, column, mealplan_id) -> int:
+    return db.execute(select(func.count()).where(column == mealplan_id)).scalar()
+
+
+def test_archive_moves_old_plans_with_their_days(test_db):
+    """Test that plans past the retention age leave the hot tables and read back from the archive"""
+    user = User(email="archive@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    old_ids = [add_plan(test_db, user.id, age_days=400) for _ in range(3)]
+    recent_id = add_plan(test_db, user.id, age_days=10)
+
+    assert archive_meal_plans(test_db, older_than_days=365, batch_size=2, pause=0) == 3
+
+    for mealplan_id in old_ids:
+        assert count(test_db, MealPlan.id, mealplan_id) == 0
+        assert count(test_db, MealHistory.mealplan_id, mealplan_id) == 0
+        assert count(test_db, MealEntry.mealplan_id, mealplan_id) == 0
+    assert count(test_db, MealHistory.mealplan_id, recent_id) == 7
+    assert test_db.execute(select(func.count(MealPlanArchive.id))).scalar() == 3
+
+    plan, history, entries = load_archived_meal_plan(test_db, old_ids[0], user.id)
+    assert plan.id == old_ids[0]
+    assert plan.goal == "maintain"
+    assert isinstance(plan.created_at, datetime)
+    assert [day.day_number for day in history] == list(range(1, 8))
+    _, expected_entries = build_plan_rows(old_ids[0], make_generated_plan())
+    assert [(entry.day_number, entry.position, entry.name) for entry in entries] == [
+        (entry.day_number, entry.position, entry.name) for entry in expected_entries
+    ]
+
+    # Another user's archived plan is not visible
+    assert load_archived_meal_plan(test_db, old_ids[0], user.id + 1) is None
+
+
+def test_archived_plans_without_entries_rebuild_them(test_db):
+    """Test that documents archived before meals were stored get their meals from the days"""
+    user = User(email="legacy-archive@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    mealplan_id = add_plan(test_db, user.id, age_days=400)
+    archive_meal_plans(test_db, older_than_days=365, batch_size=10, pause=0)
+
+    document = json.loads(test_db.execute(
+        select(MealPlanArchive.document).where(MealPlanArchive.id == mealplan_id)
+    ).scalar())
+    del document["entries"]
+    _, _, entries = parse_archived_document(json.dumps(document))
+
+    _, expected_entries = build_plan_rows(mealplan_id, make_generated_plan())
+    assert [(entry.day_number, entry.position, entry.kind) for entry in entries] == [
+        (entry.day_number, entry.position, entry.kind) for entry in expected_entries
+    ]
+
+
+def test_archived_plan_ids_are_not_reused(test_db):
+    """Test that a new plan never gets the id of the newest plan once it is archived"""
+    user = User(email="reuse@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    archived_id = add_plan(test_db, user.id, age_days=400)
+    archive_meal_plans(test_db, older_than_days=365, batch_size=10, pause=0)
+
+    assert add_plan(test_db, user.id, age_days=1) > archived_id
+
+
+def test_delete_meal_plan_rows_leaves_no_orphans(test_db):
+    """Test that deleting a plan also deletes its days and meals"""
+    user = User(email="cascade@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    mealplan_id = add_plan(test_db, user.id, age_days=1)
+
+    delete_meal_plan_rows(test_db, [mealplan_id])
+
+    assert count(test_db, MealHistory.mealplan_id, mealplan_id) == 0
+    assert count(test_db, MealEntry.mealplan_id, mealplan_id) == 0
+
+
+def test_stale_pending_plans_are_deleted(test_db):
+    """Test that plans left pending by an interrupted generation are swept, recent and ready ones kept"""
+    user = User(email="pending@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    plans = {}
+    for name, status, age in [("stale", "pending", 120), ("generating", "pending", 1), ("ready", "ready", 120)]:
+        meal_plan = MealPlan(user_id=user.id, goal="maintain", diet_type="balanced", daily_calories=1800,
+                             macro_protein=30, macro_carbs=40, macro_fats=30, status=status,
+                             created_at=datetime.utcnow() - timedelta(minutes=age))
+        test_db.add(meal_plan)
+        test_db.flush()
+        plans[name] = meal_plan.id
+
+    assert delete_stale_pending_plans(test_db, older_than_minutes=30, batch_size=1) == 1
+
+    assert count(test_db, MealPlan.id, plans["stale"]) == 0
+    assert count(test_db, MealPlan.id, plans["generating"]) == 1
+    assert count(test_db, MealPlan.id, plans["ready"]) == 1
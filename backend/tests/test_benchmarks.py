@@ -0,0 +1,260 @@
+"""
+Benchmarks (pytest-benchmark).
+
+Run with:  python -m pytest tests/test_benchmarks.py --benchmark-only
+Tests that use the ``benchmark`` fixture are skipped in a normal test run
+(see conftest.py), so the suite doesn't spend minutes on timing loops.
+
+- PDF rendering: the shared renderer against one rebuilt per render, with
+  the peak memory of a single render in each benchmark's extra_info.
+- Meal plan list responses: rows copied into MealPlanResponse, validated
+  and encoded by FastAPI, against RowsJSONResponse.
+- JWT verification: a full PyJWT decode against a TokenService decode of a
+  token already in the verified cache.
+- TFA provisioning QR codes: the previous rendering (box_size=10 PIL PNG,
+  mask chosen by scoring all eight), the compact PNG and SVG renderers,
+  and a reload of the setup screen served from the cache.
+- Rate limiting: one check against the local store, for a client that
+  already has state and spread over many clients (the LRU/eviction path).
+"""
+import base64
+import io
+import itertools
+import tracemalloc
+from datetime import datetime, timedelta
+
+import jwt
+import pyotp
+import pytest
+import qrcode
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.pool import StaticPool
+
+from ai.pdf_generator import MealPlanPdfRenderer, get_renderer, render_meal_plan_pdf
+from core.rate_limit import LocalRateLimitStore, RateLimitPolicy
+from core.responses import RowsJSONResponse
+from core.tfa_manager import TwoFactorAuth, qr_code_cache, render_qr_png, render_qr_svg
+from core.token_service import TokenService
+from database.database import Base
+from database.models import MealPlan, User
+from database.schemas import MealPlanResponse
+
+
+# --- PDF rendering ---
+
+def make_meal_plan(days: int, meals_per_day: int, name_length: int = 20) -> dict:
+    """Build a meal plan in the shape export_meal_plan_pdf passes to the renderer"""
+    meal_names = ["Breakfast", "Snack", "Lunch", "Snack", "Dinner"]
+    history = []
+    for day in range(1, days + 1):
+        meals = []
+        for i in range(meals_per_day):
+            meals.append({
+                "meal": meal_names[i % len(meal_names)],
+                "name": ("Injera with lentil stew " * 10)[:name_length],
+                "calories": 350 + i * 10,
+                "protein": 25,
+                "carbs": 40,
+                "fats": 12
+            })
+        history.append({"day_number": day, "meals": {"meals": meals}})
+
+    return {
+        "id": 1,
+        "goal": "maintain",
+        "diet_type": "balanced",
+        "daily_calories": 2200,
+        "macros": {"protein": 140, "carbs": 250, "fats": 70},
+        "history": history,
+        "user_name": "Benchmark User"
+    }
+
+
+PLANS = {
+    "typical": make_meal_plan(days=7, meals_per_day=5),
+    "large": make_meal_plan(days=7, meals_per_day=12, name_length=60),
+    "28_day": make_meal_plan(days=28, meals_per_day=5),
+}
+
+
+def record_peak_memory(benchmark, func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    benchmark.extra_info["peak_memory_kb"] = round(peak / 1024, 1)
+
+
+@pytest.mark.parametrize("plan_name", list(PLANS))
+def test_render_with_shared_renderer(benchmark, plan_name):
+    """Render time with the per-process renderer (styles and layout built once)"""
+    meal_plan_data = PLANS[plan_name]
+    get_renderer()
+
+    record_peak_memory(benchmark, render_meal_plan_pdf, meal_plan_data)
+    pdf_bytes = benchmark(render_meal_plan_pdf, meal_plan_data)
+
+    assert pdf_bytes.startswith(b"%PDF")
+
+
+@pytest.mark.parametrize("plan_name", list(PLANS))
+def test_render_with_fresh_renderer(benchmark, plan_name):
+    """Baseline: rebuild styles and layout for every render, as before the shared renderer"""
+    meal_plan_data = PLANS[plan_name]
+
+    def render():
+        buffer = io.BytesIO()
+        MealPlanPdfRenderer().render(meal_plan_data, buffer)
+        return buffer.getvalue()
+
+    record_peak_memory(benchmark, render)
+    pdf_bytes = benchmark(render)
+
+    assert pdf_bytes.startswith(b"%PDF")
+
+
+# --- Meal plan list responses ---
+
+PAGE_SIZE = 200
+
+COLUMNS = (MealPlan.id, MealPlan.goal, MealPlan.diet_type, MealPlan.daily_calories,
+           MealPlan.macro_protein, MealPlan.macro_carbs, MealPlan.macro_fats, MealPlan.created_at)
+
+
+@pytest.fixture(scope="module")
+def list_client():
+    # One shared in-memory database for the threads TestClient runs sync routes in
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    created = datetime(2026, 1, 1, 8, 30, 15, 123456)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, email="bench@example.com", hashed_password="x"))
+        conn.execute(insert(MealPlan), [
+            {"user_id": 1, "goal": "lose", "diet_type": "balanced", "daily_calories": 1800,
+             "macro_protein": 30.0, "macro_carbs": 40.0, "macro_fats": 30.0, "status": "ready",
+             "created_at": created + timedelta(minutes=i)}
+            for i in range(PAGE_SIZE)
+        ])
+
+    def page():
+        with engine.connect() as conn:
+            return conn.execute(select(*COLUMNS).limit(PAGE_SIZE)).all()
+
+    app = FastAPI()
+
+    @app.get("/models", response_model=list[MealPlanResponse])
+    def models_path():
+        return [
+            MealPlanResponse(
+                id=row.id,
+                goal=row.goal,
+                diet_type=row.diet_type,
+                daily_calories=row.daily_calories,
+                macro_protein=row.macro_protein,
+                macro_carbs=row.macro_carbs,
+                macro_fats=row.macro_fats,
+                created_at=row.created_at
+            )
+            for row in page()
+        ]
+
+    @app.get("/orjson", response_model=list[MealPlanResponse])
+    def orjson_path():
+        return RowsJSONResponse([row._asdict() for row in page()])
+
+    yield TestClient(app)
+    engine.dispose()
+
+
+def test_orjson_matches_response_model(list_client):
+    """Test that both paths produce the same JSON"""
+    assert list_client.get("/orjson").json() == list_client.get("/models").json()
+
+
+@pytest.mark.parametrize("path", ["/models", "/orjson"])
+def test_meal_plan_page_request(benchmark, list_client, path):
+    """Per-request cost of a 200-plan page through each serialization path"""
+    response = benchmark(list_client.get, path)
+
+    assert response.status_code == 200
+    assert len(response.json()) == PAGE_SIZE
+
+
+# --- JWT verification ---
+
+JWT_SECRET = "benchmark-secret"
+
+
+@pytest.fixture(scope="module")
+def access_token():
+    service = TokenService(JWT_SECRET, "HS256", cache_size=10)
+    return service.encode({"sub": "42", "type": "access"}, timedelta(hours=1))
+
+
+def test_benchmark_decode_uncached(benchmark, access_token):
+    claims = benchmark(jwt.decode, access_token, JWT_SECRET, algorithms=["HS256"])
+    assert claims["sub"] == "42"
+
+
+def test_benchmark_decode_cached(benchmark, access_token):
+    service = TokenService(JWT_SECRET, "HS256", cache_size=10)
+    service.decode(access_token)
+    claims = benchmark(service.decode, access_token)
+    assert claims["sub"] == "42"
+
+
+# --- TFA provisioning QR codes ---
+
+TFA_SECRET = pyotp.random_base32()
+TFA_URI = pyotp.TOTP(TFA_SECRET).provisioning_uri(name="someone@example.com", issuer_name="AI Nutritionist")
+
+
+def render_previous_qr(data: str) -> str:
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_benchmark_previous_png(benchmark):
+    assert benchmark(render_previous_qr, TFA_URI)
+
+
+def test_benchmark_compact_png(benchmark):
+    assert benchmark(render_qr_png, TFA_URI).startswith(b"\x89PNG")
+
+
+def test_benchmark_svg(benchmark):
+    assert benchmark(render_qr_svg, TFA_URI).startswith(b"<svg")
+
+
+def test_benchmark_cached_reload(benchmark):
+    qr_code_cache.discard(TFA_SECRET)
+    TwoFactorAuth.generate_qr_code(TFA_SECRET, "someone@example.com", fmt="png")
+    assert benchmark(TwoFactorAuth.generate_qr_code, TFA_SECRET, "someone@example.com", fmt="png")
+
+
+# --- Rate limiting ---
+
+RATE_POLICY = RateLimitPolicy("bench", limit=10**9, period=1)
+
+
+def test_benchmark_hit_same_key(benchmark):
+    store = LocalRateLimitStore(max_keys=1000)
+    result = benchmark(store.hit_sync, "user:1", RATE_POLICY)
+    assert result.allowed
+
+
+def test_benchmark_hit_many_keys(benchmark):
+    store = LocalRateLimitStore(max_keys=1000)
+    keys = itertools.cycle([f"ip:10.0.{n // 256}.{n % 256}" for n in range(5000)])
+    result = benchmark(lambda: store.hit_sync(next(keys), RATE_POLICY))
+    assert result.allowed
+    assert len(store) <= 1000
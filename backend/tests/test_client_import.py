@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from core.principal_cache import Principal
+from database.database import get_db
+from database.models import ClientProfile, User
+from routers import clients
+from routers.auth import get_current_user
+
+CSV_HEADER = "name,email,age,gender,height_cm,weight_kg\n"
+
+
+@pytest.fixture
+def import_client(test_db):
+    coach = User(email="coach@example.com", hashed_password="x")
+    test_db.add(coach)
+    test_db.flush()
+
+    app = FastAPI()
+    app.include_router(clients.router)
+    app.dependency_overrides[get_db] = lambda: test_db
+    principal = Principal(id=coach.id, email=coach.email, name=None, role="user", status="Active", is_active=True)
+    app.dependency_overrides[get_current_user] = lambda: principal
+    return TestClient(app)
+
+
+def upload(client, filename: str, content: str):
+    return client.post("/clients/import", files={"file": (filename, content.encode(), "application/octet-stream")})
+
+
+def test_import_csv(import_client, test_db):
+    """Test that valid CSV rows are created and invalid ones reported by row number"""
+    content = CSV_HEADER + (
+        "Abebe,abebe@example.com,30,male,175,72.5\n"
+        "Bad Age,bad@example.com,thirty,female,160,55\n"
+        "Hana,hana@example.com,28,female,162,58\n"
+        "Hana Again,hana@example.com,29,female,162,58\n"
+    )
+
+    response = upload(import_client, "clients.csv", content)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["imported"] == 2
+    assert [error["row"] for error in body["errors"]] == [2, 4]
+    assert body["errors"][0]["errors"][0].startswith("age:")
+    assert "duplicated" in body["errors"][1]["errors"][0]
+
+    weight = test_db.execute(select(ClientProfile.weight).where(ClientProfile.email == "abebe@example.com")).scalar()
+    assert weight == 72
+
+
+def test_import_ndjson_skips_registered_emails(import_client):
+    """Test NDJSON uploads and that clients already registered are not created twice"""
+    rows = [
+        {"name": f"Client {i}", "email": f"client{i}@example.com", "age": 30, "gender": "female",
+         "height_cm": 165, "weight_kg": 60}
+        for i in range(3)
+    ]
+    content = "\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+
+    first = upload(import_client, "clients.ndjson", content).json()
+    second = upload(import_client, "clients.ndjson", content).json()
+
+    assert first["imported"] == 3
+    assert first["errors"] == [{"row": 4, "errors": ["not a JSON object"]}]
+    assert second["imported"] == 0
+    assert second["failed"] == 4
+
+
+def test_import_thousands_of_clients(import_client, test_db, query_budget):
+    """Test that a gym-sized upload goes through in batches, not one insert per client"""
+    content = CSV_HEADER + "".join(
+        f"Client {i},client{i}@example.com,30,male,180,80\n" for i in range(5000)
+    )
+
+    # 10 batches: an email lookup and one executemany each
+    with query_budget(25):
+        body = upload(import_client, "clients.csv", content).json()
+
+    assert body == {"imported": 5000, "failed": 0, "errors": []}
+    assert test_db.execute(select(func.count(ClientProfile.id))).scalar() == 5000
+
+
+def test_import_rejects_unknown_format(import_client):
+    """Test that an upload that is neither CSV nor NDJSON is refused"""
+    response = upload(import_client, "clients.xlsx", "whatever")
+
+    assert response.status_code == 400
+
+
+def test_delete_client_loads_details_with_the_profile(import_client, test_db, query_budget):
+    """Test that deleting a client reads its profile and details in one query"""
+    upload(import_client, "clients.csv", CSV_HEADER + "Abebe,abebe@example.com,30,male,170,70\n")
+    client = test_db.execute(select(ClientProfile).where(ClientProfile.email == "abebe@example.com")).scalar_one()
+    client.bio = "Marathon runner"
+    test_db.flush()
+    client_id = client.id
+    test_db.expire_all()
+
+    with query_budget(10) as stats:
+        response = import_client.delete(f"/clients/{client_id}")
+
+    assert response.status_code == 200
+    lookups = [statement for statement in stats.statements
+               if statement.startswith("SELECT") and "client_profile" in statement]
+    assert len(lookups) == 1
+    assert "JOIN client_profile_details" in lookups[0]
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from core.email_utils import EmailVerification
+from database.models import ClientProfile, ClientProfileDetails, User
+
+
+def add_client(db, **fields) -> ClientProfile:
+    coach = User(email="coach-profile@example.com", hashed_password="x")
+    db.add(coach)
+    db.flush()
+    client = ClientProfile(coach_id=coach.id, name="Abebe", email="abebe@example.com", password_hash="x", **fields)
+    db.add(client)
+    db.flush()
+    return client
+
+
+def test_profile_fields_read_and_write_through_details(test_db):
+    """Test that cold profile fields still behave like ClientProfile attributes"""
+    client = add_client(test_db, bio="Marathon runner")
+    client.company = "Addis Gym"
+    test_db.flush()
+    test_db.expire_all()
+
+    details = test_db.get(ClientProfileDetails, client.id)
+    assert (details.bio, details.company) == ("Marathon runner", "Addis Gym")
+    assert test_db.get(ClientProfile, client.id).bio == "Marathon runner"
+
+
+def test_auth_lookup_reads_only_auth_columns(test_db, query_budget):
+    """Test that the email verification check neither selects nor joins the profile fields"""
+    add_client(test_db, email_verification_token="123456",
+               email_verification_expires=datetime.utcnow() + timedelta(hours=1), bio="Not needed")
+    test_db.expire_all()
+
+    with query_budget(2) as stats:
+        user = EmailVerification.verify_email_token(test_db, "123456")
+
+    assert user.is_verified
+    lookup = stats.statements[0]
+    assert "client_profile_details" not in lookup
+    assert "password_hash" not in lookup
+
+
+def test_profile_fields_of_many_clients_load_in_one_query(test_db, query_budget):
+    """Test that reading a profile field across a list of clients doesn't query once per client"""
+    coach = add_client(test_db, bio="Coach").coach_id
+    for i in range(5):
+        test_db.add(ClientProfile(coach_id=coach, name=f"Client {i}", email=f"client{i}@example.com",
+                                  password_hash="x", bio=f"Bio {i}"))
+    test_db.flush()
+    test_db.expire_all()
+
+    with query_budget(2):
+        clients = test_db.execute(select(ClientProfile).where(ClientProfile.coach_id == coach)).scalars().all()
+        bios = [client.bio for client in clients]
+
+    assert sorted(bios) == ["Bio 0", "Bio 1", "Bio 2", "Bio 3", "Bio 4", "Coach"]
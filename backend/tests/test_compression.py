@@ -0,0 +1,163 @@
+import json
+import random
+
+import pytest
+from sqlalchemy import LargeBinary, create_engine, event, insert, select, text, type_coerce
+
+from database import compression
+from database.compression import (
+    ZSTD_MAGIC,
+    MealPlanCodec,
+    compression_report,
+    frame_dictionary_id,
+    recompress_meal_history,
+    train_dictionary,
+)
+from database.migrations import run_migrations
+from database.models import MealHistory, MealPlan, User
+
+INGREDIENTS = ["injera", "lentils", "teff", "chickpeas", "spinach", "eggs", "oats", "banana", "yogurt", "rice"]
+
+
+@pytest.fixture
+def codec(monkeypatch):
+    """A codec of its own, so dictionaries trained here don't leak into other tests"""
+    fresh = MealPlanCodec(level=3)
+    monkeypatch.setattr(compression, "meal_plan_codec", fresh)
+    return fresh
+
+
+@pytest.fixture
+def compression_engine(tmp_path, codec):
+    engine = create_engine(f"sqlite:///{tmp_path / 'compression.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def make_day(rng, day_number: int) -> str:
+    meals = [
+        {"name": f"{meal} {rng.choice(INGREDIENTS)} bowl", "calories": rng.randint(300, 700),
+         "ingredients": rng.sample(INGREDIENTS, 3)}
+        for meal in ("Breakfast", "Lunch", "Dinner")
+    ]
+    snacks = [{"name": rng.choice(INGREDIENTS).title(), "calories": rng.randint(80, 250)} for _ in range(2)]
+    return json.dumps({"day": day_number, "meals": meals, "snacks": snacks, "total_calories": 1800})
+
+
+def add_legacy_days(engine, count: int):
+    """Insert plain-text days, as stored before compression"""
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        user_id = conn.execute(insert(User).values(email="zstd@example.com", hashed_password="x")).inserted_primary_key[0]
+        mealplan_id = conn.execute(insert(MealPlan).values(
+            user_id=user_id, goal="maintain", diet_type="balanced", daily_calories=1800,
+            macro_protein=30, macro_carbs=40, macro_fats=30, status="ready"
+        )).inserted_primary_key[0]
+        for i in range(count):
+            conn.execute(
+                text("INSERT INTO meal_history (mealplan_id, day_number, meals_json) VALUES (:id, :day, :json)"),
+                {"id": mealplan_id, "day": i % 7 + 1, "json": make_day(rng, i % 7 + 1)}
+            )
+
+
+def test_codec_round_trip_without_dictionary(codec):
+    """Test that a document compresses into a zstd frame and reads back unchanged"""
+    document = make_day(random.Random(1), 1)
+    frame = codec.compress(document)
+
+    assert frame.startswith(ZSTD_MAGIC)
+    assert codec.decompress(frame) == document
+    # Rows stored before compression are returned as they are
+    assert codec.decompress(document) == document
+
+
+def test_train_and_recompress(compression_engine, codec):
+    """Test that existing rows are rewritten with a trained dictionary and still read back"""
+    add_legacy_days(compression_engine, 300)
+
+    with compression_engine.begin() as conn:
+        dict_id = train_dictionary(conn)
+    batches = []
+    assert recompress_meal_history(compression_engine, batch_size=100, on_batch=lambda: batches.append(1)) == 300
+    # Committed batch by batch
+    assert len(batches) == 3
+    # Everything is already on the active dictionary
+    assert recompress_meal_history(compression_engine) == 0
+
+    with compression_engine.connect() as conn:
+        stored = conn.execute(select(type_coerce(MealHistory.meals_json, LargeBinary))).scalars().first()
+        assert frame_dictionary_id(stored) == dict_id
+        assert json.loads(conn.execute(select(MealHistory.meals_json)).scalars().first())["day"] == 1
+
+        report = compression_report(conn)
+
+    assert report["rows"] == 300
+    assert list(report["by_dictionary"]) == [dict_id]
+    assert report["ratio"] > 3
+
+
+def test_dictionaries_reload_from_database(compression_engine, codec):
+    """Test that a new worker reads frames written with a dictionary trained elsewhere"""
+    add_legacy_days(compression_engine, 300)
+    with compression_engine.begin() as conn:
+        train_dictionary(conn)
+    recompress_meal_history(compression_engine)
+
+    other_worker = MealPlanCodec()
+    other_worker.bind(compression_engine)
+    with compression_engine.connect() as conn:
+        stored = conn.execute(select(type_coerce(MealHistory.meals_json, LargeBinary))).scalars().first()
+
+    assert json.loads(other_worker.decompress(stored))["day"] == 1
+
+
+def test_unknown_dictionary_is_loaded_by_refresh_not_on_read(compression_engine, codec):
+    """Test that reading a frame never queries the database; refresh() picks up new dictionaries"""
+    worker = MealPlanCodec()
+    worker.bind(compression_engine)
+
+    # Trained by another process after the worker started
+    add_legacy_days(compression_engine, 300)
+    with compression_engine.begin() as conn:
+        dict_id = train_dictionary(conn)
+    frame = codec.compress(make_day(random.Random(3), 2))
+    assert frame_dictionary_id(frame) == dict_id
+
+    statements = []
+    event.listen(compression_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    with pytest.raises(LookupError):
+        worker.decompress(frame)
+    assert statements == []
+
+    assert worker.refresh() == 1
+    assert json.loads(worker.decompress(frame))["day"] == 2
+    # Only dictionaries it doesn't have yet are read again
+    assert worker.refresh() == 0
+
+
+def test_new_dictionary_is_written_only_once_every_worker_has_it(compression_engine, codec):
+    """Test that a freshly trained dictionary is readable at once but only used for writes after the refresh window"""
+    add_legacy_days(compression_engine, 300)
+    with compression_engine.begin() as conn:
+        old_id = train_dictionary(conn)
+    worker = MealPlanCodec()
+    worker.activate_after = 0
+    worker.bind(compression_engine)
+    assert worker.active_dictionary_id == old_id
+
+    with compression_engine.begin() as conn:
+        # Fewer samples, so a different dictionary
+        new_id = train_dictionary(conn, sample_limit=200)
+    assert new_id != old_id
+    worker.activate_after = 3600
+    assert worker.refresh() == 1
+    assert new_id in worker.dictionary_ids
+    # A worker that hasn't refreshed yet can still read what this one writes
+    assert frame_dictionary_id(worker.compress(make_day(random.Random(4), 1))) == old_id
+
+    # Once the window has passed the next refresh switches, without reading anything new
+    worker.activate_after = 0
+    assert worker.refresh() == 0
+    assert worker.active_dictionary_id == new_id
@@ -0,0 +1,59 @@
+from sqlalchemy import text
+
+from database.database import create_db_engine, get_pool_stats
+
+
+def test_sqlite_engine_applies_pragmas(tmp_path):
+    """Test that every SQLite connection gets WAL mode and the tuning pragmas"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # synchronous=NORMAL is reported as 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64000
+
+    engine.dispose()
+
+
+def test_pool_stats(tmp_path):
+    """Test that pool statistics report checked-out connections"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+
+    with engine.connect():
+        stats = get_pool_stats(engine)
+        assert stats["pool_class"] == "QueuePool"
+        assert stats["checkedout"] == 1
+
+    assert get_pool_stats(engine)["checkedout"] == 0
+    engine.dispose()
+
+
+def test_async_sqlite_engine_applies_pragmas(tmp_path):
+    """Test that the async engine talks to the same SQLite file with the same tuning"""
+    import asyncio
+    from database.database import create_async_db_engine
+
+    async_engine = create_async_db_engine(f"sqlite:///{tmp_path / 'async.db'}")
+
+    async def run():
+        async with async_engine.connect() as conn:
+            journal_mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+            busy_timeout = (await conn.execute(text("PRAGMA busy_timeout"))).scalar()
+        await async_engine.dispose()
+        return journal_mode, busy_timeout
+
+    assert asyncio.run(run()) == ("wal", 5000)
+
+
+def test_pool_stats_are_served_to_admins():
+    """Test that the admin stats route reports both connection pools"""
+    from core.principal_cache import Principal
+    from routers.mealplan import get_pdf_render_stats
+
+    admin = Principal(id=1, email="admin@example.com", name=None, role="admin", status="Active", is_active=True)
+    stats = get_pdf_render_stats(admin)["database"]
+
+    assert {"sync", "async"} <= set(stats)
+    assert all("pool_class" in pool for pool in stats.values())
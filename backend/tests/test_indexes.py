@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import and_, create_engine, func, literal_column, or_, select, text
+
+from database.migrations import run_migrations
+from database.models import ClientProfile, MealEntry, MealHistory, MealPlan, NutritionInput
+
+
+@pytest.fixture(scope="module")
+def migrated_engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('indexes') / 'indexes.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, statement) -> str:
+    sql = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+HOT_QUERIES = {
+    # get_user_meal_plans: filter by owner, newest first, no sort step
+    "ix_meal_plans_user_id_created_at": select(MealPlan.id, MealPlan.goal, MealPlan.created_at)
+        .where(MealPlan.user_id == 1, MealPlan.status == "ready")
+        .order_by(MealPlan.created_at.desc(), MealPlan.id.desc())
+        .limit(51),
+    # get_all_meal_plans: keyset page after a (created_at, id) cursor
+    "ix_meal_plans_created_at": select(MealPlan.id, MealPlan.goal, MealPlan.created_at)
+        .where(MealPlan.status == "ready", or_(
+            MealPlan.created_at < datetime(2026, 1, 1),
+            and_(MealPlan.created_at == datetime(2026, 1, 1), MealPlan.id < 100)
+        ))
+        .order_by(MealPlan.created_at.desc(), MealPlan.id.desc())
+        .limit(51),
+    # delete_stale_pending_plans: only the pending plans are indexed
+    "ix_meal_plans_pending_created_at": select(MealPlan.id)
+        .where(MealPlan.status == literal_column("'pending'"), MealPlan.created_at < datetime(2026, 1, 1))
+        .limit(200),
+    # get_meal_plan / export_meal_plan_pdf: a plan's days in order
+    "ix_meal_history_mealplan_id_day_number": select(MealHistory.day_number, MealHistory.meals_json)
+        .where(MealHistory.mealplan_id == 1)
+        .order_by(MealHistory.day_number),
+    # get_meal / get_meal_plan_summary: one day's meals, or a plan's meals grouped by day
+    "ix_meal_entries_mealplan_id_day_number_position": select(MealEntry.day_number, func.sum(MealEntry.calories))
+        .where(MealEntry.mealplan_id == 1)
+        .group_by(MealEntry.day_number),
+    # EmailVerification.verify_email_token
+    "ix_client_profiles_email_verification": select(ClientProfile.id).where(
+        ClientProfile.email_verification_token == "123456",
+        ClientProfile.email_verification_expires > datetime(2026, 1, 1)
+    ),
+    # EmailVerification.validate_password_reset_token
+    "ix_client_profiles_password_reset": select(ClientProfile.id).where(
+        ClientProfile.password_reset_token == "123456",
+        ClientProfile.password_reset_expires > datetime(2026, 1, 1)
+    ),
+    # Nutrition inputs joined to their client
+    "ix_nutrition_inputs_client_id": select(NutritionInput.id, ClientProfile.name)
+        .join(ClientProfile, NutritionInput.client_id == ClientProfile.id)
+        .where(ClientProfile.id == 1),
+}
+
+
+@pytest.mark.parametrize("index_name", list(HOT_QUERIES))
+def test_hot_query_uses_index(migrated_engine, index_name):
+    """Test that each hot query is answered through its index instead of a table scan"""
+    plan = query_plan(migrated_engine, HOT_QUERIES[index_name])
+
+    assert index_name in plan
+    assert "USE TEMP B-TREE" not in plan
@@ -0,0 +1,146 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.pool import StaticPool
+
+from core.query_stats import count_queries
+from database.database import Base
+from database.models import User
+from services.login_lockout import LoginLockoutStore
+
+EMAIL = "someone@example.com"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 1, 12, 0)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, email=EMAIL, hashed_password="x"))
+    yield engine
+    engine.dispose()
+
+
+def make_store(clock=None, **overrides) -> LoginLockoutStore:
+    options = dict(max_attempts=5, lockout_duration=timedelta(minutes=30), flush_interval=60,
+                   flush_threshold=100, max_entries=1000)
+    options.update(overrides)
+    return LoginLockoutStore(clock=clock or FakeClock(), **options)
+
+
+def saved_state(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(User.failed_login_attempts, User.locked_until, User.last_login)
+            .where(User.email == EMAIL)
+        ).one()
+
+
+def test_locks_on_the_configured_attempt_and_unlocks_after_duration():
+    """Test that the fifth failure locks the account for exactly the lockout duration"""
+    clock = FakeClock()
+    store = make_store(clock)
+
+    assert [store.record_failure(EMAIL) for _ in range(4)] == [None] * 4
+    assert store.locked_until(EMAIL) is None
+    assert store.record_failure(EMAIL) == clock.now + timedelta(minutes=30)
+    assert store.locked_until(EMAIL) == clock.now + timedelta(minutes=30)
+
+    clock.now += timedelta(minutes=30)
+    assert store.locked_until(EMAIL) is None
+
+
+def test_success_resets_the_count():
+    """Test that a successful login clears earlier failures"""
+    store = make_store()
+    for _ in range(4):
+        store.record_failure(EMAIL)
+    store.record_success(EMAIL)
+    for _ in range(4):
+        store.record_failure(EMAIL)
+
+    assert store.locked_until(EMAIL) is None
+
+
+def test_burst_of_failures_is_one_write(engine):
+    """Test that a thousand failures against one account are saved with a single UPDATE"""
+    store = make_store()
+    for _ in range(1000):
+        store.record_failure(EMAIL)
+
+    with count_queries(engine) as stats, engine.begin() as conn:
+        assert store.flush(conn) == 1
+
+    assert stats.count == 1
+    failed, locked_until, _ = saved_state(engine)
+    assert failed == 1000 and locked_until is not None
+    with engine.begin() as conn:
+        assert store.flush(conn) == 0
+
+
+def test_lockouts_survive_a_restart(engine):
+    """Test that a new store loads locks and partial counts saved by the previous one"""
+    clock = FakeClock()
+    store = make_store(clock)
+    for _ in range(5):
+        store.record_failure(EMAIL)
+    with engine.begin() as conn:
+        store.flush(conn)
+
+    restarted = make_store(clock)
+    with engine.connect() as conn:
+        assert restarted.load(conn) == 1
+
+    assert restarted.locked_until(EMAIL) == store.locked_until(EMAIL)
+
+
+def test_success_saves_last_login(engine):
+    """Test that last_login and the cleared counters are written behind"""
+    clock = FakeClock()
+    store = make_store(clock)
+    store.record_failure(EMAIL)
+    store.record_success(EMAIL)
+    with engine.begin() as conn:
+        store.flush(conn)
+
+    assert tuple(saved_state(engine)) == (0, None, clock.now)
+
+
+def test_eviction_keeps_locked_and_unsaved_entries(engine):
+    """Test that the size bound only drops entries that are saved and unlocked"""
+    store = make_store(max_entries=10)
+    for _ in range(5):
+        store.record_failure(EMAIL)
+    for n in range(100):
+        store.record_failure(f"stuffing{n}@example.com")
+        with engine.begin() as conn:
+            store.flush(conn)
+
+    assert store.stats()["entries"] <= 11
+    assert store.locked_until(EMAIL) is not None
+
+
+def test_new_lock_is_flushed_without_waiting_for_the_timer(engine):
+    """Test that the background flusher saves a new lockout right away"""
+    store = make_store(clock=datetime.utcnow, flush_interval=60)
+    store.start(engine)
+    try:
+        for _ in range(5):
+            store.record_failure(EMAIL)
+        deadline = time.monotonic() + 5
+        while saved_state(engine).locked_until is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        store.stop()
+
+    assert saved_state(engine).locked_until is not None
@@ -0,0 +1,93 @@
+import json
+
+from sqlalchemy import func, select
+
+from database.models import MealEntry, MealHistory, MealPlan, User
+from services.meal_plan_storage import backfill_full_plan_rows, build_plan_rows, split_generated_plan
+
+
+def make_generated_plan(days: int = 7) -> str:
+    """A plan in the shape PROMPT_TEMPLATE asks the model for"""
+    return json.dumps([
+        {
+            "day": day,
+            "meals": [
+                {"name": "Breakfast", "calories": 400, "ingredients": ["oats", "milk"]},
+                {"name": "Lunch", "calories": 600, "ingredients": ["injera", "lentils"]},
+                {"name": "Dinner", "calories": 500, "ingredients": ["rice", "beans"]}
+            ],
+            "snacks": [
+                {"name": "Banana", "calories": 100},
+                {"name": "Peanuts", "calories": 200}
+            ],
+            "total_calories": 1800
+        }
+        for day in range(1, days + 1)
+    ])
+
+
+def add_meal_plan(db, user_id: int) -> int:
+    meal_plan = MealPlan(user_id=user_id, goal="maintain", diet_type="balanced", daily_calories=1800,
+                         macro_protein=30, macro_carbs=40, macro_fats=30)
+    db.add(meal_plan)
+    db.flush()
+    return meal_plan.id
+
+
+def test_build_plan_rows_splits_days_and_meals():
+    """Test that a generated plan becomes one row per day and one per meal or snack"""
+    history, entries = build_plan_rows(1, make_generated_plan())
+
+    assert [hist.day_number for hist in history] == list(range(1, 8))
+    assert len(json.loads(history[0].meals_json)["meals"]) == 3
+    assert len(entries) == 7 * 5
+    assert [(entry.position, entry.kind) for entry in entries[:5]] == [
+        (0, "meal"), (1, "meal"), (2, "meal"), (3, "snack"), (4, "snack")
+    ]
+    assert json.loads(entries[0].ingredients_json) == ["oats", "milk"]
+    assert entries[3].ingredients_json is None
+
+
+def test_split_generated_plan_strips_code_fence():
+    """Test that a plan wrapped in a markdown code fence is still split"""
+    days = split_generated_plan(f"```json\n{make_generated_plan(2)}\n```")
+
+    assert len(days) == 2
+
+
+def test_unparseable_plan_is_kept_whole():
+    """Test that a plan that isn't a JSON list of days is stored as a single day 0 row"""
+    history, entries = build_plan_rows(1, "Here is your meal plan: ...")
+
+    assert [hist.day_number for hist in history] == [0]
+    assert history[0].meals_json == "Here is your meal plan: ..."
+    assert entries == []
+
+
+def test_backfill_splits_full_plan_rows(test_db):
+    """Test that the backfill job replaces day 0 rows and leaves unparseable plans alone"""
+    user = User(email="storage@example.com", hashed_password="x")
+    test_db.add(user)
+    test_db.flush()
+    mealplan_id = add_meal_plan(test_db, user.id)
+    broken_id = add_meal_plan(test_db, user.id)
+    test_db.add(MealHistory(mealplan_id=mealplan_id, day_number=0, meals_json=make_generated_plan()))
+    test_db.add(MealHistory(mealplan_id=broken_id, day_number=0, meals_json="not json"))
+    test_db.flush()
+
+    assert backfill_full_plan_rows(test_db, batch_size=1) == {"split": 1, "skipped": 1}
+
+    days = test_db.execute(
+        select(MealHistory.day_number).where(MealHistory.mealplan_id == mealplan_id).order_by(MealHistory.day_number)
+    ).scalars().all()
+    assert days == list(range(1, 8))
+
+    average = test_db.execute(
+        select(func.avg(MealEntry.calories)).where(MealEntry.mealplan_id == mealplan_id, MealEntry.kind == "snack")
+    ).scalar()
+    assert average == 150
+
+    assert test_db.execute(
+        select(MealHistory.day_number).where(MealHistory.mealplan_id == broken_id)
+    ).scalars().all() == [0]
+
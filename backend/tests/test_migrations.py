@@ -0,0 +1,245 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, insert, inspect, text
+
+from database.migrations import (
+    MigrationLockTimeout,
+    current_version,
+    load_migrations,
+    migration_lock,
+    migration_metadata,
+    run_migrations,
+)
+
+
+@pytest.fixture
+def migration_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_migrations_create_schema(migration_engine):
+    """Test that a fresh database is brought to the newest version"""
+    latest = load_migrations()[-1][0]
+
+    assert run_migrations(migration_engine) == latest
+    assert current_version(migration_engine) == latest
+
+    tables = set(inspect(migration_engine).get_table_names())
+    assert {"users", "meal_plans", "meal_history", "audit_logs", "schema_version"} <= tables
+
+
+def test_migrations_upgrade_legacy_users_table(migration_engine):
+    """Test that a users table created before the profile columns gets them added"""
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR(255) NOT NULL, "
+            "hashed_password VARCHAR NOT NULL, is_active BOOLEAN, full_name VARCHAR(255))"
+        ))
+
+    run_migrations(migration_engine)
+
+    columns = {column["name"] for column in inspect(migration_engine).get_columns("users")}
+    assert {"role", "bio", "status", "failed_login_attempts", "locked_until", "last_login"} <= columns
+
+
+def test_migrations_startup_check_is_single_query(migration_engine):
+    """Test that an up-to-date database costs one query at startup"""
+    run_migrations(migration_engine)
+
+    statements = []
+    event.listen(migration_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    run_migrations(migration_engine)
+
+    assert len(statements) == 1
+    assert "schema_version" in statements[0]
+
+
+def test_migrations_wait_for_lock(migration_engine):
+    """Test that a worker does not migrate while another one holds the lock"""
+    migration_metadata.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(insert(migration_lock).values(id=1, owner="other-worker", locked_at=datetime.utcnow()))
+
+    with pytest.raises(MigrationLockTimeout):
+        run_migrations(migration_engine, lock_timeout=0)
+
+    assert current_version(migration_engine) == 0
+
+
+def test_migrations_tolerate_a_concurrent_bookkeeping_create(migration_engine, monkeypatch):
+    """Test that losing the race to create schema_version to another booting worker is not an error"""
+    from sqlalchemy.exc import OperationalError
+
+    create_all = migration_metadata.create_all
+
+    def create_all_after_other_worker(bind, **kwargs):
+        # The other worker's CREATE TABLE lands between our check and ours
+        create_all(bind=bind)
+        raise OperationalError("CREATE TABLE schema_version", {}, Exception("table schema_version already exists"))
+
+    monkeypatch.setattr(migration_metadata, "create_all", create_all_after_other_worker)
+
+    assert run_migrations(migration_engine) == load_migrations()[-1][0]
+
+
+def test_migrations_record_batched_upgrades_only_once_finished(migration_engine, monkeypatch):
+    """Test that a migration interrupted in its batched step is run again on the next start"""
+    version, _, module = next(migration for migration in load_migrations() if hasattr(migration[2], "upgrade_batches"))
+    upgrade_batches = module.upgrade_batches
+
+    def interrupted(engine, keep_alive):
+        keep_alive()
+        raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(module, "upgrade_batches", interrupted)
+    with pytest.raises(RuntimeError):
+        run_migrations(migration_engine)
+    assert current_version(migration_engine) == version - 1
+
+    monkeypatch.setattr(module, "upgrade_batches", upgrade_batches)
+    assert run_migrations(migration_engine) == load_migrations()[-1][0]
+
+
+def test_migrations_move_cold_client_profile_columns(migration_engine):
+    """Test that existing profile fields move to client_profile_details and leave client_profiles"""
+    from sqlalchemy import Column, MetaData, String, Table, Text
+
+    from database.models import ClientProfile
+
+    # client_profiles as it was before the split
+    legacy = MetaData()
+    Table(
+        "client_profiles", legacy,
+        *[Column(column.name, column.type, primary_key=column.primary_key) for column in ClientProfile.__table__.columns],
+        Column("company", String), Column("location", String), Column("bio", Text),
+    )
+    legacy.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO client_profiles (id, coach_id, name, email, password_hash, role, bio, company) "
+            "VALUES (1, 1, 'Abebe', 'abebe@example.com', 'x', 'user', 'Runner', 'Gym'), "
+            "(2, 1, 'Hana', 'hana@example.com', 'x', 'user', NULL, NULL)"
+        ))
+
+    run_migrations(migration_engine)
+
+    assert not {"bio", "company", "location"} & {
+        column["name"] for column in inspect(migration_engine).get_columns("client_profiles")
+    }
+    with migration_engine.connect() as conn:
+        rows = conn.execute(text("SELECT client_id, bio, company FROM client_profile_details")).all()
+    assert rows == [(1, "Runner", "Gym")]
+
+
+def test_migrations_drop_the_single_refresh_token_columns(migration_engine):
+    """Test that the per-client refresh token columns go and their hashes aren't carried over"""
+    from sqlalchemy import Column, DateTime, MetaData, String, Table
+
+    from database.models import ClientProfile
+
+    # client_profiles as it was with a single refresh token per client
+    legacy = MetaData()
+    Table(
+        "client_profiles", legacy,
+        *[Column(column.name, column.type, primary_key=column.primary_key) for column in ClientProfile.__table__.columns],
+        Column("refresh_token_hash", String), Column("refresh_token_expires", DateTime),
+    )
+    legacy.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO client_profiles (id, coach_id, name, email, password_hash, role, "
+            "refresh_token_hash, refresh_token_expires) "
+            "VALUES (1, 1, 'Abebe', 'abebe@example.com', 'x', 'user', 'live', '2999-01-01 00:00:00')"
+        ))
+
+    run_migrations(migration_engine)
+
+    assert not {"refresh_token_hash", "refresh_token_expires"} & {
+        column["name"] for column in inspect(migration_engine).get_columns("client_profiles")
+    }
+    with migration_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM refresh_tokens")).scalar() == 0
+
+
+def test_migrations_give_refresh_tokens_to_users(migration_engine):
+    """Test that a refresh_tokens table keyed by client profile is rebuilt keyed by user"""
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE refresh_tokens (id INTEGER PRIMARY KEY, token_hash VARCHAR(64) NOT NULL UNIQUE, "
+            "jti VARCHAR(32) NOT NULL UNIQUE, session_id VARCHAR(32) NOT NULL, client_id INTEGER NOT NULL, "
+            "device_name VARCHAR(255), user_agent VARCHAR(512), ip_address VARCHAR(45), created_at DATETIME, "
+            "last_used_at DATETIME, expires_at DATETIME NOT NULL, revoked_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO refresh_tokens (token_hash, jti, session_id, client_id, expires_at) "
+            "VALUES ('migrated', 'placeholder', 'placeholder', 1, '2999-01-01 00:00:00')"
+        ))
+
+    run_migrations(migration_engine)
+
+    columns = {column["name"] for column in inspect(migration_engine).get_columns("refresh_tokens")}
+    assert "user_id" in columns and "client_id" not in columns
+    with migration_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM refresh_tokens")).scalar() == 0
+
+
+def test_migrations_stop_meal_plan_id_reuse(migration_engine):
+    """Test that meal_plans is rebuilt with AUTOINCREMENT, keeping its rows, past the archived ids"""
+    from sqlalchemy import Column, MetaData, Table
+
+    from database.models import MealPlan, MealPlanArchive
+
+    # meal_plans as it was before, with SQLite's plain rowid ids
+    legacy = MetaData()
+    for model in (MealPlan, MealPlanArchive):
+        Table(model.__tablename__, legacy,
+              *[Column(column.name, column.type, primary_key=column.primary_key) for column in model.__table__.columns])
+    legacy.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO meal_plans (id, user_id, goal, diet_type, daily_calories, macro_protein, macro_carbs, "
+            "macro_fats, status) VALUES (3, 1, 'maintain', 'balanced', 1800, 30, 40, 30, 'ready')"
+        ))
+        conn.execute(text("INSERT INTO meal_plan_archive (id, user_id, document) VALUES (7, 1, '{}')"))
+
+    run_migrations(migration_engine)
+
+    index_names = {index["name"] for index in inspect(migration_engine).get_indexes("meal_plans")}
+    assert "ix_meal_plans_user_id_created_at" in index_names
+    with migration_engine.begin() as conn:
+        assert conn.execute(text("SELECT id, goal FROM meal_plans")).all() == [(3, "maintain")]
+        new_id = conn.execute(insert(MealPlan.__table__).values(
+            user_id=1, goal="lose", diet_type="balanced", daily_calories=1500,
+            macro_protein=30, macro_carbs=40, macro_fats=30
+        )).inserted_primary_key[0]
+    assert new_id == 8
+
+
+def test_migrations_date_meal_plans_without_created_at(migration_engine):
+    """Test that plans with a NULL created_at get one, and the rebuilt column refuses NULL"""
+    from sqlalchemy import Column, MetaData, Table
+
+    from database.models import MealPlan
+
+    legacy = MetaData()
+    Table("meal_plans", legacy,
+          *[Column(column.name, column.type, primary_key=column.primary_key) for column in MealPlan.__table__.columns])
+    legacy.create_all(bind=migration_engine)
+    with migration_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO meal_plans (id, user_id, goal, diet_type, daily_calories, macro_protein, macro_carbs, "
+            "macro_fats, status, created_at) VALUES (1, 1, 'maintain', 'balanced', 1800, 30, 40, 30, 'ready', NULL)"
+        ))
+
+    run_migrations(migration_engine)
+
+    with migration_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM meal_plans WHERE created_at IS NULL")).scalar() == 0
+    created_at = next(
+        column for column in inspect(migration_engine).get_columns("meal_plans") if column["name"] == "created_at"
+    )
+    assert not created_at["nullable"]
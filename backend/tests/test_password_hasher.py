@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+from passlib.context import CryptContext
+
+from services.password_hasher import PasswordHasher, PasswordHashQueueFullError
+
+
+def make_context(rounds: int) -> CryptContext:
+    # Low costs keep the tests fast; the pinned min/max mirror core.security
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds,
+                        bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+
+
+def test_hash_and_verify_in_pool():
+    """Test that hashing and verification run on the pool and agree with each other"""
+    hasher = PasswordHasher(make_context(4), max_workers=1, max_queue=1)
+
+    async def run():
+        hashed = await hasher.hash("Secret123!")
+        return hashed, await hasher.verify("Secret123!", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        hashed, right, wrong = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+
+    assert hashed.startswith("$2b$04$")
+    assert right and not wrong
+    assert hasher.stats()["completed"] == 3
+
+
+def test_verify_and_update_rehashes_old_cost():
+    """Test that a hash made with another cost is replaced after a successful verify"""
+    old_hash = make_context(4).hash("Secret123!")
+    hasher = PasswordHasher(make_context(5), max_workers=1, max_queue=0)
+
+    try:
+        verified, new_hash = asyncio.run(hasher.verify_and_update("Secret123!", old_hash))
+        current = asyncio.run(hasher.verify_and_update("Secret123!", new_hash))
+    finally:
+        hasher.shutdown()
+
+    assert verified
+    assert new_hash.startswith("$2b$05$")
+    assert current == (True, None)
+
+
+def test_hasher_sheds_load_when_full():
+    """Test that jobs beyond workers + queue are rejected instead of queued"""
+    hasher = PasswordHasher(make_context(4), max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(hasher._run(release.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordHashQueueFullError):
+            await hasher.hash("Secret123!")
+        assert hasher.stats()["in_flight"] == 1
+        release.set()
+        await first
+
+    try:
+        asyncio.run(run())
+    finally:
+        hasher.shutdown()
+
+    assert hasher.stats()["rejected"] == 1
@@ -0,0 +1,234 @@
+import asyncio
+import time
+
+import pytest
+
+from services.pdf_service import PdfRenderPool, PdfQueueFullError, PdfRenderTimeoutError
+
+
+def test_render_pool_returns_result():
+    """Test that a job runs in the pool and its result is awaited"""
+    pool = PdfRenderPool(max_workers=1, max_queue=1, timeout=30)
+    try:
+        result = asyncio.run(pool.render(pow, 2, 10))
+    finally:
+        pool.shutdown()
+
+    assert result == 1024
+    stats = pool.stats()
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+
+
+def test_render_pool_rejects_when_full():
+    """Test that jobs beyond workers + queue are rejected instead of queued"""
+    pool = PdfRenderPool(max_workers=1, max_queue=0, timeout=30)
+
+    async def run():
+        first = asyncio.create_task(pool.render(time.sleep, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(PdfQueueFullError):
+            await pool.render(time.sleep, 0)
+        await first
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert pool.stats()["rejected"] == 1
+
+
+def test_render_pool_timeout():
+    """Test that a slow job raises a timeout error"""
+    pool = PdfRenderPool(max_workers=1, max_queue=0, timeout=0.5)
+    try:
+        with pytest.raises(PdfRenderTimeoutError):
+            asyncio.run(pool.render(time.sleep, 3))
+    finally:
+        pool.shutdown()
+
+    assert pool.stats()["timed_out"] == 1
+
+
+def test_render_meal_plan_pdf_in_memory(tmp_path, monkeypatch):
+    """Test that the renderer returns PDF bytes without writing any file"""
+    from ai.pdf_generator import render_meal_plan_pdf
+
+    monkeypatch.chdir(tmp_path)
+    meal_plan_data = {
+        "id": 1,
+        "goal": "cut",
+        "diet_type": "balanced",
+        "daily_calories": 2000,
+        "macros": {"protein": 150, "carbs": 200, "fats": 60},
+        "history": [
+            {"day_number": 1, "meals": {"meals": [
+                {"meal": "Breakfast", "name": "Oats", "calories": 400, "protein": 20, "carbs": 60, "fats": 8}
+            ]}}
+        ],
+        "user_name": "Test User"
+    }
+
+    pdf_bytes = render_meal_plan_pdf(meal_plan_data)
+
+    assert pdf_bytes.startswith(b"%PDF")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_iter_pdf_chunks():
+    """Test that streamed chunks reassemble into the original document"""
+    from services.pdf_service import iter_pdf_chunks
+
+    data = bytes(range(256)) * 10
+    chunks = list(iter_pdf_chunks(data, chunk_size=1000))
+
+    assert [len(c) for c in chunks] == [1000, 1000, 560]
+    assert b"".join(chunks) == data
+
+
+def test_stream_pdf_zip():
+    """Test that rendered documents are streamed out as a valid ZIP archive"""
+    import io
+    import pickle
+    import zipfile
+    from services.pdf_service import stream_pdf_zip
+
+    pool = PdfRenderPool(max_workers=2, max_queue=0, timeout=30)
+    entries = [(f"meal_plan_{i}.pdf", {"id": i}) for i in range(5)]
+
+    async def collect():
+        return [chunk async for chunk in stream_pdf_zip(entries, pickle.dumps, pool=pool)]
+
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        pool.shutdown()
+
+    # One piece per document plus the central directory
+    assert len(chunks) == 6
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert sorted(archive.namelist()) == sorted(name for name, _ in entries)
+        assert pickle.loads(archive.read("meal_plan_3.pdf")) == {"id": 3}
+
+
+def test_stream_pdf_zip_pulls_async_entries_lazily():
+    """Test that async entries are only read as render slots free up"""
+    import io
+    import pickle
+    import zipfile
+    from services.pdf_service import stream_pdf_zip
+
+    pool = PdfRenderPool(max_workers=1, max_queue=0, timeout=30)
+    pulled = []
+
+    async def entries():
+        for i in range(3):
+            pulled.append(i)
+            yield f"meal_plan_{i}.pdf", {"id": i}
+
+    async def collect():
+        stream = stream_pdf_zip(entries(), pickle.dumps, pool=pool)
+        first = await anext(stream)
+        # One worker: the first entry rendered, the second started
+        assert pulled == [0, 1]
+        return [first] + [chunk async for chunk in stream]
+
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        pool.shutdown()
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert sorted(archive.namelist()) == ["meal_plan_0.pdf", "meal_plan_1.pdf", "meal_plan_2.pdf"]
+
+
+def test_stream_pdf_zip_gives_up_on_a_full_pool():
+    """Test that an entry waiting past max_wait for the pool is listed as failed"""
+    import io
+    import pickle
+    import zipfile
+    from services.pdf_service import stream_pdf_zip
+
+    pool = PdfRenderPool(max_workers=1, max_queue=0, timeout=30)
+
+    async def collect():
+        # An interactive export holds the only slot for the whole bulk export
+        blocker = asyncio.create_task(pool.render(time.sleep, 2))
+        await asyncio.sleep(0)
+        chunks = [chunk async for chunk in stream_pdf_zip([("meal_plan_1.pdf", {"id": 1})], pickle.dumps,
+                                                          pool=pool, max_wait=0.2)]
+        await blocker
+        return chunks
+
+    try:
+        chunks = asyncio.run(collect())
+    finally:
+        pool.shutdown()
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["errors.txt"]
+        assert "meal_plan_1.pdf" in archive.read("errors.txt").decode()
+
+
+def test_pdf_cache_evicts_least_recently_used():
+    """Test that the PDF cache stays within its byte budget"""
+    from services.pdf_service import PdfCache
+
+    cache = PdfCache(max_bytes=10)
+    cache.put(1, "v1", b"aaaa")
+    cache.put(2, "v1", b"bbbb")
+    assert cache.get(1, "v1") == b"aaaa"
+    cache.put(3, "v1", b"cccc")
+
+    assert cache.get(2, "v1") is None
+    assert cache.get(1, "v1") == b"aaaa"
+    assert cache.get(3, "v1") == b"cccc"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_pdf_cache_misses_other_versions():
+    """Test that a PDF rendered from another version of the plan is never served"""
+    from services.pdf_service import PdfCache
+
+    cache = PdfCache(max_bytes=100)
+    cache.put(1, "old", b"aaaa")
+    cache.put(2, "v1", b"bbbb")
+
+    assert cache.get(1, "new") is None
+    # The stale copy is dropped, not kept for the old version
+    assert cache.get(1, "old") is None
+    assert cache.stats()["bytes"] == 4
+
+    cache.invalidate(2)
+    assert cache.get(2, "v1") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_prerender_fills_cache_and_drops_when_full():
+    """Test that pre-renders land in the cache and overflow is dropped"""
+    import pickle
+    from services.pdf_service import PdfCache, PdfPrerenderer
+
+    pool = PdfRenderPool(max_workers=1, max_queue=0, timeout=30)
+    cache = PdfCache(max_bytes=1024 * 1024)
+    prerenderer = PdfPrerenderer(pool, cache, max_queue=1)
+
+    async def run():
+        assert prerenderer.enqueue(1, "v1", {"id": 1}, pickle.dumps)
+        assert not prerenderer.enqueue(2, "v1", {"id": 2}, pickle.dumps)
+        for _ in range(100):
+            if cache.get(1, "v1") is not None:
+                break
+            await asyncio.sleep(0.05)
+        prerenderer.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        pool.shutdown()
+
+    assert pickle.loads(cache.get(1, "v1")) == {"id": 1}
+    assert prerenderer.stats()["rendered"] == 1
+    assert prerenderer.stats()["dropped"] == 1
@@ -0,0 +1,162 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from core import security
+from core.principal_cache import LocalInvalidationChannel, Principal, PrincipalCache, principal_cache
+from core.query_stats import count_queries
+from core.token_manager import TokenManager
+from database import database as db_module
+from database.database import Base
+from database.models import User
+from routers.auth import get_current_user, is_user_admin
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_principal(user_id: int = 1, role: str = "user") -> Principal:
+    return Principal(id=user_id, email=f"user{user_id}@example.com", name="Test User",
+                     role=role, status="Active", is_active=True)
+
+
+def test_entries_expire_after_ttl():
+    """Test that a cached principal is served until its TTL runs out"""
+    clock = FakeClock()
+    cache = PrincipalCache(ttl=30, max_size=10, clock=clock)
+    cache.put(make_principal())
+
+    clock.now += 29
+    assert cache.get(1) == make_principal()
+    clock.now += 2
+    assert cache.get(1) is None
+
+
+def test_cache_is_bounded():
+    """Test that the least recently used principal is evicted first"""
+    cache = PrincipalCache(ttl=30, max_size=2)
+    cache.put(make_principal(1))
+    cache.put(make_principal(2))
+    cache.get(1)
+    cache.put(make_principal(3))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+def test_invalidation_reaches_other_caches_on_the_channel():
+    """Test that invalidating on one worker drops the entry on every worker sharing the channel"""
+    channel = LocalInvalidationChannel()
+    worker_a = PrincipalCache(ttl=30, max_size=10, channel=channel)
+    worker_b = PrincipalCache(ttl=30, max_size=10, channel=channel)
+    worker_a.put(make_principal())
+    worker_b.put(make_principal())
+
+    worker_a.invalidate(1)
+
+    assert worker_a.get(1) is None
+    assert worker_b.get(1) is None
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    """Test that a principal loaded before an invalidation isn't stored after it"""
+    cache = PrincipalCache(ttl=30, max_size=10)
+    generation = cache.generation
+    cache.invalidate(1)
+    cache.put(make_principal(role="admin"), generation)
+
+    assert cache.get(1) is None
+
+
+def test_principal_is_immutable():
+    """Test that routes can't change the shared cached principal"""
+    with pytest.raises(AttributeError):
+        make_principal().role = "admin"
+
+
+@pytest.fixture
+def auth_client(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User).values(id=1, email="coach@example.com", hashed_password="x",
+                                                   full_name="Coach", is_active=True))
+
+    asyncio.run(setup())
+    monkeypatch.setattr(db_module, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    principal_cache.clear()
+
+    app = FastAPI()
+
+    @app.get("/me")
+    def me(current_user: Principal = Depends(get_current_user)):
+        return {"id": current_user.id, "name": current_user.name, "role": current_user.role}
+
+    @app.get("/admin")
+    def admin(current_user: Principal = Depends(is_user_admin)):
+        return {"ok": True}
+
+    token = security.create_access_token({"sub": "1"}, expires_delta=timedelta(minutes=5))
+    with TestClient(app, headers={"Authorization": f"Bearer {token}"}) as client:
+        yield client, engine
+    principal_cache.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_repeat_requests_skip_the_users_query(auth_client):
+    """Test that only the first authenticated request loads the user row"""
+    client, engine = auth_client
+
+    with count_queries(engine.sync_engine) as first:
+        response = client.get("/me")
+    with count_queries(engine.sync_engine) as second:
+        client.get("/me")
+
+    assert response.json() == {"id": 1, "name": "Coach", "role": "user"}
+    assert first.count == 1
+    assert second.count == 0
+
+
+def test_refresh_token_is_not_an_access_token(auth_client):
+    """Test that a refresh token, signed with the same key, gets a 401 on an authenticated route"""
+    client, engine = auth_client
+    refresh_token = TokenManager.create_refresh_token({"sub": "1", "jti": "j", "sid": "s"}, timedelta(days=1))
+
+    response = client.get("/me", headers={"Authorization": f"Bearer {refresh_token}"})
+
+    assert response.status_code == 401
+
+
+def test_role_change_takes_effect_after_invalidation(auth_client):
+    """Test that a promoted user becomes admin as soon as their principal is invalidated"""
+    client, engine = auth_client
+    assert client.get("/admin").status_code == 403
+
+    async def promote():
+        async with engine.begin() as conn:
+            await conn.execute(update(User).where(User.id == 1).values(role="admin"))
+
+    asyncio.run(promote())
+    principal_cache.invalidate(1)
+
+    assert client.get("/admin").status_code == 200
+
+
+def test_invalid_token_is_rejected(auth_client):
+    """Test that a request with a bad token gets a 401 without touching the cache"""
+    client, _ = auth_client
+    response = client.get("/me", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
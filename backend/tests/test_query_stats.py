@@ -0,0 +1,54 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from core.query_stats import QueryStatsMiddleware, instrument_engine, track_queries
+
+
+@pytest.fixture
+def instrumented_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_track_queries_counts_statements(instrumented_engine):
+    """Test that statements run inside track_queries are counted and timed"""
+    with track_queries(keep_statements=True) as stats:
+        with instrumented_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+    assert stats.count == 2
+    assert stats.statements == ["SELECT 1", "SELECT 2"]
+    assert stats.total_ms >= 0
+
+
+def test_middleware_adds_query_headers(instrumented_engine):
+    """Test that a sync route's statements show up in the debug headers"""
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, add_headers=True)
+
+    @app.get("/three-queries")
+    def three_queries():
+        with instrumented_engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        return {"ok": True}
+
+    response = TestClient(app).get("/three-queries")
+
+    assert response.headers["X-DB-Query-Count"] == "3"
+    assert float(response.headers["X-DB-Query-Time-Ms"]) >= 0
+
+
+def test_query_budget_fails_when_exceeded(query_budget, instrumented_engine):
+    """Test that the query_budget fixture fails a block that runs too many statements"""
+    with pytest.raises(pytest.fail.Exception, match="3 SQL statements, budget is 2"):
+        with query_budget(2, instrumented_engine):
+            with instrumented_engine.connect() as conn:
+                for _ in range(3):
+                    conn.execute(text("SELECT 1"))
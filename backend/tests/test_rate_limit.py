@@ -0,0 +1,148 @@
+import asyncio
+import re
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import security
+from core.rate_limit import (LocalRateLimitStore, RateLimiter, RateLimitMiddleware, RateLimitPolicy,
+                             RateLimitRule, client_key, default_rules, parse_rate)
+from core.token_manager import TokenManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_rate():
+    """Test that "count/period" strings become policies and bad ones are refused"""
+    policy = parse_rate("pdf", "20/minute")
+    assert (policy.limit, policy.period) == (20, 60)
+    assert parse_rate("x", "2/hours").period == 3600
+    with pytest.raises(ValueError):
+        parse_rate("x", "20 per minute")
+
+
+def test_burst_then_refused_until_retry_after():
+    """Test that a key gets its burst, is refused with a retry time, then recovers one request at a time"""
+    clock = FakeClock()
+    store = LocalRateLimitStore(max_keys=100, clock=clock)
+    policy = RateLimitPolicy("test", limit=5, period=60)  # one request every 12 s, burst 5
+
+    results = [store.hit_sync("user:1", policy) for _ in range(6)]
+
+    assert [result.allowed for result in results] == [True] * 5 + [False]
+    assert [result.remaining for result in results[:5]] == [4, 3, 2, 1, 0]
+    assert results[5].retry_after == pytest.approx(12)
+
+    clock.now += 12
+    assert store.hit_sync("user:1", policy).allowed
+    assert not store.hit_sync("user:1", policy).allowed
+    # Other keys have their own budget
+    assert store.hit_sync("user:2", policy).allowed
+
+
+def test_store_keeps_one_value_per_key_and_evicts_idle_keys():
+    """Test that the store is bounded and drops the least recently used keys"""
+    store = LocalRateLimitStore(max_keys=32, shards=4)
+    policy = RateLimitPolicy("test", limit=10, period=1)
+
+    for n in range(1000):
+        store.hit_sync(f"ip:{n}", policy)
+
+    assert len(store) <= 32
+
+
+def test_first_matching_rule_wins():
+    """Test that expensive routes get their own policy and the rest the default"""
+    limiter = RateLimiter(LocalRateLimitStore(max_keys=10), default_rules(), parse_rate("default", "120/minute"))
+
+    assert limiter.policy_for("POST", "/api/mealplan/")[0].name == "mealplan-generate"
+    assert limiter.policy_for("GET", "/api/mealplan/pdf/12")[0].name == "mealplan-pdf"
+    assert limiter.policy_for("POST", "/auth/login") == (limiter.policy_for("POST", "/login")[0], "ip")
+    assert limiter.policy_for("GET", "/api/mealplan/12")[0].name == "default"
+
+
+def test_requests_are_keyed_by_user_when_signed_in():
+    """Test that a valid bearer token keys the limit by user id and anything else by IP"""
+    token = security.create_access_token({"sub": "7"}, expires_delta=timedelta(minutes=5))
+    scope = {"type": "http", "client": ("10.0.0.1", 5000),
+             "headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+    assert client_key(scope, "user") == "user:7"
+    assert client_key(scope, "ip") == "ip:10.0.0.1"
+    assert client_key({**scope, "headers": [(b"authorization", b"Bearer junk")]}, "user") == "ip:10.0.0.1"
+    # A refresh token doesn't authenticate requests, so it doesn't pick the bucket either
+    refresh_token = TokenManager.create_refresh_token({"sub": "7"}, timedelta(days=1))
+    assert client_key({**scope, "headers": [(b"authorization", f"Bearer {refresh_token}".encode())]},
+                      "user") == "ip:10.0.0.1"
+
+
+def test_middleware_answers_429_with_retry_after():
+    """Test that requests over the limit get a 429 with Retry-After and never reach the route"""
+    calls = []
+    app = FastAPI()
+
+    @app.post("/api/mealplan/")
+    def generate():
+        calls.append(1)
+        return {"ok": True}
+
+    @app.get("/cheap")
+    def cheap():
+        return {"ok": True}
+
+    rules = [RateLimitRule(RateLimitPolicy("mealplan-generate", limit=2, period=60),
+                           frozenset({"POST"}), re.compile(r"^/api/mealplan/?$"))]
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(LocalRateLimitStore(max_keys=10), rules, None))
+    client = TestClient(app)
+
+    statuses = [client.post("/api/mealplan/").status_code for _ in range(3)]
+    refused = client.post("/api/mealplan/")
+
+    assert statuses == [200, 200, 429]
+    assert refused.headers["Retry-After"] == "30"
+    assert len(calls) == 2
+    # Routes without a rule and no default policy aren't limited
+    assert all(client.get("/cheap").status_code == 200 for _ in range(5))
+
+
+def test_get_rate_limit_middleware_returns_the_app(monkeypatch):
+    """Test that main.py's get_rate_limit_middleware(app) keeps working with the app it returns"""
+    app = FastAPI()
+    assert security.get_rate_limit_middleware(app) is app
+    assert any(middleware.cls is RateLimitMiddleware for middleware in app.user_middleware)
+
+    monkeypatch.setattr(security.settings, "RATE_LIMIT_ENABLED", False)
+    assert security.get_rate_limit_middleware(FastAPI()).user_middleware == []
+
+
+def test_rate_limit_store_is_closed_on_shutdown(monkeypatch):
+    """Test that the store's connections (Redis) are released when the app shuts down"""
+    class ClosingStore(LocalRateLimitStore):
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    store = ClosingStore(max_keys=10)
+    monkeypatch.setattr(security, "build_rate_limiter", lambda: RateLimiter(store, [], None))
+    app = security.get_rate_limit_middleware(FastAPI())
+
+    with TestClient(app):
+        assert not store.closed
+    assert store.closed
+
+
+def test_async_hit_matches_sync():
+    """Test that the async interface used by the middleware goes through the same state"""
+    store = LocalRateLimitStore(max_keys=10)
+    policy = RateLimitPolicy("test", limit=1, period=60)
+    assert asyncio.run(store.hit("k", policy)).allowed
+    assert not store.hit_sync("k", policy).allowed
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.principal_cache import principal_cache
+from core.query_stats import count_queries
+from core.token_service import token_service
+from database import database as db_module
+from database.database import Base
+from database.models import RefreshToken, User
+from routers import auth
+from services.refresh_tokens import BloomFilter, RefreshTokenError, RefreshTokenStore, refresh_token_store
+
+USER_ID = 1
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=USER_ID, email="someone@example.com", hashed_password="x"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with Session(engine) as session:
+        yield session
+
+
+def make_store() -> RefreshTokenStore:
+    return RefreshTokenStore(lifetime=timedelta(days=7), filter_capacity=1000,
+                             filter_error_rate=0.001, sweep_interval=3600)
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    """Test that added ids are always found and unknown ids rarely are"""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for n in range(1000):
+        bloom.add(f"revoked-{n}")
+
+    assert all(f"revoked-{n}" in bloom for n in range(1000))
+    false_positives = sum(f"live-{n}" in bloom for n in range(10000))
+    assert false_positives < 300
+
+
+def test_devices_get_separate_sessions(db):
+    """Test that signing in on two devices keeps two active sessions"""
+    store = make_store()
+    store.issue(db, USER_ID, device_name="Phone")
+    store.issue(db, USER_ID, device_name="Laptop")
+
+    assert [session.device_name for session in store.active_sessions(db, USER_ID)] == ["Phone", "Laptop"]
+
+
+def test_rotation_is_one_update_and_keeps_the_session(db, engine):
+    """Test that a refresh is one UPDATE and one INSERT, and the new token belongs to the same session"""
+    store = make_store()
+    token = store.issue(db, USER_ID, device_name="Phone")
+
+    with count_queries(engine) as stats:
+        user_id, new_token = store.rotate(db, token, user_agent="App/2.0")
+
+    assert [statement.split()[0] for statement in stats.statements] == ["UPDATE", "INSERT"]
+    sessions = store.active_sessions(db, USER_ID)
+    assert len(sessions) == 1
+    assert (sessions[0].device_name, sessions[0].user_agent) == ("Phone", "App/2.0")
+    assert user_id == USER_ID
+    assert store.rotate(db, new_token)[1] != new_token
+
+
+def test_reused_token_signs_the_session_out(db):
+    """Test that presenting a rotated token again revokes every token of its session"""
+    store = make_store()
+    token = store.issue(db, USER_ID)
+    other_device = store.issue(db, USER_ID)
+    _, new_token = store.rotate(db, token)
+
+    with pytest.raises(RefreshTokenError):
+        store.rotate(db, token)
+    with pytest.raises(RefreshTokenError):
+        store.rotate(db, new_token)
+    assert len(store.active_sessions(db, USER_ID)) == 1
+    assert store.rotate(db, other_device)
+
+
+def test_token_revoked_by_another_worker_is_refused(db):
+    """Test that a token missing from this worker's filter is still refused once revoked"""
+    token = make_store().issue(db, USER_ID)
+    make_store().revoke(db, token)
+
+    with pytest.raises(RefreshTokenError):
+        make_store().rotate(db, token)
+
+
+def test_filter_is_rebuilt_at_startup(db, engine):
+    """Test that a restarted store knows the revoked tokens without a lookup"""
+    store = make_store()
+    token = store.issue(db, USER_ID)
+    store.revoke(db, token)
+
+    restarted = make_store()
+    with engine.connect() as conn:
+        assert restarted.load(conn) == 1
+    with pytest.raises(RefreshTokenError):
+        restarted.rotate(db, token)
+    assert restarted.stats()["table_checks"] == 1
+
+
+def test_sweep_deletes_expired_tokens(db, engine):
+    """Test that the sweep removes expired rows and keeps the rest"""
+    store = make_store()
+    store.issue(db, USER_ID)
+    store.issue(db, USER_ID)
+    db.execute(update(RefreshToken).where(RefreshToken.id == 2)
+               .values(expires_at=datetime.utcnow() - timedelta(days=1)))
+    db.commit()
+
+    with engine.begin() as conn:
+        assert store.sweep(conn, batch_size=1) == 1
+    assert db.execute(select(func.count()).select_from(RefreshToken)).scalar() == 1
+
+
+def test_access_token_is_not_a_refresh_token(db):
+    """Test that only refresh tokens can be rotated"""
+    from core.token_manager import TokenManager
+
+    with pytest.raises(RefreshTokenError):
+        make_store().rotate(db, TokenManager.create_access_token({"sub": str(USER_ID)}))
+
+
+@pytest.fixture
+def refresh_client(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User).values(id=USER_ID, email="someone@example.com",
+                                                   hashed_password="x", is_active=True))
+
+    asyncio.run(setup())
+    monkeypatch.setattr(db_module, "AsyncSessionLocal", session_factory)
+    principal_cache.clear()
+
+    async def issue():
+        async with session_factory() as db:
+            return await db.run_sync(refresh_token_store.issue, USER_ID, device_name="Phone")
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    with TestClient(app) as client:
+        yield client, lambda: asyncio.run(issue())
+    principal_cache.clear()
+    asyncio.run(engine.dispose())
+
+
+def test_refresh_route_rotates_and_logout_revokes(refresh_client):
+    """Test that /refresh hands out a new pair once per token and /logout ends the session"""
+    client, issue = refresh_client
+    token = issue()
+
+    response = client.post("/refresh", json={"refresh_token": token})
+    assert response.status_code == 200
+    body = response.json()
+    assert token_service.decode(body["access_token"])["sub"] == str(USER_ID)
+    assert body["refresh_token"] != token
+
+    # Replaying the old token signs the whole session out
+    assert client.post("/refresh", json={"refresh_token": token}).status_code == 401
+    assert client.post("/refresh", json={"refresh_token": body["refresh_token"]}).status_code == 401
+
+    other = issue()
+    assert client.post("/logout", json={"refresh_token": other}).status_code == 200
+    assert client.post("/refresh", json={"refresh_token": other}).status_code == 401
@@ -0,0 +1,164 @@
+import asyncio
+import base64
+import io
+import re
+import threading
+
+import pyotp
+import pytest
+from PIL import Image
+
+from core import tfa_manager
+from core.tfa_manager import TwoFactorAuth, _qr_matrix, qr_code_cache, render_qr_png, render_qr_svg
+
+URI = "otpauth://totp/AI%20Nutritionist:someone%40example.com?secret=JBSWY3DPEHPK3PXP&issuer=AI%20Nutritionist"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    qr_code_cache._entries.clear()
+    yield
+    qr_code_cache._entries.clear()
+
+
+def count_renders(monkeypatch) -> list:
+    calls = []
+    real_render = tfa_manager.render_qr_png
+
+    def counting_render(data):
+        calls.append(threading.get_ident())
+        return real_render(data)
+
+    monkeypatch.setattr(tfa_manager, "render_qr_png", counting_render)
+    return calls
+
+
+def test_png_pixels_match_the_qr_matrix():
+    """Test that the compact PNG draws every module as a box_size square"""
+    matrix = _qr_matrix(URI)
+    img = Image.open(io.BytesIO(render_qr_png(URI, box_size=3)))
+
+    assert img.size == (len(matrix) * 3, len(matrix) * 3)
+    for y, row in enumerate(matrix):
+        for x, dark in enumerate(row):
+            assert (img.getpixel((x * 3 + 1, y * 3 + 1)) == 0) == dark
+
+
+def test_svg_covers_exactly_the_dark_modules():
+    """Test that the SVG path's runs add up to the dark modules of the matrix"""
+    matrix = _qr_matrix(URI)
+    svg = render_qr_svg(URI).decode()
+
+    runs = re.findall(r"M(\d+) (\d+)h(\d+)", svg)
+    covered = {(int(x) + offset, int(y)) for x, y, width in runs for offset in range(int(width))}
+    dark = {(x, y) for y, row in enumerate(matrix) for x, is_dark in enumerate(row) if is_dark}
+    assert covered == dark
+    assert f'viewBox="0 0 {len(matrix)} {len(matrix)}"' in svg
+
+
+def test_reload_is_served_from_cache(monkeypatch):
+    """Test that showing the setup screen again doesn't render the code again"""
+    calls = count_renders(monkeypatch)
+    secret = pyotp.random_base32()
+
+    first = TwoFactorAuth.generate_qr_code(secret, "someone@example.com", fmt="png")
+    second = TwoFactorAuth.generate_qr_code(secret, "someone@example.com", fmt="png")
+    other_email = TwoFactorAuth.generate_qr_code(secret, "other@example.com", fmt="png")
+
+    assert first == second != other_email
+    assert len(calls) == 2
+    assert base64.b64decode(first).startswith(b"\x89PNG")
+
+
+def test_completed_setup_drops_the_cached_code(monkeypatch):
+    """Test that a verified setup removes the code from the cache"""
+    class FakeUser:
+        email = "someone@example.com"
+        tfa_secret = pyotp.random_base32()
+        tfa_verified = False
+
+    user = FakeUser()
+    TwoFactorAuth.generate_qr_code(user.tfa_secret, user.email, fmt="png")
+    assert len(qr_code_cache) == 1
+
+    assert TwoFactorAuth.verify_tfa_setup(user, pyotp.TOTP(user.tfa_secret).now())
+    assert len(qr_code_cache) == 0
+
+
+def test_async_render_runs_off_the_event_loop(monkeypatch):
+    """Test that the async variant renders on a worker thread"""
+    calls = count_renders(monkeypatch)
+
+    async def run():
+        return await TwoFactorAuth.generate_qr_code_async(pyotp.random_base32(), "someone@example.com", fmt="png")
+
+    assert asyncio.run(run())
+    assert calls and calls[0] != threading.get_ident()
+
+
+def test_async_cache_hit_skips_the_worker_thread(monkeypatch):
+    """Test that a cached code is returned without handing off to a thread"""
+    secret = pyotp.random_base32()
+    cached = TwoFactorAuth.generate_qr_code(secret, "someone@example.com", fmt="png")
+
+    async def no_thread(*args):
+        raise AssertionError("cache hit went to a worker thread")
+
+    monkeypatch.setattr(tfa_manager.asyncio, "to_thread", no_thread)
+    assert asyncio.run(
+        TwoFactorAuth.generate_qr_code_async(secret, "someone@example.com", fmt="png")
+    ) == cached
+
+
+def test_enable_tfa_renders_off_the_event_loop(monkeypatch):
+    """Test that enabling TFA saves the secret and renders its code on a worker thread"""
+    calls = count_renders(monkeypatch)
+
+    class FakeUser:
+        email = "someone@example.com"
+        tfa_secret = None
+        tfa_enabled = False
+
+    class FakeAsyncSession:
+        committed = False
+
+        async def commit(self):
+            self.committed = True
+
+    user, db = FakeUser(), FakeAsyncSession()
+    qr_code = asyncio.run(TwoFactorAuth.enable_tfa_for_user_async(user, db))
+
+    assert db.committed and user.tfa_enabled and user.tfa_secret
+    assert qr_code == qr_code_cache.get(
+        user.tfa_secret, tfa_manager.settings.TFA_QR_FORMAT, pyotp.TOTP(user.tfa_secret).provisioning_uri(
+            name=user.email, issuer_name="AI Nutritionist"
+        )
+    )
+    assert calls and calls[0] != threading.get_ident()
+
+
+def test_enable_tfa_stays_synchronous_for_sync_callers():
+    """Test that enable_tfa_for_user still commits and returns the code directly"""
+
+    class FakeUser:
+        email = "someone@example.com"
+        tfa_secret = None
+        tfa_enabled = False
+
+    class FakeSession:
+        committed = False
+
+        def commit(self):
+            self.committed = True
+
+    user, db = FakeUser(), FakeSession()
+    qr_code = TwoFactorAuth.enable_tfa_for_user(user, db)
+
+    assert db.committed and user.tfa_enabled
+    assert base64.b64decode(qr_code)
+
+
+def test_unknown_format_is_refused():
+    """Test that only the supported formats are rendered"""
+    with pytest.raises(ValueError):
+        TwoFactorAuth.generate_qr_code(pyotp.random_base32(), "someone@example.com", fmt="gif")
@@ -0,0 +1,143 @@
+import time
+from datetime import timedelta
+
+import jwt
+import pytest
+
+from core import token_service as token_service_module
+from core.token_service import TokenService
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def make_service(cache_size: int = 100, clock=time.time) -> TokenService:
+    return TokenService("test-secret", "HS256", cache_size=cache_size, clock=clock)
+
+
+def count_decodes(monkeypatch) -> list:
+    calls = []
+    real_decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(token_service_module.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_encode_decode_round_trip():
+    """Test that a token decodes back to its claims plus an expiry"""
+    service = make_service()
+    token = service.encode({"sub": "42", "type": "access"}, timedelta(minutes=5))
+
+    claims = service.decode(token)
+
+    assert claims["sub"] == "42" and claims["type"] == "access"
+    assert claims["exp"] > time.time()
+
+
+def test_repeat_decode_skips_signature_check(monkeypatch):
+    """Test that a token verified once is served from the cache afterwards"""
+    service = make_service()
+    token = service.encode({"sub": "42"}, timedelta(minutes=5))
+    calls = count_decodes(monkeypatch)
+
+    first = service.decode(token)
+    first["sub"] = "changed by caller"
+    second = service.decode(token)
+
+    assert len(calls) == 1
+    assert second["sub"] == "42"
+    assert service.stats() == {"entries": 1, "hits": 1, "misses": 1}
+
+
+def test_tampered_token_is_rejected():
+    """Test that a token with another signature fails even when the original is cached"""
+    service = make_service()
+    token = service.encode({"sub": "42"}, timedelta(minutes=5))
+    service.decode(token)
+    forged = jwt.encode({"sub": "1", "exp": int(time.time()) + 300}, "other-secret", algorithm="HS256")
+
+    with pytest.raises(jwt.InvalidTokenError):
+        service.decode(forged)
+
+
+def test_cached_token_expires_with_its_exp(monkeypatch):
+    """Test that a cached token goes back through full verification once its exp has passed"""
+    clock = FakeClock()
+    service = make_service(clock=clock)
+    token = service.encode({"sub": "42"}, timedelta(seconds=30))
+    service.decode(token)
+    calls = count_decodes(monkeypatch)
+
+    service.decode(token)
+    assert len(calls) == 0
+
+    clock.now += 3600
+    # PyJWT checks the real time, so the token itself still verifies here
+    service.decode(token)
+    assert len(calls) == 1
+
+
+def test_expired_token_is_rejected():
+    """Test that an expired token is refused and never cached"""
+    service = make_service()
+    token = service.encode({"sub": "42"}, timedelta(seconds=-1))
+
+    with pytest.raises(jwt.ExpiredSignatureError):
+        service.decode(token)
+    assert service.stats()["entries"] == 0
+
+
+def test_revocation_check_runs_on_cache_hits():
+    """Test that revoking a token takes effect even after it was cached"""
+    service = make_service()
+    token = service.encode({"sub": "42", "jti": "abc"}, timedelta(minutes=5))
+    service.decode(token)
+    revoked = set()
+    service.set_revocation_check(lambda claims: claims.get("jti") in revoked)
+
+    assert service.decode(token)["jti"] == "abc"
+    revoked.add("abc")
+    with pytest.raises(jwt.InvalidTokenError):
+        service.decode(token)
+
+
+def test_cache_is_bounded_lru():
+    """Test that the cache keeps only the most recently used tokens"""
+    service = make_service(cache_size=2)
+    tokens = [service.encode({"sub": str(n)}, timedelta(minutes=5)) for n in range(3)]
+
+    service.decode(tokens[0])
+    service.decode(tokens[1])
+    service.decode(tokens[0])  # tokens[1] is now the least recently used
+    service.decode(tokens[2])
+
+    assert service.stats()["entries"] == 2
+    misses = service.stats()["misses"]
+    service.decode(tokens[0])
+    assert service.stats()["misses"] == misses
+    service.decode(tokens[1])
+    assert service.stats()["misses"] == misses + 1
+
+
+def test_token_manager_uses_token_service():
+    """Test that TokenManager tokens carry their type and are checked through the shared service"""
+    from fastapi import HTTPException
+
+    from core.token_manager import TokenManager
+
+    refresh = TokenManager.create_refresh_token({"sub": "user@example.com"})
+    email, payload = TokenManager.verify_token(refresh, "refresh")
+
+    assert email == "user@example.com" and payload["type"] == "refresh"
+    with pytest.raises(HTTPException) as excinfo:
+        TokenManager.verify_token(refresh, "access")
+    assert excinfo.value.status_code == 401
@@ -104,8 +104,15 @@ const uploadProfilePicture = async (file) => {
 
 const getUserMealPlans = async () => {
   try {
-    const response = await api.get('/api/mealplan/user');
-    return response.data;
+    // The list is paged; follow X-Next-Cursor until the last page
+    const mealPlans = [];
+    let cursor = null;
+    do {
+      const response = await api.get('/api/mealplan/user', { params: cursor ? { cursor } : {} });
+      mealPlans.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return mealPlans;
   } catch (error) {
     console.error('Error getting user meal plans:', error);
     throw error;